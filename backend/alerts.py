@@ -0,0 +1,258 @@
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlsplit
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from database import AlertRule, AlertEvent, Product
+
+logger = logging.getLogger(__name__)
+
+# Evaluate alert rules on every price write
+ALERTS_ENABLED = os.environ.get("ALERTS_ENABLED", "1") == "1"
+# Sinks for rules that don't name one, comma separated (log, webhook, file)
+ALERT_SINKS = [name.strip() for name in os.environ.get("ALERT_SINKS", "log").split(",") if name.strip()]
+# Default webhook URL and NDJSON file for rules without a target
+ALERT_WEBHOOK_URL = os.environ.get("ALERT_WEBHOOK_URL")
+ALERT_FILE_PATH = os.environ.get("ALERT_FILE_PATH", "./alerts.ndjson")
+ALERT_WEBHOOK_TIMEOUT = float(os.environ.get("ALERT_WEBHOOK_TIMEOUT", 5))
+# Hosts a rule's webhook target may point at, comma separated (default: the host of ALERT_WEBHOOK_URL)
+ALERT_WEBHOOK_HOSTS = {
+    host.strip().lower()
+    for host in os.environ.get("ALERT_WEBHOOK_HOSTS", urlsplit(ALERT_WEBHOOK_URL or "").hostname or "").split(",")
+    if host.strip()
+}
+# Seconds before rules changed by another process are picked up
+ALERT_RULES_REFRESH_SECONDS = float(os.environ.get("ALERT_RULES_REFRESH_SECONDS", 10))
+
+ALERT_KINDS = ('below_price', 'drop_percent', 'all_time_low')
+
+class LogSink:
+    def send(self, alert, target=None):
+        logger.warning(f"Price alert: {alert['message']}")
+
+class WebhookSink:
+    """POST alerts as JSON from a background thread, so a slow endpoint never holds up a scrape"""
+
+    def __init__(self, timeout=ALERT_WEBHOOK_TIMEOUT):
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="alert-webhook")
+
+    def post(self, url, alert):
+        import requests
+
+        try:
+            response = requests.post(url, json=alert, timeout=self.timeout)
+            response.raise_for_status()
+        except Exception as e:
+            logger.error(f"Alert webhook {url} failed: {e}")
+
+    def target_error(self, url):
+        """Why a rule can't post to `url`, or None"""
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            return "Webhook targets must be http or https URLs"
+        if parts.hostname.lower() not in ALERT_WEBHOOK_HOSTS:
+            return f"Webhook target host {parts.hostname} is not allowed (see ALERT_WEBHOOK_HOSTS)"
+        return None
+
+    def send(self, alert, target=None):
+        url = target or ALERT_WEBHOOK_URL
+        if not url:
+            logger.error("Alert webhook sink has no URL (set ALERT_WEBHOOK_URL or the rule's target)")
+            return
+        # Rules stored before targets were checked
+        error = target and self.target_error(target)
+        if error:
+            logger.error(f"Alert webhook not sent: {error}")
+            return
+        self.executor.submit(self.post, url, alert)
+
+class FileSink:
+    """Append alerts to a file, one JSON object per line"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+
+    def target_error(self, path):
+        """Why a rule can't append to `path`, or None: targets must be in ALERT_FILE_PATH's directory"""
+        directory = os.path.dirname(os.path.realpath(ALERT_FILE_PATH))
+        if os.path.commonpath([directory, os.path.realpath(path)]) != directory:
+            return f"File targets must be in {directory}"
+        return None
+
+    def send(self, alert, target=None):
+        error = target and self.target_error(target)
+        if error:
+            logger.error(f"Alert not written: {error}")
+            return
+        with self.lock:
+            with open(target or ALERT_FILE_PATH, 'a') as f:
+                f.write(json.dumps(alert) + '\n')
+
+SINKS = {
+    'log': LogSink(),
+    'webhook': WebhookSink(),
+    'file': FileSink(),
+}
+
+def register_sink(name, sink):
+    """Make a sink (any object with send(alert, target)) available to rules by name"""
+    SINKS[name] = sink
+
+def rule_error(kind, threshold, sink, target=None):
+    """Why a rule can't be created, or None"""
+    if kind not in ALERT_KINDS:
+        return f"Unknown alert kind: {kind} (expected one of {', '.join(ALERT_KINDS)})"
+    if kind == 'below_price' and (threshold is None or threshold <= 0):
+        return "below_price rules need a positive threshold price"
+    if kind == 'drop_percent' and (threshold is None or not 0 < threshold < 100):
+        return "drop_percent rules need a threshold between 0 and 100"
+    if sink is not None and sink not in SINKS:
+        return f"Unknown alert sink: {sink}"
+    if target:
+        # Without a sink of its own the rule's target goes to every default sink
+        for name in [sink] if sink else ALERT_SINKS:
+            check = getattr(SINKS.get(name), 'target_error', None)
+            error = check(target) if check else None
+            if error:
+                return error
+    return None
+
+class RuleCache:
+    """Enabled rules grouped by product (None for global rules), per database.
+
+    Loaded with one query and kept for ALERT_RULES_REFRESH_SECONDS, so
+    evaluating a price costs a dict lookup rather than a query. The API
+    invalidates it on every rule change.
+    """
+
+    def __init__(self, refresh_seconds=ALERT_RULES_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self.lock = threading.Lock()
+        self.loaded = {}
+
+    def invalidate(self):
+        with self.lock:
+            self.loaded.clear()
+
+    def rules_for(self, db, product_id):
+        bind = db.get_bind()
+        with self.lock:
+            entry = self.loaded.get(bind)
+        if entry is None or time.monotonic() - entry[0] > self.refresh_seconds:
+            rules = {}
+            for rule in db.query(
+                AlertRule.id, AlertRule.product_id, AlertRule.kind, AlertRule.threshold,
+                AlertRule.sink, AlertRule.target
+            ).filter(AlertRule.enabled.is_(True)):
+                rules.setdefault(rule.product_id, []).append(rule)
+            entry = (time.monotonic(), rules)
+            with self.lock:
+                self.loaded[bind] = entry
+        rules = entry[1]
+        return rules.get(product_id, []) + rules.get(None, [])
+
+RULES = RuleCache()
+
+def triggered(rule, price, before):
+    """The reference value a rule fired against, or None.
+
+    Rules fire on the crossing, not on every price past the line: a price
+    that stays below a threshold alerts once, and again only after it has
+    gone back above it.
+    """
+    previous = before['last_price'] if before else None
+    if rule.kind == 'below_price':
+        if price <= rule.threshold and (previous is None or previous > rule.threshold):
+            return rule.threshold
+    elif rule.kind == 'drop_percent':
+        peak = before['rolling_max'] if before else None
+        if peak:
+            level = peak * (1 - rule.threshold / 100)
+            if price <= level and previous > level:
+                return peak
+    elif rule.kind == 'all_time_low':
+        if before and price < before['all_time_low']:
+            return before['all_time_low']
+    return None
+
+def describe(rule, product_name, price, reference):
+    if rule.kind == 'below_price':
+        return f"{product_name} is now ${price:.2f}, below ${reference:.2f}"
+    if rule.kind == 'drop_percent':
+        drop = (reference - price) / reference * 100
+        return f"{product_name} is now ${price:.2f}, {drop:.1f}% below its recent high of ${reference:.2f}"
+    return f"{product_name} is now ${price:.2f}, a new all-time low (previous ${reference:.2f})"
+
+def evaluate_alerts(db, product_id, price, observed_at, before):
+    """Check the alert rules against one new price (the caller commits).
+
+    `before` is the product's stats snapshot from before this price, so
+    every rule is a comparison against stored aggregates and costs the same
+    however long the history is. Fired alerts are added to the session as
+    AlertEvent rows and sent to their sinks once the transaction commits.
+    """
+    if not ALERTS_ENABLED:
+        return []
+    if before and observed_at < before['last_observed_at']:
+        # Backfilled observations aren't news
+        return []
+
+    events = []
+    for rule in RULES.rules_for(db, product_id):
+        reference = triggered(rule, price, before)
+        if reference is None:
+            continue
+        product = db.get(Product, product_id)
+        name = product.name if product else f"Product {product_id}"
+        alert = AlertEvent(
+            rule_id=rule.id,
+            product_id=product_id,
+            kind=rule.kind,
+            price=price,
+            reference=reference,
+            message=describe(rule, name, price, reference),
+            triggered_at=datetime.utcnow(),
+        )
+        db.add(alert)
+        events.append(alert)
+        payload = {
+            'rule_id': rule.id,
+            'product_id': product_id,
+            'product_name': name,
+            'url': product.url if product else None,
+            'kind': rule.kind,
+            'price': price,
+            'reference': reference,
+            'message': alert.message,
+            'observed_at': observed_at.isoformat(),
+        }
+        db.info.setdefault('pending_alerts', []).append((rule.sink, rule.target, payload))
+    return events
+
+def dispatch(sink_name, target, alert):
+    for name in [sink_name] if sink_name else ALERT_SINKS:
+        sink = SINKS.get(name)
+        if sink is None:
+            logger.error(f"Unknown alert sink: {name}")
+            continue
+        try:
+            sink.send(alert, target)
+        except Exception as e:
+            logger.error(f"Alert sink {name} failed: {e}")
+
+@event.listens_for(Session, "after_commit")
+def send_pending_alerts(session):
+    for sink_name, target, alert in session.info.pop('pending_alerts', []):
+        dispatch(sink_name, target, alert)
+
+@event.listens_for(Session, "after_rollback")
+def drop_pending_alerts(session):
+    session.info.pop('pending_alerts', None)
@@ -0,0 +1,213 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Pool defaults, overridable through the environment
+BROWSER_POOL_SIZE = int(os.environ.get("BROWSER_POOL_SIZE", 2))
+BROWSER_IDLE_TIMEOUT = float(os.environ.get("BROWSER_IDLE_TIMEOUT", 300))
+BROWSER_MAX_PAGES = int(os.environ.get("BROWSER_MAX_PAGES", 50))
+BROWSER_ACQUIRE_TIMEOUT = float(os.environ.get("BROWSER_ACQUIRE_TIMEOUT", 60))
+
+def create_chrome_driver():
+    """Launch the headless Chrome used for the Selenium fallback"""
+    # Imported here: Selenium is slow to load and most processes never start a browser
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+
+    chrome_options = Options()
+    chrome_options.add_argument("--headless")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    chrome_options.add_argument("--disable-gpu")
+    chrome_options.add_argument("--window-size=1920,1080")
+    return webdriver.Chrome(options=chrome_options)
+
+class PooledDriver:
+    """A driver plus the bookkeeping the pool needs to recycle it"""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages = 0
+        self.last_used = time.monotonic()
+
+class BrowserPool:
+    """Thread-safe pool of warm headless browsers.
+
+    Drivers are started lazily up to `size`, handed out most-recently-used
+    first, health checked before reuse, evicted after `idle_timeout` seconds
+    without work and recycled after serving `max_pages` pages.
+    """
+
+    def __init__(self, size=BROWSER_POOL_SIZE, idle_timeout=BROWSER_IDLE_TIMEOUT,
+                 max_pages=BROWSER_MAX_PAGES, acquire_timeout=BROWSER_ACQUIRE_TIMEOUT,
+                 driver_factory=create_chrome_driver):
+        self.size = max(1, size)
+        self.idle_timeout = idle_timeout
+        self.max_pages = max(1, max_pages)
+        self.acquire_timeout = acquire_timeout
+        self.driver_factory = driver_factory
+
+        self._idle = []
+        self._total = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._stats = {
+            'borrows': 0,
+            'hits': 0,
+            'spawns': 0,
+            'spawn_failures': 0,
+            'recycled': 0,
+            'evicted': 0,
+            'unhealthy': 0,
+            'wait_seconds': 0.0,
+        }
+        atexit.register(self.close)
+
+    @contextmanager
+    def driver(self):
+        """Borrow a driver for the duration of a `with` block"""
+        entry = self._acquire()
+        healthy = False
+        try:
+            yield entry.driver
+            healthy = True
+        finally:
+            self._release(entry, healthy)
+
+    def _acquire(self):
+        started = time.monotonic()
+        deadline = started + self.acquire_timeout
+        while True:
+            with self._cond:
+                stale = self._pop_stale()
+                entry = None
+                spawn = False
+                while entry is None:
+                    if self._idle:
+                        entry = self._idle.pop()
+                    elif self._total < self.size:
+                        self._total += 1
+                        spawn = True
+                        break
+                    else:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0 or not self._cond.wait(remaining):
+                            raise TimeoutError("Timed out waiting for a pooled browser")
+            for old in stale:
+                self._quit(old)
+
+            if spawn:
+                entry = self._spawn()
+                with self._cond:
+                    self._record_borrow(started)
+                return entry
+
+            if self._is_healthy(entry):
+                with self._cond:
+                    self._stats['hits'] += 1
+                    self._record_borrow(started)
+                return entry
+
+            logger.info("Discarding unhealthy pooled browser")
+            self._discard(entry, 'unhealthy')
+
+    def _spawn(self):
+        try:
+            entry = PooledDriver(self.driver_factory())
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._stats['spawn_failures'] += 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._stats['spawns'] += 1
+        return entry
+
+    def _release(self, entry, healthy):
+        entry.pages += 1
+        entry.last_used = time.monotonic()
+        if not healthy:
+            self._discard(entry, 'unhealthy')
+        elif entry.pages >= self.max_pages or self._closed:
+            self._discard(entry, 'recycled')
+        else:
+            with self._cond:
+                self._idle.append(entry)
+                self._cond.notify()
+
+    def _discard(self, entry, reason):
+        with self._cond:
+            self._total -= 1
+            self._stats[reason] += 1
+            self._cond.notify()
+        self._quit(entry)
+
+    def _pop_stale(self):
+        """Remove idle drivers past their idle timeout (caller holds the lock)"""
+        if self.idle_timeout is None:
+            return []
+        cutoff = time.monotonic() - self.idle_timeout
+        stale = [entry for entry in self._idle if entry.last_used < cutoff]
+        if stale:
+            self._idle = [entry for entry in self._idle if entry.last_used >= cutoff]
+            self._total -= len(stale)
+            self._stats['evicted'] += len(stale)
+        return stale
+
+    def _record_borrow(self, started):
+        self._stats['borrows'] += 1
+        self._stats['wait_seconds'] += time.monotonic() - started
+
+    def _is_healthy(self, entry):
+        try:
+            entry.driver.current_url
+            return True
+        except Exception:
+            return False
+
+    def _quit(self, entry):
+        try:
+            entry.driver.quit()
+        except Exception as e:
+            logger.warning(f"Error closing pooled browser: {e}")
+
+    def evict_idle(self):
+        """Close drivers that have been idle longer than the idle timeout"""
+        with self._cond:
+            stale = self._pop_stale()
+        for entry in stale:
+            self._quit(entry)
+        return len(stale)
+
+    def metrics(self):
+        with self._cond:
+            stats = dict(self._stats)
+            idle = len(self._idle)
+            total = self._total
+        borrows = stats['borrows']
+        return {
+            'size': self.size,
+            'open': total,
+            'idle': idle,
+            'in_use': total - idle,
+            **stats,
+            'wait_seconds': round(stats['wait_seconds'], 4),
+            'avg_wait_ms': round(stats['wait_seconds'] / borrows * 1000, 2) if borrows else 0.0,
+            'hit_rate': round(stats['hits'] / borrows, 4) if borrows else 0.0,
+        }
+
+    def close(self):
+        """Quit every idle driver; drivers in use are quit when returned"""
+        with self._cond:
+            self._closed = True
+            idle = self._idle
+            self._idle = []
+            self._total -= len(idle)
+        for entry in idle:
+            self._quit(entry)
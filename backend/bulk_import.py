@@ -0,0 +1,278 @@
+import argparse
+import asyncio
+import csv
+import io
+import json
+import logging
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from pydantic import ValidationError
+
+from canonical import canonical_key
+from database import SessionLocal, create_tables, Product
+from history import record_price
+from metrics import DB_WRITE_SECONDS
+from models import ProductCreate
+from bulk_refresh import DEFAULT_CONCURRENCY, DEFAULT_PER_DOMAIN_CONCURRENCY, DEFAULT_BATCH_SIZE
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# URLs checked against the products table per query
+DEDUPE_CHUNK_SIZE = 10000
+
+def parse_urls(data, content_type=None, filename=None):
+    """Read URLs from a JSON list, a CSV file or newline-delimited text.
+
+    JSON may be a list of URLs (or of objects with a "url" key) or an
+    object with a "urls" list. CSV uses the "url" column if the header has
+    one, otherwise the first column. Blank lines and #-comments are skipped.
+    """
+    if isinstance(data, bytes):
+        data = data.decode('utf-8-sig')
+    content_type = (content_type or '').lower()
+    filename = (filename or '').lower()
+    stripped = data.lstrip()
+
+    if 'json' in content_type or filename.endswith('.json') or stripped[:1] in ('[', '{'):
+        try:
+            payload = json.loads(data)
+        except ValueError as e:
+            raise ValueError(f"Invalid JSON: {e}")
+        if isinstance(payload, dict):
+            payload = payload.get('urls')
+        if not isinstance(payload, list):
+            raise ValueError("JSON must be a list of URLs or an object with a 'urls' list")
+        urls = [item.get('url') if isinstance(item, dict) else item for item in payload]
+        return [str(url).strip() for url in urls if url and str(url).strip()]
+
+    if 'csv' in content_type or filename.endswith('.csv'):
+        rows = [row for row in csv.reader(io.StringIO(data)) if row and any(cell.strip() for cell in row)]
+        column = 0
+        if rows:
+            header = [cell.strip().lower() for cell in rows[0]]
+            if 'url' in header:
+                column = header.index('url')
+                rows = rows[1:]
+        return [row[column].strip() for row in rows if len(row) > column and row[column].strip()]
+
+    lines = (line.strip() for line in data.splitlines())
+    return [line for line in lines if line and not line.startswith('#')]
+
+def normalize_url(url):
+    """The URL exactly as POST /products/ would store it, or None if it isn't valid"""
+    try:
+        return str(ProductCreate(url=url).url)
+    except ValidationError:
+        return None
+
+class BulkImporter:
+    """Add many products at once, reporting each URL as soon as it is settled.
+
+    URLs are deduplicated by canonical_key, so two spellings of one product
+    (or a spelling of a tracked one) count as duplicates. Tracked products
+    are found with one indexed query up front. New URLs
+    are scraped on a thread pool, bounded by a global and a per-retailer
+    semaphore like BulkRefresher, and the products plus their first history
+    rows are inserted in batched transactions.
+    """
+
+    def __init__(self, scraper=None, session_factory=SessionLocal,
+                 concurrency=DEFAULT_CONCURRENCY,
+                 per_domain_concurrency=DEFAULT_PER_DOMAIN_CONCURRENCY,
+                 batch_size=DEFAULT_BATCH_SIZE):
+        if scraper is None:
+            # Imported on use, so the API loads without the scraping stack
+            from scraper import PriceScraper
+            scraper = PriceScraper()
+        self.scraper = scraper
+        self.session_factory = session_factory
+        self.concurrency = max(1, concurrency)
+        self.per_domain_concurrency = max(1, per_domain_concurrency)
+        self.batch_size = max(1, batch_size)
+
+    def existing_keys(self, keys):
+        db = self.session_factory()
+        try:
+            found = set()
+            for i in range(0, len(keys), DEDUPE_CHUNK_SIZE):
+                chunk = keys[i:i + DEDUPE_CHUNK_SIZE]
+                found.update(key for (key,) in db.query(Product.canonical_key).filter(Product.canonical_key.in_(chunk)))
+            return found
+        finally:
+            db.close()
+
+    def write_batch(self, results):
+        """Insert scraped products and their initial prices in one transaction.
+
+        Returns {url: product id}, with None for URLs that another writer
+        added since the dedupe query.
+        """
+        db = self.session_factory()
+        try:
+            with DB_WRITE_SECONDS.time(operation='import_batch'):
+                urls = [url for url, _ in results]
+                keys = {url: canonical_key(url) for url in urls}
+                taken = {
+                    key for (key,) in
+                    db.query(Product.canonical_key).filter(Product.canonical_key.in_(list(keys.values())))
+                }
+                products = {
+                    url: Product(name=result['name'], url=url, current_price=result['price'])
+                    for url, result in results if keys[url] not in taken
+                }
+                db.add_all(products.values())
+                db.flush()
+                for product in products.values():
+                    if product.current_price:
+                        record_price(db, product.id, product.current_price)
+                db.commit()
+            return {url: products[url].id if url in products else None for url in urls}
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    async def import_urls(self, urls):
+        """Async generator of per-URL events, followed by one {'summary': ...} event.
+
+        Each event has the raw `url` and a `status` of created, duplicate,
+        invalid or failed; created events carry product_id, name and price.
+        """
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        summary = {'total': len(urls), 'created': 0, 'duplicates': 0, 'invalid': 0, 'failed': 0}
+        events = asyncio.Queue()
+
+        def emit(event, status):
+            summary[{'duplicate': 'duplicates'}.get(status, status)] += 1
+            events.put_nowait({**event, 'status': status})
+
+        # Validate and dedupe before anything is scraped
+        candidates = {}
+        keys = {}
+        for raw in urls:
+            url = normalize_url(raw)
+            key = canonical_key(url) if url is not None else None
+            if url is None:
+                emit({'url': raw, 'error': 'Invalid URL'}, 'invalid')
+            elif key in keys:
+                emit({'url': raw}, 'duplicate')
+            else:
+                keys[key] = url
+                candidates[url] = raw
+        existing = await loop.run_in_executor(None, self.existing_keys, list(keys))
+        for key in existing:
+            emit({'url': candidates.pop(keys[key])}, 'duplicate')
+
+        global_limit = asyncio.Semaphore(self.concurrency)
+        domain_limits = defaultdict(lambda: asyncio.Semaphore(self.per_domain_concurrency))
+        executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="bulk-import")
+        pending = []
+        write_lock = asyncio.Lock()
+
+        async def flush(force=False):
+            async with write_lock:
+                if not pending or (not force and len(pending) < self.batch_size):
+                    return
+                batch = pending[:]
+                pending.clear()
+            try:
+                ids = await loop.run_in_executor(None, self.write_batch, batch)
+            except Exception as e:
+                logger.error(f"Error writing import batch: {e}")
+                for url, _ in batch:
+                    emit({'url': candidates[url], 'error': str(e)}, 'failed')
+                return
+            for url, result in batch:
+                if ids[url] is None:
+                    emit({'url': candidates[url]}, 'duplicate')
+                else:
+                    emit({
+                        'url': candidates[url],
+                        'product_id': ids[url],
+                        'name': result['name'],
+                        'price': result['price'],
+                    }, 'created')
+
+        async def import_one(url):
+            site = self.scraper.get_site(url)
+            async with domain_limits[site]:
+                async with global_limit:
+                    try:
+                        result = await loop.run_in_executor(executor, self.scraper.scrape_product, url)
+                    except Exception as e:
+                        result = {'name': None, 'price': None, 'success': False, 'error': str(e)}
+
+            if not result['success'] or not result['name']:
+                emit({'url': candidates[url], 'error': result.get('error') or 'No product name found'}, 'failed')
+            else:
+                pending.append((url, result))
+                await flush()
+
+        async def run_all():
+            try:
+                await asyncio.gather(*(import_one(url) for url in candidates))
+                await flush(force=True)
+            finally:
+                executor.shutdown(wait=False)
+                events.put_nowait(None)
+
+        worker = asyncio.create_task(run_all())
+        try:
+            while True:
+                event = await events.get()
+                if event is None:
+                    break
+                yield event
+            await worker
+        finally:
+            # The consumer went away (e.g. the client disconnected)
+            if not worker.done():
+                worker.cancel()
+
+        elapsed = time.perf_counter() - started
+        summary['elapsed_seconds'] = round(elapsed, 3)
+        summary['urls_per_second'] = round(len(urls) / elapsed, 2) if elapsed > 0 else 0.0
+        logger.info(
+            f"Bulk import: {summary['created']}/{summary['total']} created, {summary['duplicates']} duplicates, "
+            f"{summary['failed']} failed in {summary['elapsed_seconds']}s"
+        )
+        yield {'summary': summary}
+
+async def print_events(importer, urls):
+    async for event in importer.import_urls(urls):
+        print(json.dumps(event), flush=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Import product URLs from a list, CSV or JSON file")
+    parser.add_argument("file", help="File with URLs ('-' reads stdin)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--per-domain", type=int, default=DEFAULT_PER_DOMAIN_CONCURRENCY)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--no-selenium", action="store_true", help="Disable the Selenium fallback")
+    args = parser.parse_args()
+
+    if args.file == '-':
+        urls = parse_urls(sys.stdin.read())
+    else:
+        with open(args.file, 'rb') as f:
+            urls = parse_urls(f.read(), filename=args.file)
+
+    from scraper import PriceScraper
+
+    create_tables()
+    importer = BulkImporter(
+        scraper=PriceScraper(use_selenium_fallback=not args.no_selenium),
+        concurrency=args.concurrency,
+        per_domain_concurrency=args.per_domain,
+        batch_size=args.batch_size,
+    )
+    asyncio.run(print_events(importer, urls))
+
+if __name__ == "__main__":
+    main()
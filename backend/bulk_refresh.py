@@ -0,0 +1,198 @@
+import argparse
+import asyncio
+import json
+import logging
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from database import SessionLocal, create_tables, Product
+from history import record_price, extend_price, HISTORY_CHANGE_ONLY
+from metrics import DB_WRITE_SECONDS
+from scrape_cache import recorded_since
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Defaults for a bulk refresh run
+DEFAULT_CONCURRENCY = 16
+DEFAULT_PER_DOMAIN_CONCURRENCY = 4
+DEFAULT_BATCH_SIZE = 50
+MAX_REPORTED_ERRORS = 50
+
+class BulkRefresher:
+    """Refresh many tracked products at once.
+
+    Scrapes run on a thread pool (the scraper itself is blocking) and are
+    gated by a global semaphore plus one semaphore per retailer, so a large
+    refresh never hammers a single site. Results are written back to the
+    database in batches instead of one transaction per product.
+    """
+
+    def __init__(self, scraper=None, session_factory=SessionLocal,
+                 concurrency=DEFAULT_CONCURRENCY,
+                 per_domain_concurrency=DEFAULT_PER_DOMAIN_CONCURRENCY,
+                 batch_size=DEFAULT_BATCH_SIZE):
+        if scraper is None:
+            # Imported on use, so the API loads without the scraping stack
+            from scraper import PriceScraper
+            scraper = PriceScraper()
+        self.scraper = scraper
+        self.session_factory = session_factory
+        self.concurrency = max(1, concurrency)
+        self.per_domain_concurrency = max(1, per_domain_concurrency)
+        self.batch_size = max(1, batch_size)
+
+    def load_targets(self, product_ids=None):
+        """Return (id, url) pairs for the products to refresh"""
+        db = self.session_factory()
+        try:
+            query = db.query(Product.id, Product.url)
+            if product_ids:
+                query = query.filter(Product.id.in_(product_ids))
+            return [(row.id, row.url) for row in query.order_by(Product.id).all()]
+        finally:
+            db.close()
+
+    def write_batch(self, results):
+        """Apply a batch of successful scrapes in a single transaction"""
+        if not results:
+            return
+
+        results = dict(results)
+        now = datetime.utcnow()
+        db = self.session_factory()
+        try:
+            with DB_WRITE_SECONDS.time(operation='refresh_batch'):
+                products = db.query(Product).filter(Product.id.in_(list(results))).all()
+                for product in products:
+                    result = results[product.id]
+                    if recorded_since(product.last_updated, result):
+                        # A concurrent refresh already wrote this shared scrape
+                        continue
+                    product.last_updated = now
+                    if result.get('unchanged'):
+                        extend_price(db, product.id, result['price'], now)
+                    else:
+                        product.current_price = result['price']
+                        record_price(db, product.id, result['price'], now)
+                db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    async def refresh(self, product_ids=None, on_result=None):
+        """Scrape the selected products (all by default) and return a summary.
+
+        `on_result(product_id, result)` is called with every scrape result.
+        """
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+
+        targets = await loop.run_in_executor(None, self.load_targets, product_ids)
+
+        global_limit = asyncio.Semaphore(self.concurrency)
+        domain_limits = defaultdict(lambda: asyncio.Semaphore(self.per_domain_concurrency))
+        executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="bulk-refresh")
+
+        pending = []
+        write_lock = asyncio.Lock()
+        summary = {
+            'total': len(targets),
+            'succeeded': 0,
+            'failed': 0,
+            'skipped': 0,
+            'unchanged': 0,
+            'failures_by_domain': defaultdict(int),
+            'errors': [],
+        }
+
+        def record_failure(product_id, site, error):
+            summary['failed'] += 1
+            summary['failures_by_domain'][site] += 1
+            if len(summary['errors']) < MAX_REPORTED_ERRORS:
+                summary['errors'].append({'product_id': product_id, 'domain': site, 'error': error})
+
+        async def flush(force=False):
+            async with write_lock:
+                if not pending or (not force and len(pending) < self.batch_size):
+                    return
+                batch = pending[:]
+                pending.clear()
+            try:
+                await loop.run_in_executor(None, self.write_batch, batch)
+                summary['succeeded'] += sum(1 for _, result in batch if not result.get('unchanged'))
+            except Exception as e:
+                logger.error(f"Error writing refresh batch: {e}")
+                for product_id, _ in batch:
+                    record_failure(product_id, 'database', str(e))
+
+        async def refresh_one(product_id, url):
+            site = self.scraper.get_site(url)
+            async with domain_limits[site]:
+                async with global_limit:
+                    try:
+                        result = await loop.run_in_executor(executor, self.scraper.scrape_product, url)
+                    except Exception as e:
+                        result = {'name': None, 'price': None, 'success': False, 'error': str(e)}
+
+            if on_result:
+                on_result(product_id, result)
+            if not result['success']:
+                record_failure(product_id, site, result.get('error', 'Unknown error'))
+            elif not result['price']:
+                summary['skipped'] += 1
+            elif result.get('unchanged'):
+                # Page didn't change since the last scrape: nothing to write,
+                # except to extend the price's run in change-only mode
+                summary['unchanged'] += 1
+                if HISTORY_CHANGE_ONLY:
+                    pending.append((product_id, result))
+                    await flush()
+            else:
+                pending.append((product_id, result))
+                await flush()
+
+        try:
+            await asyncio.gather(*(refresh_one(product_id, url) for product_id, url in targets))
+            await flush(force=True)
+        finally:
+            executor.shutdown(wait=False)
+
+        elapsed = time.perf_counter() - started
+        summary['failures_by_domain'] = dict(summary['failures_by_domain'])
+        summary['elapsed_seconds'] = round(elapsed, 3)
+        summary['products_per_second'] = round(len(targets) / elapsed, 2) if elapsed > 0 else 0.0
+
+        logger.info(
+            f"Bulk refresh: {summary['succeeded']}/{summary['total']} updated, "
+            f"{summary['failed']} failed in {summary['elapsed_seconds']}s"
+        )
+        return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh prices for all tracked products")
+    parser.add_argument("--ids", type=int, nargs="*", help="Only refresh these product ids")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--per-domain", type=int, default=DEFAULT_PER_DOMAIN_CONCURRENCY)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--no-selenium", action="store_true", help="Disable the Selenium fallback")
+    args = parser.parse_args()
+
+    from scraper import PriceScraper
+
+    create_tables()
+    refresher = BulkRefresher(
+        scraper=PriceScraper(use_selenium_fallback=not args.no_selenium),
+        concurrency=args.concurrency,
+        per_domain_concurrency=args.per_domain,
+        batch_size=args.batch_size,
+    )
+    summary = asyncio.run(refresher.refresh(args.ids))
+    print(json.dumps(summary, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import re
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+# Query parameters that only track where a click came from (retailer keys
+# ignore the query entirely, this is for other sites)
+TRACKING_PARAMS = re.compile(
+    r'^(utm_\w+|gclid|gclsrc|dclid|fbclid|msclkid|mc_cid|mc_eid|_ga|ref|ref_|referrer)$',
+    re.IGNORECASE
+)
+
+# Retailer product identifiers in the URL path
+AMAZON_ASIN = re.compile(
+    r'/(?:dp|gp/product|gp/aw/d|gp/offer-listing|exec/obidos/asin|exec/obidos/tg/detail/-|o/asin)/([A-Z0-9]{10})(?:[/?]|$)',
+    re.IGNORECASE
+)
+EBAY_ITEM = re.compile(r'/itm/(?:[^/]+/)?(\d{9,15})(?:[/?]|$)')
+WALMART_ITEM = re.compile(r'/ip/(?:[^/]+/)?(\d{5,15})(?:[/?]|$)')
+
+def split_host(url):
+    """(urlsplit parts, lowercased host without `www.`); raises ValueError for an invalid port"""
+    parts = urlsplit(url.strip())
+    parts.port  # validates the port
+    host = (parts.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    return parts, host
+
+def url_host(url):
+    """A URL's lowercased host without `www.` or port, which the products list's domain filter matches"""
+    return split_host(url)[1]
+
+def marketplace(host, retailer):
+    """The retailer's domain from a host, e.g. 'amazon.co.uk' from 'smile.amazon.co.uk'"""
+    match = re.search(rf'(?:^|\.)({retailer}\.[a-z.]+)$', host)
+    return match.group(1) if match else None
+
+def clean_url(url):
+    """Normalize a URL that no retailer rule recognizes.
+
+    Lowercases the scheme and host, drops `www.`, default ports, fragments,
+    trailing slashes and tracking parameters, and sorts the remaining query.
+    """
+    parts, host = split_host(url)
+    scheme = parts.scheme.lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not TRACKING_PARAMS.match(key)
+    )
+    path = parts.path.rstrip('/') or '/'
+    return urlunsplit((scheme, host, path, urlencode(query), ''))
+
+def canonical_key(url):
+    """Identify the product a URL points at, independent of how the URL is spelled.
+
+    Amazon, eBay and Walmart URLs map to '<marketplace>:<product id>' (the
+    ASIN, item id or product id), so /dp/ASIN, /gp/product/ASIN and links
+    with tracking parameters all collapse to one key. Anything else falls
+    back to clean_url. Raises ValueError for a URL urlsplit can't make
+    sense of (a non-numeric or out of range port).
+    """
+    parts, host = split_host(url)
+    for retailer, pattern in (('amazon', AMAZON_ASIN), ('ebay', EBAY_ITEM), ('walmart', WALMART_ITEM)):
+        domain = marketplace(host, retailer)
+        if domain is None:
+            continue
+        match = pattern.search(parts.path)
+        if match:
+            return f"{domain}:{match.group(1).upper()}"
+    return clean_url(url)
@@ -0,0 +1,104 @@
+import argparse
+import json
+import logging
+import time
+
+from sqlalchemy import bindparam, select, text
+
+from database import engine, create_tables, Product, PriceHistory
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Rows deleted per statement, well below SQLite's bound-parameter limit
+DELETE_CHUNK_SIZE = 500
+
+history = PriceHistory.__table__
+
+def compact_product(conn, product_id):
+    """Fold consecutive identical prices of one product into run-length rows.
+
+    The first row of each run is kept with its `last_seen`/`samples`
+    widened to cover the rows after it, which are deleted. Rows that are
+    already runs merge like any other row. Returns (rows_before, rows_after).
+    """
+    rows = conn.execute(
+        select(history.c.id, history.c.price, history.c.timestamp, history.c.last_seen, history.c.samples)
+        .where(history.c.product_id == product_id)
+        .order_by(history.c.timestamp, history.c.id)
+    ).all()
+
+    updates = []
+    deletes = []
+    head = None
+    for row in rows:
+        if head is not None and row.price == head['price']:
+            head['last_seen'] = row.last_seen or row.timestamp
+            head['samples'] += row.samples or 1
+            head['changed'] = True
+            deletes.append(row.id)
+            continue
+        if head is not None and head['changed']:
+            updates.append(head)
+        head = {
+            'run_id': row.id,
+            'price': row.price,
+            'last_seen': row.last_seen,
+            'samples': row.samples or 1,
+            'changed': False,
+        }
+    if head is not None and head['changed']:
+        updates.append(head)
+
+    if updates:
+        conn.execute(
+            history.update().where(history.c.id == bindparam('run_id')).values(
+                last_seen=bindparam('last_seen'), samples=bindparam('samples')
+            ),
+            [{'run_id': u['run_id'], 'last_seen': u['last_seen'], 'samples': u['samples']} for u in updates]
+        )
+    for i in range(0, len(deletes), DELETE_CHUNK_SIZE):
+        conn.execute(history.delete().where(history.c.id.in_(deletes[i:i + DELETE_CHUNK_SIZE])))
+    return len(rows), len(rows) - len(deletes)
+
+def compact_history(bind=engine, product_ids=None, vacuum=False):
+    """Compact the history of the given products (all by default), one transaction per product"""
+    started = time.perf_counter()
+    with bind.connect() as conn:
+        query = select(Product.__table__.c.id).order_by(Product.__table__.c.id)
+        if product_ids:
+            query = query.where(Product.__table__.c.id.in_(product_ids))
+        targets = [row.id for row in conn.execute(query)]
+
+    rows_before = rows_after = 0
+    for product_id in targets:
+        with bind.begin() as conn:
+            before, after = compact_product(conn, product_id)
+        rows_before += before
+        rows_after += after
+
+    # Deleted rows only become free pages; VACUUM gives the space back to the filesystem
+    if vacuum and bind.dialect.name == 'sqlite':
+        with bind.connect() as conn:
+            conn.execution_options(isolation_level="AUTOCOMMIT").execute(text("VACUUM"))
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"Compacted {len(targets)} products: {rows_before} -> {rows_after} history rows in {elapsed:.1f}s")
+    return {
+        'products': len(targets),
+        'rows_before': rows_before,
+        'rows_after': rows_after,
+        'elapsed_seconds': round(elapsed, 3),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Rewrite price history into change-only runs")
+    parser.add_argument("--ids", type=int, nargs="*", help="Only compact these product ids")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM the SQLite file afterwards")
+    args = parser.parse_args()
+
+    create_tables()
+    print(json.dumps(compact_history(product_ids=args.ids, vacuum=args.vacuum), indent=2))
+
+if __name__ == "__main__":
+    main()
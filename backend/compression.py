@@ -0,0 +1,117 @@
+import os
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+COMPRESSION_MINIMUM_SIZE = int(os.environ.get("COMPRESSION_MINIMUM_SIZE", 1024))
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", 4))
+
+# Long-lived streams of small events: a compressor per connection costs
+# more memory than the few bytes it saves, and proxies may buffer it
+UNCOMPRESSED_TYPES = ('text/event-stream',)
+
+def choose_encoding(accept_encoding):
+    accepted = {part.split(';')[0].strip().lower() for part in accept_encoding.split(',')}
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+class StreamCompressor:
+    """Incremental gzip/brotli compressor with a flush per chunk"""
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data, final=False):
+        if self.encoding == 'br':
+            out = self._compressor.process(data)
+            return out + (self._compressor.finish() if final else self._compressor.flush())
+        out = self._compressor.compress(data)
+        return out + self._compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+class CompressionMiddleware:
+    """Compress responses with brotli (if installed) or gzip.
+
+    Single-body responses below `minimum_size` and server-sent event
+    streams are sent as-is. Other streaming responses are compressed chunk
+    by chunk and flushed after each one, so long-lived streams still
+    deliver every chunk immediately.
+    """
+
+    def __init__(self, app, minimum_size=COMPRESSION_MINIMUM_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, compressor, passthrough
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if "content-encoding" in headers or headers.get("content-type", "").startswith(UNCOMPRESSED_TYPES):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start_message = message
+                return
+
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compressor is None:
+                headers = MutableHeaders(raw=start_message["headers"])
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+                compressor = StreamCompressor(encoding)
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if more_body:
+                    del headers["Content-Length"]
+                    await send(start_message)
+                else:
+                    compressed = compressor.compress(body, final=True)
+                    headers["Content-Length"] = str(len(compressed))
+                    await send(start_message)
+                    await send({"type": "http.response.body", "body": compressed})
+                    return
+            await send({
+                "type": "http.response.body",
+                "body": compressor.compress(body, final=not more_body),
+                "more_body": more_body,
+            })
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,234 @@
+import logging
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Per-domain request rate (0 disables throttling) and burst size
+RATE_LIMIT_PER_SECOND = float(os.environ.get("RATE_LIMIT_PER_SECOND", 5))
+RATE_LIMIT_BURST = int(os.environ.get("RATE_LIMIT_BURST", 10))
+
+# Retries for transient failures: attempts include the first request
+RETRY_ATTEMPTS = int(os.environ.get("RETRY_ATTEMPTS", 3))
+RETRY_BASE_DELAY = float(os.environ.get("RETRY_BASE_DELAY", 0.5))
+RETRY_MAX_DELAY = float(os.environ.get("RETRY_MAX_DELAY", 8))
+
+# Consecutive failed fetches that open a domain's breaker, and how long it stays open
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get("BREAKER_FAILURE_THRESHOLD", 5))
+BREAKER_RESET_SECONDS = float(os.environ.get("BREAKER_RESET_SECONDS", 60))
+
+# Statuses worth retrying; anything else is the page's real answer
+TRANSIENT_STATUSES = {429, 500, 502, 503, 504}
+
+class CircuitOpenError(Exception):
+    """Raised instead of contacting a domain whose breaker is open"""
+
+    def __init__(self, domain, retry_in):
+        super().__init__(f"Circuit open for {domain}, retrying in {retry_in:.0f}s")
+        self.domain = domain
+        self.retry_in = retry_in
+
+class TokenBucket:
+    """Thread-safe token bucket; `acquire` blocks until a request may start.
+
+    Callers reserve their token up front (the balance may go negative), so
+    waiting threads are served in arrival order at exactly `rate` per second.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """Take a token, sleeping if none is available; returns seconds waited"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    def available(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+class CircuitBreaker:
+    """closed -> open after `threshold` consecutive failures -> half_open after
+    `reset_seconds`, where a single trial request decides whether it closes again"""
+
+    def __init__(self, threshold, reset_seconds):
+        self.threshold = max(1, threshold)
+        self.reset_seconds = reset_seconds
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def retry_in(self):
+        if self.state != 'open':
+            return 0.0
+        return max(0.0, self.opened_at + self.reset_seconds - time.monotonic())
+
+    def allow(self):
+        """Whether a request may go out now; moves open -> half_open once the reset time passed"""
+        with self._lock:
+            if self.state == 'open' and self.retry_in() <= 0:
+                self.state = 'half_open'
+                self._trial_running = False
+            if self.state == 'closed':
+                return True
+            if self.state == 'half_open' and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def is_open(self):
+        with self._lock:
+            return self.state == 'open' and self.retry_in() > 0
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        """Count a failed fetch; returns True if this opened the breaker"""
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == 'half_open' or (self.state == 'closed' and self.failures >= self.threshold):
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+class DomainGuard:
+    """Rate limiting, retries and circuit breaking for outgoing page fetches, per domain"""
+
+    def __init__(self, rate=RATE_LIMIT_PER_SECOND, burst=RATE_LIMIT_BURST,
+                 attempts=RETRY_ATTEMPTS, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY,
+                 failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_seconds=BREAKER_RESET_SECONDS):
+        self.rate = rate
+        self.burst = burst
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._breakers = {}
+        self._counters = defaultdict(lambda: dict.fromkeys(
+            ('requests', 'retries', 'failures', 'short_circuited', 'throttled_seconds'), 0
+        ))
+
+    def bucket(self, domain):
+        with self._lock:
+            if domain not in self._buckets:
+                self._buckets[domain] = TokenBucket(self.rate, self.burst)
+            return self._buckets[domain]
+
+    def breaker(self, domain):
+        with self._lock:
+            if domain not in self._breakers:
+                self._breakers[domain] = CircuitBreaker(self.failure_threshold, self.reset_seconds)
+            return self._breakers[domain]
+
+    def _count(self, domain, key, amount=1):
+        with self._lock:
+            self._counters[domain][key] += amount
+
+    def is_open(self, domain):
+        """True while the domain's breaker is failing fast"""
+        return self.breaker(domain).is_open()
+
+    def backoff(self, attempt, response=None):
+        """Full-jitter exponential delay, honouring a (capped) Retry-After header"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(self.max_delay, float(retry_after)))
+        return delay
+
+    def fetch(self, domain, send):
+        """Call `send()` (which returns a requests.Response) under the domain's policy.
+
+        Connection errors, timeouts and 429/5xx answers are retried with
+        backoff. A fetch that still fails counts against the breaker; while
+        the breaker is open this raises CircuitOpenError without sending.
+        """
+        breaker = self.breaker(domain)
+        bucket = self.bucket(domain)
+        response = None
+        for attempt in range(self.attempts):
+            if not breaker.allow():
+                self._count(domain, 'short_circuited')
+                raise CircuitOpenError(domain, breaker.retry_in())
+            self._count(domain, 'throttled_seconds', bucket.acquire())
+            self._count(domain, 'requests')
+            try:
+                response = send()
+                error = None
+            except (requests.ConnectionError, requests.Timeout) as e:
+                response, error = None, e
+            if response is not None and response.status_code not in TRANSIENT_STATUSES:
+                breaker.record_success()
+                return response
+
+            # A failed half-open trial is final rather than retried behind the breaker's back
+            last_attempt = attempt == self.attempts - 1
+            if last_attempt or breaker.state == 'half_open':
+                self._count(domain, 'failures')
+                if breaker.record_failure():
+                    logger.warning(f"Circuit opened for {domain} after {breaker.failures} failed fetches")
+                if error is not None:
+                    raise error
+                return response
+            self._count(domain, 'retries')
+            time.sleep(self.backoff(attempt, response))
+        return response
+
+    def state(self):
+        """Breaker and limiter state per domain seen so far"""
+        with self._lock:
+            domains = set(self._breakers) | set(self._counters)
+            counters = {domain: dict(self._counters[domain]) for domain in domains}
+        report = {}
+        for domain in sorted(domains):
+            breaker = self.breaker(domain)
+            values = counters[domain]
+            state = breaker.state
+            if state == 'open' and not breaker.is_open():
+                # Reset time passed: the next fetch is the half-open trial
+                state = 'half_open'
+            report[domain] = {
+                'state': state,
+                'consecutive_failures': breaker.failures,
+                'retry_in_seconds': round(breaker.retry_in(), 3),
+                'tokens': round(self.bucket(domain).available(), 3) if self.rate > 0 else None,
+                'requests': values['requests'],
+                'retries': values['retries'],
+                'failures': values['failures'],
+                'short_circuited': values['short_circuited'],
+                'throttled_seconds': round(values['throttled_seconds'], 3),
+            }
+        return report
@@ -0,0 +1,198 @@
+import argparse
+import csv
+import importlib.util
+import io
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime
+
+from sqlalchemy import select
+
+from database import engine, create_tables, Product, PriceHistory
+
+# pyarrow is optional; without it Parquet export is unavailable. It takes
+# longer to import than the whole API, so it is only loaded for a Parquet export
+HAVE_PYARROW = importlib.util.find_spec("pyarrow") is not None
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched from the database cursor (and written out) at a time
+EXPORT_CHUNK_SIZE = int(os.environ.get("EXPORT_CHUNK_SIZE", 10000))
+
+EXPORT_FORMATS = ('ndjson', 'csv', 'parquet')
+MEDIA_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+history = PriceHistory.__table__
+products = Product.__table__
+
+# Exported columns, in output order
+HISTORY_COLUMNS = ('product_id', 'price', 'timestamp', 'last_seen', 'samples')
+PRODUCT_COLUMNS = ('id', 'name', 'url', 'current_price', 'last_updated', 'created_at')
+
+def format_error(export_format):
+    """Why a format can't be exported, or None"""
+    if export_format not in EXPORT_FORMATS:
+        return f"Unknown export format: {export_format} (expected one of {', '.join(EXPORT_FORMATS)})"
+    if export_format == 'parquet' and not HAVE_PYARROW:
+        return "Parquet export needs the optional pyarrow package"
+    return None
+
+def history_select(product_ids=None, start=None, end=None):
+    """History rows in (product_id, timestamp) order, which the composite index already has"""
+    query = select(*[history.c[name] for name in HISTORY_COLUMNS])
+    if product_ids:
+        query = query.where(history.c.product_id.in_(product_ids))
+    if start is not None:
+        query = query.where(history.c.timestamp >= start)
+    if end is not None:
+        query = query.where(history.c.timestamp <= end)
+    return query.order_by(history.c.product_id, history.c.timestamp, history.c.id)
+
+def products_select(product_ids=None):
+    query = select(*[products.c[name] for name in PRODUCT_COLUMNS])
+    if product_ids:
+        query = query.where(products.c.id.in_(product_ids))
+    return query.order_by(products.c.id)
+
+def fetch_chunks(bind, query, chunk_size=EXPORT_CHUNK_SIZE):
+    """Rows of a query in lists of `chunk_size`, from a server-side cursor.
+
+    Only one chunk is in memory at a time, however many rows match.
+    """
+    with bind.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(query)
+        for rows in result.partitions():
+            yield rows
+
+def json_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def ndjson_chunks(chunks, columns):
+    for rows in chunks:
+        yield ''.join(
+            json.dumps(dict(zip(columns, map(json_value, row))), separators=(',', ':')) + '\n' for row in rows
+        ).encode('utf-8')
+
+def csv_chunks(chunks, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    # Header first, so an export with no rows still has one
+    yield buffer.getvalue().encode('utf-8')
+    for rows in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([json_value(value) for value in row] for row in rows)
+        yield buffer.getvalue().encode('utf-8')
+
+class ChunkSink:
+    """Write-only file that hands out what was written since the last call"""
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+def parquet_schema(columns):
+    import pyarrow
+
+    types = {
+        'id': pyarrow.int64(), 'product_id': pyarrow.int64(), 'samples': pyarrow.int64(),
+        'price': pyarrow.float64(), 'current_price': pyarrow.float64(),
+        'timestamp': pyarrow.timestamp('us'), 'last_seen': pyarrow.timestamp('us'),
+        'last_updated': pyarrow.timestamp('us'), 'created_at': pyarrow.timestamp('us'),
+    }
+    return pyarrow.schema([(name, types.get(name, pyarrow.string())) for name in columns])
+
+def parquet_chunks(chunks, columns):
+    """One Parquet row group per chunk, streamed out as each is written"""
+    import pyarrow
+    import pyarrow.parquet
+
+    schema = parquet_schema(columns)
+    sink = ChunkSink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema, compression='zstd')
+    for rows in chunks:
+        arrays = [pyarrow.array([row[i] for row in rows], type=schema.field(i).type) for i in range(len(columns))]
+        writer.write_table(pyarrow.Table.from_arrays(arrays, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+ENCODERS = {'ndjson': ndjson_chunks, 'csv': csv_chunks, 'parquet': parquet_chunks}
+
+def export_history(bind=engine, export_format='ndjson', product_ids=None, start=None, end=None,
+                   chunk_size=EXPORT_CHUNK_SIZE):
+    """Encoded chunks (bytes) of price history, optionally filtered by product and time window"""
+    chunks = fetch_chunks(bind, history_select(product_ids, start, end), chunk_size)
+    return ENCODERS[export_format](chunks, HISTORY_COLUMNS)
+
+def export_products(bind=engine, export_format='ndjson', product_ids=None, chunk_size=EXPORT_CHUNK_SIZE):
+    chunks = fetch_chunks(bind, products_select(product_ids), chunk_size)
+    return ENCODERS[export_format](chunks, PRODUCT_COLUMNS)
+
+def main():
+    parser = argparse.ArgumentParser(description="Export products or price history")
+    parser.add_argument("table", choices=("history", "products"))
+    parser.add_argument("--format", default="ndjson", choices=EXPORT_FORMATS)
+    parser.add_argument("--output", "-o", help="File to write (default: stdout)")
+    parser.add_argument("--ids", type=int, nargs="*", help="Only these product ids")
+    parser.add_argument("--start", type=datetime.fromisoformat, help="History from this timestamp")
+    parser.add_argument("--end", type=datetime.fromisoformat, help="History up to this timestamp")
+    parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    error = format_error(args.format)
+    if error:
+        parser.error(error)
+
+    logging.basicConfig(level=logging.INFO)
+    create_tables()
+    if args.table == "history":
+        chunks = export_history(
+            export_format=args.format, product_ids=args.ids, start=args.start, end=args.end,
+            chunk_size=args.chunk_size
+        )
+    else:
+        chunks = export_products(export_format=args.format, product_ids=args.ids, chunk_size=args.chunk_size)
+
+    started = time.perf_counter()
+    written = 0
+    output = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in chunks:
+            output.write(chunk)
+            written += len(chunk)
+    finally:
+        if args.output:
+            output.close()
+    logger.info(f"Exported {written / 1e6:.1f} MB in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+import os
+import threading
+from collections import deque
+
+try:
+    from lxml import etree
+    from lxml.cssselect import CSSSelector
+except ImportError:  # lxml/cssselect are optional
+    etree = None
+    CSSSelector = None
+
+HAVE_LXML = etree is not None and CSSSelector is not None
+
+# "auto" picks lxml when installed, otherwise BeautifulSoup's html.parser
+EXTRACTION_BACKEND = os.environ.get("EXTRACTION_BACKEND", "auto")
+# Stop parsing once every field has been found (lxml backend only)
+EXTRACTION_PARTIAL = os.environ.get("EXTRACTION_PARTIAL", "1") == "1"
+EXTRACTION_CHUNK_SIZE = int(os.environ.get("EXTRACTION_CHUNK_SIZE", 32 * 1024))
+
+# Returned for a match the parser hasn't finished reading yet
+INCOMPLETE = object()
+
+def stripped_text(strings):
+    """Join text nodes the way BeautifulSoup's get_text(strip=True) does"""
+    return ''.join(text.strip() for text in strings if text and text.strip())
+
+class SoupBackend:
+    """BeautifulSoup parsing with soupsieve selectors compiled once"""
+
+    name = 'soup'
+    supports_partial = False
+
+    def __init__(self, parser='html.parser'):
+        # Imported here: BeautifulSoup is slow to load and unused when lxml is installed
+        import soupsieve
+        from bs4 import BeautifulSoup
+
+        self.parser = parser
+        self._compiled = {}
+        self._compile = soupsieve.compile
+        self._soup = BeautifulSoup
+
+    def compile(self, selector):
+        compiled = self._compiled.get(selector)
+        if compiled is None:
+            compiled = self._compiled[selector] = self._compile(selector)
+        return compiled
+
+    def parse(self, content):
+        return self._soup(content, self.parser)
+
+    def first_text(self, doc, selector):
+        element = self.compile(selector).select_one(doc)
+        if element is None:
+            return None
+        return element.get_text(strip=True)
+
+class LxmlBackend:
+    """libxml2 parsing with CSS selectors precompiled to XPath"""
+
+    name = 'lxml'
+    supports_partial = True
+
+    def __init__(self, chunk_size=EXTRACTION_CHUNK_SIZE):
+        self.chunk_size = max(1024, chunk_size)
+        # Compiled XPath objects shouldn't be shared between scraper threads
+        self._local = threading.local()
+
+    def compile(self, selector):
+        compiled_selectors = getattr(self._local, 'compiled', None)
+        if compiled_selectors is None:
+            compiled_selectors = self._local.compiled = {}
+        compiled = compiled_selectors.get(selector)
+        if compiled is None:
+            compiled = compiled_selectors[selector] = CSSSelector(selector, translator='html')
+        return compiled
+
+    def parse(self, content):
+        parser = etree.HTMLParser()
+        parser.feed(content)
+        return parser.close()
+
+    def first_text(self, doc, selector, complete_only=False):
+        for element in self.compile(selector)(doc):
+            if complete_only and not self.is_complete(element):
+                return INCOMPLETE
+            return stripped_text(element.itertext())
+        return None
+
+    def is_complete(self, element):
+        """True once the parser has moved past an element's end tag.
+
+        While feeding, only the right-most spine of the tree can still be
+        open; an element that has tail text, or any ancestor with a later
+        sibling, has been closed.
+        """
+        if element.tail:
+            return True
+        node = element
+        while node is not None:
+            if node.getnext() is not None:
+                return True
+            node = node.getparent()
+        return False
+
+    def iter_partial(self, content):
+        """Feed content in chunks, yielding (tree, finished) after each one"""
+        parser = etree.HTMLPullParser(events=('start',))
+        root = None
+        for offset in range(0, len(content), self.chunk_size):
+            parser.feed(content[offset:offset + self.chunk_size])
+            events = deque(parser.read_events(), maxlen=1)
+            if root is None and events:
+                root = events[0][1].getroottree().getroot()
+            if root is not None:
+                yield root, False
+        parser.close()
+        events = deque(parser.read_events(), maxlen=1)
+        if root is None and events:
+            root = events[0][1].getroottree().getroot()
+        if root is not None:
+            yield root, True
+
+class HtmlExtractor:
+    """Extract fields from an HTML page using ordered selector lists.
+
+    For every field the selectors are tried in order and the first one that
+    yields a usable value wins. With a backend that supports it, partial
+    mode feeds the page in chunks and stops parsing as soon as every field
+    has been resolved from a fully parsed element. Until the whole page is
+    parsed, a selector with no match yet may still match further down, so
+    a lower-priority selector only wins once every selector before it has
+    matched nothing in the complete document; the result is always the one
+    a full parse gives.
+    """
+
+    def __init__(self, backend=EXTRACTION_BACKEND, partial=EXTRACTION_PARTIAL):
+        self.backend = self.create_backend(backend)
+        self.partial = partial and self.backend.supports_partial
+
+    def create_backend(self, backend):
+        if backend == 'lxml' or (backend == 'auto' and HAVE_LXML):
+            if not HAVE_LXML:
+                raise RuntimeError("The lxml extraction backend requires lxml and cssselect")
+            return LxmlBackend()
+        if backend == 'soup-lxml':
+            return SoupBackend('lxml')
+        return SoupBackend()
+
+    def resolve(self, doc, fields, converters, values, matched, complete_only=False):
+        """Fill in fields not yet present in `values`; return True when all are set.
+
+        With `complete_only` (the document is still being fed), a selector
+        that matches nothing or only a still-open element is unsettled and
+        the field waits for more input.
+        """
+        options = {'complete_only': True} if complete_only else {}
+        for field, selectors in fields.items():
+            if values.get(field) is not None:
+                continue
+            convert = converters.get(field)
+            for selector in selectors:
+                text = self.backend.first_text(doc, selector, **options)
+                if text is INCOMPLETE or (complete_only and text is None):
+                    # Wait for more input rather than settle for a lower-priority selector
+                    break
+                value = convert(text) if convert and text is not None else text
+                if value:
+                    values[field] = value
+                    matched[field] = selector
+                    break
+        return all(values.get(field) is not None for field in fields)
+
+    def extract(self, content, fields, converters=None, matched=None):
+        """Return {field: value or None} for `fields` ({field: [selectors]}).
+
+        If `matched` is a dict, the selector that produced each found field
+        is stored in it.
+        """
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        converters = converters or {}
+        values = {}
+        matched = {} if matched is None else matched
+
+        if self.partial:
+            for doc, finished in self.backend.iter_partial(content):
+                if self.resolve(doc, fields, converters, values, matched, complete_only=not finished):
+                    break
+        else:
+            doc = self.backend.parse(content)
+            if doc is not None:
+                self.resolve(doc, fields, converters, values, matched)
+
+        return {field: values.get(field) for field in fields}
@@ -0,0 +1,361 @@
+import math
+import os
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import Integer, case, cast, func, literal, select, text, union_all
+
+from alerts import evaluate_alerts
+from database import PriceHistory, PriceHistoryDaily
+from live_updates import publish_price
+from product_stats import update_stats
+from retention import read_archive, day_of, RETENTION_ARCHIVE_DIR
+
+# Largest series the history endpoints will return in one response
+MAX_HISTORY_POINTS = 10000
+
+# Extend the latest row's run instead of inserting when the price is unchanged
+HISTORY_CHANGE_ONLY = os.environ.get("HISTORY_CHANGE_ONLY", "0") == "1"
+
+# Timestamps are stored as naive UTC
+EPOCH = datetime(1970, 1, 1)
+
+# One observed price, as returned by the history endpoints (points of
+# rolled-up days have no id)
+HistoryPoint = namedtuple('HistoryPoint', ['id', 'product_id', 'price', 'timestamp'])
+
+def record_price(db, product_id, price, observed_at=None, change_only=None):
+    """Add a price observation to the session (the caller commits).
+
+    In change-only mode an observation equal to the product's latest price
+    goes through extend_price instead, so a price that sits still for
+    months costs one row instead of one per poll.
+
+    The product's running stats are updated and its alert rules checked on
+    the way, before the new row exists, and a delta is queued for live
+    update subscribers.
+    """
+    observed_at = observed_at or datetime.utcnow()
+    if HISTORY_CHANGE_ONLY if change_only is None else change_only:
+        latest = extend_price(db, product_id, price, observed_at)
+        if latest is not None:
+            return latest
+    before, _ = update_stats(db, product_id, price, observed_at)
+    evaluate_alerts(db, product_id, price, observed_at, before)
+    publish_price(db, product_id, price, observed_at)
+    entry = PriceHistory(product_id=product_id, price=price, timestamp=observed_at)
+    db.add(entry)
+    return entry
+
+def extend_run(db, product_id, price, observed_at):
+    """Move the latest row's `last_seen` to `observed_at` if it holds `price`; returns the row or None"""
+    latest = db.query(PriceHistory).filter(PriceHistory.product_id == product_id).order_by(
+        PriceHistory.timestamp.desc(), PriceHistory.id.desc()
+    ).first()
+    if latest is not None and latest.price == price and observed_at >= latest.timestamp:
+        latest.last_seen = observed_at
+        latest.samples = (latest.samples or 1) + 1
+        return latest
+    return None
+
+def extend_price(db, product_id, price, observed_at=None):
+    """Count a re-confirmed price in change-only mode (the caller commits).
+
+    Used by record_price for a scraped price equal to the latest one, and
+    directly for scrapes answered from the page cache (a 304, or the same
+    content). Only the latest row's run and the running stats move, so
+    `last_seen` follows the last confirmed observation. Nothing is
+    inserted: if the latest row holds another price it is left alone. An
+    unchanged price fires no alerts and has no delta to publish. Returns
+    the extended row, or None.
+    """
+    observed_at = observed_at or datetime.utcnow()
+    latest = extend_run(db, product_id, price, observed_at)
+    if latest is not None:
+        update_stats(db, product_id, price, observed_at)
+    return latest
+
+def window_floor(db, product_id, start):
+    """Earliest timestamp whose run can still reach into a window opening at `start`.
+
+    That is the first_seen of the run covering `start` (one indexed lookup),
+    so window queries keep a bounded index range on (product_id, timestamp).
+    """
+    if start is None:
+        return None
+    covering = db.query(PriceHistory.timestamp, PriceHistory.last_seen).filter(
+        PriceHistory.product_id == product_id, PriceHistory.timestamp < start
+    ).order_by(PriceHistory.timestamp.desc(), PriceHistory.id.desc()).first()
+    if covering is not None and covering.last_seen is not None and covering.last_seen >= start:
+        return covering.timestamp
+    return start
+
+def history_query(db, product_id, start=None, end=None, descending=False):
+    """Query for stored (id, product_id, price, timestamp, last_seen) rows of a product within a time window"""
+    query = db.query(
+        PriceHistory.id, PriceHistory.product_id, PriceHistory.price, PriceHistory.timestamp,
+        PriceHistory.last_seen
+    ).filter(PriceHistory.product_id == product_id)
+    if start is not None:
+        query = query.filter(PriceHistory.timestamp >= start)
+    if end is not None:
+        query = query.filter(PriceHistory.timestamp <= end)
+    order = PriceHistory.timestamp.desc() if descending else PriceHistory.timestamp.asc()
+    return query.order_by(order)
+
+def row_points(rows, start=None, end=None):
+    """Points of stored (or archived) rows, see history_rows"""
+    points = []
+    for row in rows:
+        # Runs are clamped to the window at both ends
+        first = row.timestamp if start is None else max(row.timestamp, start)
+        if end is not None and first > end:
+            continue
+        points.append(HistoryPoint(row.id, row.product_id, row.price, first))
+        last = row.last_seen if end is None or row.last_seen is None else min(row.last_seen, end)
+        if last is not None and last > first:
+            points.append(HistoryPoint(row.id, row.product_id, row.price, last))
+    return points
+
+def daily_query(db, product_id, start=None, end=None):
+    """Query for the daily aggregates of a product overlapping a time window"""
+    query = db.query(PriceHistoryDaily).filter(PriceHistoryDaily.product_id == product_id)
+    if start is not None:
+        query = query.filter(PriceHistoryDaily.day >= day_of(start))
+    if end is not None:
+        query = query.filter(PriceHistoryDaily.day <= end)
+    return query.order_by(PriceHistoryDaily.day)
+
+def day_points(day):
+    """A daily aggregate as its open, low, high and close points, in time order"""
+    prices = {day.opened_at: day.open, day.low_at: day.low, day.high_at: day.high, day.closed_at: day.close}
+    return [HistoryPoint(None, day.product_id, prices[at], at) for at in sorted(prices)]
+
+def rolled_up_points(db, product_id, start=None, end=None, include_archived=False):
+    """Points of the days rolled up by retention within a time window.
+
+    With `include_archived`, days whose raw rows went to an archive file
+    are read back from it instead of being summarised by their aggregate.
+    """
+    points = []
+    archived_days = set()
+    for day in daily_query(db, product_id, start, end):
+        if include_archived and day.archived and RETENTION_ARCHIVE_DIR:
+            archived_days.add(day.day)
+            continue
+        points.extend(
+            point for point in day_points(day)
+            if (start is None or point.timestamp >= start) and (end is None or point.timestamp <= end)
+        )
+    if archived_days:
+        points.extend(
+            point for point in row_points(read_archive(product_id, start, end), start, end)
+            if day_of(point.timestamp) in archived_days
+        )
+    return points
+
+def history_rows(db, product_id, start=None, end=None, descending=False, include_archived=False):
+    """Observed points of a product within a time window, oldest first by default.
+
+    A run-length row becomes two points, at first_seen and last_seen, which
+    draws the same step line as the individual observations it replaced.
+    A run already under way at `start` contributes a point at `start`, and
+    one still going at `end` a point at `end`.
+    Days rolled up by retention contribute their open/low/high/close
+    points, or their archived rows with `include_archived`.
+    """
+    points = row_points(history_query(db, product_id, window_floor(db, product_id, start), end), start, end)
+    rolled_up = rolled_up_points(db, product_id, start, end, include_archived)
+    if rolled_up:
+        points = sorted(rolled_up + points, key=lambda point: point.timestamp)
+    if descending:
+        points.reverse()
+    return points
+
+def explain_query_plan(db, query):
+    """SQLite's EXPLAIN QUERY PLAN detail lines for an ORM query"""
+    statement = query.statement.compile(db.get_bind(), compile_kwargs={"literal_binds": True})
+    return [row[-1] for row in db.execute(text(f"EXPLAIN QUERY PLAN {statement}"))]
+
+def lttb(rows, max_points):
+    """Largest-Triangle-Three-Buckets downsampling of time-ordered rows.
+
+    Keeps the first and last rows and, for every bucket in between, the row
+    forming the largest triangle with the previously kept row and the mean
+    of the next bucket, which preserves the visual shape of the series.
+    Returned rows are a subset of the input, so their schema is unchanged.
+    """
+    count = len(rows)
+    if max_points is None or count <= max_points:
+        return list(rows)
+    if max_points < 3:
+        return [rows[0], rows[-1]][:max_points]
+
+    xs = [(row.timestamp - EPOCH).total_seconds() for row in rows]
+    ys = [row.price for row in rows]
+    sampled = [rows[0]]
+    every = (count - 2) / (max_points - 2)
+    anchor = 0
+
+    for i in range(max_points - 2):
+        avg_start = int((i + 1) * every) + 1
+        avg_end = min(int((i + 2) * every) + 1, count)
+        span = avg_end - avg_start
+        avg_x = sum(xs[avg_start:avg_end]) / span
+        avg_y = sum(ys[avg_start:avg_end]) / span
+
+        range_start = int(i * every) + 1
+        range_end = int((i + 1) * every) + 1
+        ax, ay = xs[anchor], ys[anchor]
+        best_area = -1.0
+        best = range_start
+        for j in range(range_start, range_end):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best_area = area
+                best = j
+        sampled.append(rows[best])
+        anchor = best
+
+    sampled.append(rows[-1])
+    return sampled
+
+def epoch_seconds(db, column):
+    """SQL expression for a timestamp column as integer Unix seconds"""
+    if db.get_bind().dialect.name == 'sqlite':
+        return cast(func.strftime('%s', column), Integer)
+    return cast(func.floor(func.extract('epoch', column)), Integer)
+
+def bucket_width(db, product_id, start, end, max_points):
+    """Bucket size in seconds so the window fits in roughly `max_points` buckets"""
+    last_seen = func.coalesce(PriceHistory.last_seen, PriceHistory.timestamp)
+    query = db.query(func.min(PriceHistory.timestamp), func.max(last_seen)).filter(
+        PriceHistory.product_id == product_id
+    )
+    floor = window_floor(db, product_id, start)
+    if floor is not None:
+        query = query.filter(PriceHistory.timestamp >= floor)
+    if end is not None:
+        query = query.filter(PriceHistory.timestamp <= end)
+    first, last = query.one()
+    days = db.query(func.min(PriceHistoryDaily.opened_at), func.max(PriceHistoryDaily.closed_at)).filter(
+        PriceHistoryDaily.product_id == product_id
+    )
+    if start is not None:
+        days = days.filter(PriceHistoryDaily.day >= day_of(start))
+    if end is not None:
+        days = days.filter(PriceHistoryDaily.day <= end)
+    days_first, days_last = days.one()
+    if days_first is not None:
+        first = days_first if first is None else min(first, days_first)
+        last = days_last if last is None else max(last, days_last)
+    if first is None:
+        return 1
+    span = ((end or last) - max(start or first, first)).total_seconds()
+    return max(1, math.ceil(span / max_points))
+
+def observation_points(db, product_id, start=None, end=None):
+    """Subquery of (id, price, at, weight, total) points, the SQL twin of history_rows.
+
+    Each stored row yields its first_seen point with weight 1 and, for a
+    run, its last_seen point carrying the remaining samples; `total` is
+    their price times weight. A rolled-up day yields its open, low, high
+    and close points, the close carrying the day's samples and total, if
+    it lies wholly inside the window.
+    """
+    conditions = [PriceHistory.product_id == product_id]
+    floor = window_floor(db, product_id, start)
+    if floor is not None:
+        conditions.append(PriceHistory.timestamp >= floor)
+    if end is not None:
+        conditions.append(PriceHistory.timestamp <= end)
+
+    first_seen = select(
+        PriceHistory.id.label('id'),
+        PriceHistory.price.label('price'),
+        PriceHistory.timestamp.label('at'),
+        literal(1).label('weight'),
+        PriceHistory.price.label('total'),
+    ).where(*conditions)
+    last_seen = select(
+        PriceHistory.id.label('id'),
+        PriceHistory.price.label('price'),
+        PriceHistory.last_seen.label('at'),
+        (PriceHistory.samples - 1).label('weight'),
+        (PriceHistory.price * (PriceHistory.samples - 1)).label('total'),
+    ).where(*conditions, PriceHistory.last_seen > PriceHistory.timestamp)
+    if start is not None:
+        first_seen = first_seen.where(PriceHistory.timestamp >= start)
+        last_seen = last_seen.where(PriceHistory.last_seen >= start)
+    if end is not None:
+        last_seen = last_seen.where(PriceHistory.last_seen <= end)
+
+    # Aggregates can't be split, so only days wholly inside the window count
+    day_conditions = [PriceHistoryDaily.product_id == product_id]
+    if start is not None:
+        day_conditions += [PriceHistoryDaily.day >= day_of(start), PriceHistoryDaily.opened_at >= start]
+    if end is not None:
+        day_conditions += [PriceHistoryDaily.day <= end, PriceHistoryDaily.closed_at <= end]
+    # The (made-up) ids order a day's points that share a timestamp, close last
+    days = [
+        select(
+            literal(order).label('id'),
+            price.label('price'),
+            at.label('at'),
+            weight.label('weight'),
+            total.label('total'),
+        ).where(*day_conditions)
+        for order, (price, at, weight, total) in enumerate((
+            (PriceHistoryDaily.open, PriceHistoryDaily.opened_at, literal(0), literal(0.0)),
+            (PriceHistoryDaily.low, PriceHistoryDaily.low_at, literal(0), literal(0.0)),
+            (PriceHistoryDaily.high, PriceHistoryDaily.high_at, literal(0), literal(0.0)),
+            (PriceHistoryDaily.close, PriceHistoryDaily.closed_at, PriceHistoryDaily.samples,
+             PriceHistoryDaily.avg_price * PriceHistoryDaily.samples),
+        ))
+    ]
+    return union_all(first_seen, last_seen, *days).subquery()
+
+def bucket_series(db, product_id, bucket_seconds, start=None, end=None):
+    """Aggregate history into fixed-width buckets: min/max/avg/last/count per bucket"""
+    points = observation_points(db, product_id, start, end)
+    bucket = (epoch_seconds(db, points.c.at) // bucket_seconds).label('bucket')
+
+    # Rank points inside each bucket so the closing price comes out of the same scan
+    ranked = db.query(
+        bucket,
+        points.c.price.label('price'),
+        points.c.weight.label('weight'),
+        points.c.total.label('total'),
+        func.row_number().over(
+            partition_by=bucket,
+            order_by=(points.c.at.desc(), points.c.id.desc())
+        ).label('rank'),
+    ).subquery()
+
+    # Samples folded into a run (or a rolled-up day) count towards the bucket
+    # holding its last_seen (or close)
+    weight = func.sum(ranked.c.weight)
+    rows = db.query(
+        ranked.c.bucket,
+        func.min(ranked.c.price).label('min'),
+        func.max(ranked.c.price).label('max'),
+        func.coalesce(
+            func.sum(ranked.c.total) / func.nullif(weight, 0), func.avg(ranked.c.price)
+        ).label('avg'),
+        func.coalesce(weight, 0).label('count'),
+        func.max(case((ranked.c.rank == 1, ranked.c.price))).label('last'),
+    ).group_by(ranked.c.bucket).order_by(ranked.c.bucket).all()
+
+    series = []
+    for row in rows:
+        bucket_start = row.bucket * bucket_seconds
+        series.append({
+            'start': EPOCH + timedelta(seconds=bucket_start),
+            'end': EPOCH + timedelta(seconds=bucket_start + bucket_seconds),
+            'min': row.min,
+            'max': row.max,
+            'avg': row.avg,
+            'last': row.last,
+            'count': row.count,
+        })
+    return series
@@ -0,0 +1,408 @@
+import itertools
+import json
+import os
+import random
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, or_, and_, select, update
+
+from database import SessionLocal, ScrapeJob
+
+# With JOB_QUEUE_ENABLED=1 the API only enqueues scrapes; `python worker.py` runs them
+JOB_QUEUE_ENABLED = os.environ.get("JOB_QUEUE_ENABLED", "0") == "1"
+JOB_QUEUE_BACKEND = os.environ.get("JOB_QUEUE_BACKEND", "database")
+
+# Attempts before a job moves to the dead-letter list
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", 5))
+# Seconds a worker owns a claimed job before another worker may take it over
+JOB_LEASE_SECONDS = float(os.environ.get("JOB_LEASE_SECONDS", 300))
+# Retry backoff in seconds, doubling per attempt up to the maximum
+JOB_RETRY_BASE_DELAY = float(os.environ.get("JOB_RETRY_BASE_DELAY", 30))
+JOB_RETRY_MAX_DELAY = float(os.environ.get("JOB_RETRY_MAX_DELAY", 3600))
+
+JOB_KINDS = ('refresh', 'create')
+JOB_STATUSES = ('queued', 'leased', 'done', 'dead')
+
+def retry_delay(attempts, base, maximum):
+    """Jittered exponential backoff after `attempts` failed attempts"""
+    delay = min(maximum, base * 2 ** max(0, attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+def job_dict(job):
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'url': job.url,
+        'product_id': job.product_id,
+        'status': job.status,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'available_at': job.available_at,
+        'lease_owner': job.lease_owner,
+        'lease_expires_at': job.lease_expires_at,
+        'result': json.loads(job.result) if job.result else None,
+        'error': job.error,
+        'created_at': job.created_at,
+        'updated_at': job.updated_at,
+        'finished_at': job.finished_at,
+    }
+
+class DatabaseJobQueue:
+    """Durable scrape job queue in the `scrape_jobs` table.
+
+    Workers claim jobs with a single conditional UPDATE, which takes a
+    lease: the job is theirs until `lease_expires_at`, after which any
+    worker may claim it again (the previous one presumably died). A failed
+    attempt is retried with exponential backoff; after `max_attempts` the
+    job is marked dead and stays in the dead-letter list until retried.
+    Enqueueing a refresh for a product that already has one pending
+    returns the pending job instead.
+    """
+
+    def __init__(self, session_factory=SessionLocal, max_attempts=JOB_MAX_ATTEMPTS,
+                 lease_seconds=JOB_LEASE_SECONDS, retry_base_delay=JOB_RETRY_BASE_DELAY,
+                 retry_max_delay=JOB_RETRY_MAX_DELAY):
+        self.session_factory = session_factory
+        self.max_attempts = max(1, max_attempts)
+        self.lease_seconds = lease_seconds
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+
+    def enqueue(self, kind, url, product_id=None):
+        return self.enqueue_many([(kind, url, product_id)])[0]
+
+    def enqueue_many(self, jobs):
+        """Add (kind, url, product_id) jobs in one transaction and return them"""
+        db = self.session_factory()
+        try:
+            refresh_ids = [product_id for kind, _, product_id in jobs if kind == 'refresh' and product_id]
+            pending = {}
+            if refresh_ids:
+                pending = {
+                    job.product_id: job for job in db.query(ScrapeJob).filter(
+                        ScrapeJob.kind == 'refresh',
+                        ScrapeJob.product_id.in_(refresh_ids),
+                        ScrapeJob.status.in_(('queued', 'leased'))
+                    )
+                }
+            now = datetime.utcnow()
+            added = []
+            for kind, url, product_id in jobs:
+                if kind not in JOB_KINDS:
+                    raise ValueError(f"Unknown job kind: {kind}")
+                job = pending.get(product_id) if kind == 'refresh' else None
+                if job is None:
+                    job = ScrapeJob(
+                        kind=kind, url=url, product_id=product_id, status='queued', attempts=0,
+                        max_attempts=self.max_attempts, available_at=now, created_at=now, updated_at=now
+                    )
+                    db.add(job)
+                    if kind == 'refresh' and product_id:
+                        pending[product_id] = job
+                added.append(job)
+            db.commit()
+            return [job_dict(job) for job in added]
+        finally:
+            db.close()
+
+    def claim(self, worker_id, limit=1):
+        """Lease up to `limit` available jobs to a worker, oldest first"""
+        if limit <= 0:
+            return []
+        now = datetime.utcnow()
+        owner = f"{worker_id}/{uuid.uuid4().hex[:12]}"
+        claimable = or_(
+            and_(ScrapeJob.status == 'queued', ScrapeJob.available_at <= now),
+            and_(ScrapeJob.status == 'leased', ScrapeJob.lease_expires_at <= now),
+        )
+        db = self.session_factory()
+        try:
+            # Expired leases that used up their attempts go to the dead-letter list
+            db.execute(
+                update(ScrapeJob).where(
+                    ScrapeJob.status == 'leased',
+                    ScrapeJob.lease_expires_at <= now,
+                    ScrapeJob.attempts >= ScrapeJob.max_attempts
+                ).values(status='dead', error='Lease expired on the last attempt', finished_at=now, updated_at=now)
+                .execution_options(synchronize_session=False)
+            )
+            candidates = select(ScrapeJob.id).where(claimable).order_by(
+                ScrapeJob.available_at, ScrapeJob.id
+            ).limit(limit)
+            # Re-checking `claimable` makes the claim safe against concurrent workers
+            db.execute(
+                update(ScrapeJob).where(ScrapeJob.id.in_(candidates), claimable).values(
+                    status='leased',
+                    lease_owner=owner,
+                    lease_expires_at=now + timedelta(seconds=self.lease_seconds),
+                    attempts=ScrapeJob.attempts + 1,
+                    updated_at=now
+                ).execution_options(synchronize_session=False)
+            )
+            db.commit()
+            jobs = db.query(ScrapeJob).filter(ScrapeJob.lease_owner == owner, ScrapeJob.status == 'leased').all()
+            return [job_dict(job) for job in jobs]
+        finally:
+            db.close()
+
+    def owned(self, db, job):
+        return db.query(ScrapeJob).filter(
+            ScrapeJob.id == job['id'],
+            ScrapeJob.lease_owner == job['lease_owner'],
+            ScrapeJob.status == 'leased'
+        ).first()
+
+    def extend(self, job):
+        """Renew a job's lease while a slow scrape is still running"""
+        db = self.session_factory()
+        try:
+            row = self.owned(db, job)
+            if row is None:
+                return False
+            row.lease_expires_at = datetime.utcnow() + timedelta(seconds=self.lease_seconds)
+            db.commit()
+            return True
+        finally:
+            db.close()
+
+    def complete(self, job, result):
+        """Mark a leased job done; False if the lease was lost to another worker"""
+        db = self.session_factory()
+        try:
+            row = self.owned(db, job)
+            if row is None:
+                return False
+            now = datetime.utcnow()
+            row.status = 'done'
+            row.product_id = row.product_id or result.get('product_id')
+            row.result = json.dumps(result)
+            row.error = None
+            row.lease_owner = None
+            row.lease_expires_at = None
+            row.finished_at = now
+            row.updated_at = now
+            db.commit()
+            return True
+        finally:
+            db.close()
+
+    def fail(self, job, error, retry=True):
+        """Record a failed attempt; returns the job's new status (queued or dead)"""
+        db = self.session_factory()
+        try:
+            row = self.owned(db, job)
+            if row is None:
+                return None
+            now = datetime.utcnow()
+            row.error = error
+            row.lease_owner = None
+            row.lease_expires_at = None
+            row.updated_at = now
+            if retry and row.attempts < row.max_attempts:
+                row.status = 'queued'
+                row.available_at = now + timedelta(
+                    seconds=retry_delay(row.attempts, self.retry_base_delay, self.retry_max_delay)
+                )
+            else:
+                row.status = 'dead'
+                row.finished_at = now
+            db.commit()
+            return row.status
+        finally:
+            db.close()
+
+    def get(self, job_id):
+        db = self.session_factory()
+        try:
+            job = db.query(ScrapeJob).filter(ScrapeJob.id == job_id).first()
+            return job_dict(job) if job else None
+        finally:
+            db.close()
+
+    def list(self, status=None, limit=100):
+        """Most recently updated jobs, optionally only those with `status`"""
+        db = self.session_factory()
+        try:
+            query = db.query(ScrapeJob)
+            if status:
+                query = query.filter(ScrapeJob.status == status)
+            return [job_dict(job) for job in query.order_by(ScrapeJob.updated_at.desc()).limit(limit)]
+        finally:
+            db.close()
+
+    def retry(self, job_id):
+        """Move a dead job back to the queue with a fresh set of attempts"""
+        db = self.session_factory()
+        try:
+            job = db.query(ScrapeJob).filter(ScrapeJob.id == job_id, ScrapeJob.status == 'dead').first()
+            if job is None:
+                return None
+            now = datetime.utcnow()
+            job.status = 'queued'
+            job.attempts = 0
+            job.available_at = now
+            job.finished_at = None
+            job.updated_at = now
+            db.commit()
+            return job_dict(job)
+        finally:
+            db.close()
+
+    def stats(self):
+        db = self.session_factory()
+        try:
+            counts = dict(db.query(ScrapeJob.status, func.count()).group_by(ScrapeJob.status).all())
+            oldest = db.query(func.min(ScrapeJob.available_at)).filter(ScrapeJob.status == 'queued').scalar()
+        finally:
+            db.close()
+        now = datetime.utcnow()
+        return {
+            **{status: counts.get(status, 0) for status in JOB_STATUSES},
+            'total': sum(counts.values()),
+            'oldest_queued_seconds': round(max(0.0, (now - oldest).total_seconds()), 3) if oldest else None,
+        }
+
+class MemoryJobQueue:
+    """Non-durable queue with the same interface, for a single process.
+
+    Useful for tests and for running a worker thread next to the API
+    without touching the database.
+    """
+
+    def __init__(self, max_attempts=JOB_MAX_ATTEMPTS, lease_seconds=JOB_LEASE_SECONDS,
+                 retry_base_delay=JOB_RETRY_BASE_DELAY, retry_max_delay=JOB_RETRY_MAX_DELAY):
+        self.max_attempts = max(1, max_attempts)
+        self.lease_seconds = lease_seconds
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self._jobs = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def enqueue(self, kind, url, product_id=None):
+        return self.enqueue_many([(kind, url, product_id)])[0]
+
+    def enqueue_many(self, jobs):
+        now = datetime.utcnow()
+        added = []
+        with self._lock:
+            for kind, url, product_id in jobs:
+                if kind not in JOB_KINDS:
+                    raise ValueError(f"Unknown job kind: {kind}")
+                job = None
+                if kind == 'refresh' and product_id:
+                    job = next((
+                        pending for pending in self._jobs.values()
+                        if pending['kind'] == 'refresh' and pending['product_id'] == product_id
+                        and pending['status'] in ('queued', 'leased')
+                    ), None)
+                if job is None:
+                    job = {
+                        'id': next(self._ids), 'kind': kind, 'url': url, 'product_id': product_id,
+                        'status': 'queued', 'attempts': 0, 'max_attempts': self.max_attempts,
+                        'available_at': now, 'lease_owner': None, 'lease_expires_at': None,
+                        'result': None, 'error': None, 'created_at': now, 'updated_at': now,
+                        'finished_at': None,
+                    }
+                    self._jobs[job['id']] = job
+                added.append(dict(job))
+        return added
+
+    def claim(self, worker_id, limit=1):
+        now = datetime.utcnow()
+        owner = f"{worker_id}/{uuid.uuid4().hex[:12]}"
+        claimed = []
+        with self._lock:
+            for job in sorted(self._jobs.values(), key=lambda job: (job['available_at'], job['id'])):
+                if len(claimed) >= limit:
+                    break
+                expired = job['status'] == 'leased' and job['lease_expires_at'] <= now
+                if expired and job['attempts'] >= job['max_attempts']:
+                    job.update(status='dead', error='Lease expired on the last attempt', finished_at=now)
+                    continue
+                if expired or (job['status'] == 'queued' and job['available_at'] <= now):
+                    job.update(
+                        status='leased', lease_owner=owner, attempts=job['attempts'] + 1, updated_at=now,
+                        lease_expires_at=now + timedelta(seconds=self.lease_seconds)
+                    )
+                    claimed.append(dict(job))
+        return claimed
+
+    def owned(self, job):
+        row = self._jobs.get(job['id'])
+        if row is None or row['lease_owner'] != job['lease_owner'] or row['status'] != 'leased':
+            return None
+        return row
+
+    def extend(self, job):
+        with self._lock:
+            row = self.owned(job)
+            if row is not None:
+                row['lease_expires_at'] = datetime.utcnow() + timedelta(seconds=self.lease_seconds)
+            return row is not None
+
+    def complete(self, job, result):
+        with self._lock:
+            row = self.owned(job)
+            if row is None:
+                return False
+            now = datetime.utcnow()
+            row.update(status='done', product_id=row['product_id'] or result.get('product_id'),
+                       result=result, error=None, lease_owner=None,
+                       lease_expires_at=None, finished_at=now, updated_at=now)
+            return True
+
+    def fail(self, job, error, retry=True):
+        with self._lock:
+            row = self.owned(job)
+            if row is None:
+                return None
+            now = datetime.utcnow()
+            row.update(error=error, lease_owner=None, lease_expires_at=None, updated_at=now)
+            if retry and row['attempts'] < row['max_attempts']:
+                delay = retry_delay(row['attempts'], self.retry_base_delay, self.retry_max_delay)
+                row.update(status='queued', available_at=now + timedelta(seconds=delay))
+            else:
+                row.update(status='dead', finished_at=now)
+            return row['status']
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list(self, status=None, limit=100):
+        with self._lock:
+            jobs = [dict(job) for job in self._jobs.values() if not status or job['status'] == status]
+        return sorted(jobs, key=lambda job: job['updated_at'], reverse=True)[:limit]
+
+    def retry(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job['status'] != 'dead':
+                return None
+            now = datetime.utcnow()
+            job.update(status='queued', attempts=0, available_at=now, finished_at=None, updated_at=now)
+            return dict(job)
+
+    def stats(self):
+        now = datetime.utcnow()
+        with self._lock:
+            counts = {status: 0 for status in JOB_STATUSES}
+            for job in self._jobs.values():
+                counts[job['status']] += 1
+            queued = [job['available_at'] for job in self._jobs.values() if job['status'] == 'queued']
+        return {
+            **counts,
+            'total': sum(counts.values()),
+            'oldest_queued_seconds': round(max(0.0, (now - min(queued)).total_seconds()), 3) if queued else None,
+        }
+
+def create_queue(kind=JOB_QUEUE_BACKEND, session_factory=SessionLocal):
+    if kind == 'memory':
+        return MemoryJobQueue()
+    if kind != 'database':
+        raise ValueError(f"Unknown job queue backend: {kind}")
+    return DatabaseJobQueue(session_factory=session_factory)
@@ -0,0 +1,327 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque, namedtuple
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, PriceEvent
+
+logger = logging.getLogger(__name__)
+
+# Record price events and serve GET /products/stream
+LIVE_UPDATES_ENABLED = os.environ.get("LIVE_UPDATES_ENABLED", "1") == "1"
+# Seconds between checks for events committed by other processes (workers);
+# commits made by this process are picked up immediately
+LIVE_POLL_SECONDS = float(os.environ.get("LIVE_POLL_SECONDS", 1.0))
+# Recent events kept in memory, so reconnecting clients resume without a query
+LIVE_BUFFER_SIZE = int(os.environ.get("LIVE_BUFFER_SIZE", 10000))
+# Events a subscriber may fall behind by before it is disconnected to resume later
+LIVE_QUEUE_SIZE = int(os.environ.get("LIVE_QUEUE_SIZE", 1000))
+# Seconds between keep-alive comments on idle streams
+LIVE_HEARTBEAT_SECONDS = float(os.environ.get("LIVE_HEARTBEAT_SECONDS", 15))
+# Rows kept in price_events for clients resuming from further back
+LIVE_EVENT_RETENTION = int(os.environ.get("LIVE_EVENT_RETENTION", 100000))
+# Most events replayed to one reconnecting client before it is told to reload
+LIVE_REPLAY_LIMIT = int(os.environ.get("LIVE_REPLAY_LIMIT", 10000))
+# Seconds to keep looking for an event id skipped over by a later one: on
+# PostgreSQL a transaction can commit after one that took a later id
+LIVE_GAP_SECONDS = float(os.environ.get("LIVE_GAP_SECONDS", 10))
+
+# Reconnect delay suggested to EventSource clients
+LIVE_RETRY_MS = 3000
+FETCH_BATCH = 1000
+PRUNE_SECONDS = 60
+MAX_GAPS = 10000
+
+# One event, encoded once as an SSE frame for every subscriber
+LiveEvent = namedtuple('LiveEvent', ['id', 'product_id', 'frame'])
+
+RESET_FRAME = b"event: reset\ndata: {}\n\n"
+
+def publish_price(db, product_id, price, observed_at):
+    """Record a price delta in the session; subscribers get it once the caller commits"""
+    if LIVE_UPDATES_ENABLED:
+        db.add(PriceEvent(kind='price', product_id=product_id, price=price, observed_at=observed_at))
+        db.info['live_events'] = True
+
+def publish_deleted(db, product_id):
+    if LIVE_UPDATES_ENABLED:
+        db.add(PriceEvent(kind='deleted', product_id=product_id))
+        db.info['live_events'] = True
+
+def encode(row):
+    data = {'product_id': row.product_id}
+    if row.kind == 'price':
+        data['price'] = row.price
+        data['at'] = row.observed_at.isoformat()
+    payload = json.dumps(data, separators=(',', ':'))
+    return LiveEvent(row.id, row.product_id, f"id: {row.id}\nevent: {row.kind}\ndata: {payload}\n\n".encode())
+
+class Subscriber:
+    def __init__(self, product_ids=None, queue_size=LIVE_QUEUE_SIZE):
+        self.product_ids = product_ids
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.backlog = []
+        self.overflowed = False
+
+    def wants(self, live_event):
+        return self.product_ids is None or live_event.product_id in self.product_ids
+
+    def offer(self, live_event):
+        if not self.wants(live_event):
+            return
+        try:
+            self.queue.put_nowait(live_event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+class Broadcaster:
+    """Fan price events out to server-sent event subscribers.
+
+    One task per process tails the price_events table and hands every new
+    event to all subscribers' queues, so the database sees one query per
+    poll however many clients are connected. Commits in this process wake
+    the task straight away; events from workers arrive within
+    `poll_seconds`. Ids skipped over by a later event are looked up again
+    on each poll for `gap_seconds`, in case the transaction that took them
+    commits late (SQLite commits writers one at a time, so it never does;
+    PostgreSQL can). A client that reconnects with the last id it saw gets
+    what it missed from the in-memory buffer or, if it was gone longer,
+    from the table.
+    """
+
+    def __init__(self, session_factory=SessionLocal, poll_seconds=LIVE_POLL_SECONDS,
+                 buffer_size=LIVE_BUFFER_SIZE, queue_size=LIVE_QUEUE_SIZE,
+                 heartbeat_seconds=LIVE_HEARTBEAT_SECONDS, retention=LIVE_EVENT_RETENTION,
+                 replay_limit=LIVE_REPLAY_LIMIT, gap_seconds=LIVE_GAP_SECONDS):
+        self.session_factory = session_factory
+        self.poll_seconds = poll_seconds
+        self.buffer = deque(maxlen=buffer_size)
+        self.queue_size = queue_size
+        self.heartbeat_seconds = heartbeat_seconds
+        self.retention = retention
+        self.replay_limit = replay_limit
+        self.gap_seconds = gap_seconds
+        # Missing event id -> when it was first missed
+        self.gaps = {}
+        self.subscribers = set()
+        self.last_id = 0
+        self.loop = None
+        self.task = None
+        self.ready = None
+        self.wakeup = None
+        self.last_pruned = time.monotonic()
+        self.events = 0
+        self.polls = 0
+        self.replays = 0
+        self.resets = 0
+        self.slow_disconnects = 0
+        self.late_events = 0
+
+    def fetch(self, after_id, before_id=None, limit=FETCH_BATCH, ids=None):
+        db = self.session_factory()
+        try:
+            query = db.query(
+                PriceEvent.id, PriceEvent.kind, PriceEvent.product_id, PriceEvent.price, PriceEvent.observed_at
+            )
+            if ids is not None:
+                query = query.filter(PriceEvent.id.in_(ids))
+            else:
+                query = query.filter(PriceEvent.id > after_id)
+            if before_id is not None:
+                query = query.filter(PriceEvent.id < before_id)
+            return [encode(row) for row in query.order_by(PriceEvent.id).limit(limit)]
+        finally:
+            db.close()
+
+    def latest_id(self):
+        db = self.session_factory()
+        try:
+            return db.query(func.max(PriceEvent.id)).scalar() or 0
+        finally:
+            db.close()
+
+    def prune(self):
+        db = self.session_factory()
+        try:
+            deleted = db.query(PriceEvent).filter(PriceEvent.id <= self.last_id - self.retention).delete(
+                synchronize_session=False
+            )
+            db.commit()
+            return deleted
+        finally:
+            db.close()
+
+    async def start(self):
+        if self.task is None:
+            self.loop = asyncio.get_running_loop()
+            self.ready = asyncio.Event()
+            self.wakeup = asyncio.Event()
+            self.task = asyncio.create_task(self.run())
+        await self.ready.wait()
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+            self.loop = None
+
+    def wake(self):
+        """Poll now (safe to call from any thread)"""
+        loop = self.loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self.wakeup.set)
+
+    async def run(self):
+        while not self.ready.is_set():
+            try:
+                self.last_id = await asyncio.to_thread(self.latest_id)
+                self.ready.set()
+            except Exception as e:
+                logger.error(f"Live updates can't read price events: {e}")
+                await asyncio.sleep(self.poll_seconds)
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            try:
+                await self.poll()
+            except Exception as e:
+                logger.error(f"Live update poll failed: {e}")
+
+    async def poll(self):
+        while True:
+            events = await asyncio.to_thread(self.fetch, self.last_id)
+            self.polls += 1
+            if events:
+                self.note_gaps(events)
+                self.last_id = events[-1].id
+                self.deliver(events)
+            if len(events) < FETCH_BATCH:
+                break
+        if self.gaps:
+            await self.fill_gaps()
+        if self.retention and time.monotonic() - self.last_pruned > PRUNE_SECONDS:
+            self.last_pruned = time.monotonic()
+            await asyncio.to_thread(self.prune)
+
+    def deliver(self, events):
+        self.buffer.extend(events)
+        self.events += len(events)
+        self.fan_out(events)
+
+    def note_gaps(self, events):
+        """Remember ids between the last seen event and these that aren't here (yet)"""
+        now = time.monotonic()
+        expected = self.last_id + 1
+        for live_event in events:
+            room = MAX_GAPS - len(self.gaps)
+            if live_event.id > expected and room > 0:
+                self.gaps.update(dict.fromkeys(range(expected, min(live_event.id, expected + room)), now))
+            expected = live_event.id + 1
+
+    async def fill_gaps(self):
+        """Deliver events that committed after later ones; give up on ids missing for gap_seconds"""
+        late = await asyncio.to_thread(self.fetch, None, None, len(self.gaps), list(self.gaps))
+        if late:
+            for live_event in late:
+                del self.gaps[live_event.id]
+            self.late_events += len(late)
+            self.deliver(late)
+        cutoff = time.monotonic() - self.gap_seconds
+        self.gaps = {event_id: missed_at for event_id, missed_at in self.gaps.items() if missed_at > cutoff}
+
+    def fan_out(self, events):
+        for subscriber in list(self.subscribers):
+            for live_event in events:
+                subscriber.offer(live_event)
+            if subscriber.overflowed:
+                # Its stream ends after the queued events; the client reconnects and resumes
+                self.subscribers.discard(subscriber)
+                self.slow_disconnects += 1
+
+    async def subscribe(self, last_event_id=None, product_ids=None):
+        """Register a subscriber, with a backlog of the events after `last_event_id`"""
+        await self.start()
+        subscriber = Subscriber(product_ids, self.queue_size)
+        # Registered and the buffer read without yielding to the loop, so
+        # every later event goes to the queue and none is missed or repeated
+        self.subscribers.add(subscriber)
+        if last_event_id is None or last_event_id >= self.last_id:
+            return subscriber
+
+        # Not a scan from the end: late events sit after higher ids
+        buffered = [live_event for live_event in self.buffer if live_event.id > last_event_id]
+        missed = []
+        oldest = self.buffer[0].id if self.buffer else self.last_id + 1
+        if last_event_id + 1 < oldest:
+            # Gone for longer than the buffer reaches back. Ids can be
+            # missing for good (rolled back, skipped by a sequence), so a gap
+            # isn't a loss; only events at or below the retention floor may
+            # have been pruned, by this process or another
+            pruned = self.retention and last_event_id < self.last_id - self.retention
+            if not pruned:
+                missed = await asyncio.to_thread(self.fetch, last_event_id, oldest, self.replay_limit + 1)
+            if pruned or len(missed) > self.replay_limit:
+                # Already pruned, or too much to replay: the client reloads instead
+                self.resets += 1
+                subscriber.backlog = [RESET_FRAME]
+                return subscriber
+        self.replays += 1
+        subscriber.backlog += [live_event.frame for live_event in missed + buffered if subscriber.wants(live_event)]
+        return subscriber
+
+    async def stream(self, subscriber):
+        """SSE body: the backlog, then live events and keep-alives until the client goes"""
+        try:
+            yield f"retry: {LIVE_RETRY_MS}\n\n".encode()
+            if subscriber.backlog:
+                yield b"".join(subscriber.backlog)
+                subscriber.backlog = []
+            queue = subscriber.queue
+            while not (subscriber.overflowed and queue.empty()):
+                try:
+                    live_event = await asyncio.wait_for(queue.get(), self.heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+                frames = [live_event.frame]
+                while not queue.empty() and len(frames) < 100:
+                    frames.append(queue.get_nowait().frame)
+                yield b"".join(frames)
+        finally:
+            self.subscribers.discard(subscriber)
+
+    def stats(self):
+        return {
+            'subscribers': len(self.subscribers),
+            'last_event_id': self.last_id,
+            'buffered': len(self.buffer),
+            'events': self.events,
+            'polls': self.polls,
+            'replays': self.replays,
+            'resets': self.resets,
+            'slow_disconnects': self.slow_disconnects,
+            'late_events': self.late_events,
+        }
+
+BROADCASTER = Broadcaster()
+
+@event.listens_for(Session, "after_commit")
+def wake_broadcaster(session):
+    if session.info.pop('live_events', False):
+        BROADCASTER.wake()
+
+@event.listens_for(Session, "after_rollback")
+def forget_live_events(session):
+    session.info.pop('live_events', None)
@@ -1,19 +1,61 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Dict
+from datetime import datetime
+from contextlib import asynccontextmanager
+import asyncio
+import json
 import logging
+import weakref
 
-from database import get_db, create_tables, Product, PriceHistory
-from models import ProductCreate, ProductResponse, PriceHistoryResponse, ProductWithHistory, ScrapeResult
-from scraper import PriceScraper
+from database import engine, async_engine, get_db, create_tables, delete_products, Product, ProductStats, AlertRule, AlertEvent
+from models import (
+    ProductCreate, ProductResponse, ProductStatsResponse, PriceHistoryResponse, ProductWithHistory, ScrapeResult,
+    BulkRefreshRequest, BulkRefreshSummary, BrowserPoolMetrics, SchedulerStatus, PageCacheStats,
+    ExtractionPathStats, PriceBucket, DomainHealth, TransportStats, ScrapeCacheStats,
+    JobResponse, EnqueuedJobs, JobQueueStats, AlertRuleCreate, AlertRuleResponse, AlertEventResponse,
+    LiveUpdateStats
+)
+from pagination import fetch_page, parse_fields, SORT_FIELDS, MAX_PAGE_SIZE
+from compression import CompressionMiddleware
+from metrics import REGISTRY, DB_WRITE_SECONDS, MetricsMiddleware
+from scrape_cache import recorded_since
+from canonical import canonical_key
+from history import (
+    record_price, extend_price, history_rows, lttb, bucket_width, bucket_series, MAX_HISTORY_POINTS, HISTORY_CHANGE_ONLY
+)
+from bulk_refresh import BulkRefresher, DEFAULT_CONCURRENCY, DEFAULT_PER_DOMAIN_CONCURRENCY
+from bulk_import import BulkImporter, parse_urls
+from scheduler import RefreshScheduler, SCHEDULER_ENABLED
+from job_queue import create_queue, JOB_QUEUE_ENABLED, JOB_STATUSES
+from alerts import RULES, rule_error
+from live_updates import BROADCASTER, LIVE_UPDATES_ENABLED, publish_deleted
+from export import export_history, export_products, format_error, MEDIA_TYPES
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app):
+    """Create the schema on startup; stop background tasks and close the database on shutdown"""
+    # Create database tables (and bring existing databases up to date)
+    create_tables()
+    if SCHEDULER_ENABLED:
+        get_refresh_scheduler().start()
+    yield
+    if refresh_scheduler is not None:
+        await refresh_scheduler.stop()
+    await BROADCASTER.stop()
+    await async_engine.dispose()
+
 # Create FastAPI app
-app = FastAPI(title="Price Tracker API", version="1.0.0")
+app = FastAPI(title="Price Tracker API", version="1.0.0", lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -27,32 +69,81 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
-# Initialize scraper
-scraper = PriceScraper()
+# gzip/brotli response compression
+app.add_middleware(CompressionMiddleware)
+
+# Per-route request latency for /metrics
+app.add_middleware(MetricsMiddleware)
+
+# Durable scrape jobs, run by `python worker.py` (used by the API with JOB_QUEUE_ENABLED=1)
+job_queue = create_queue()
+
+# Created on first use: the scraper loads the HTTP and HTML parsing stack
+# (and Selenium on its first fallback), which most requests never need
+scraper = None
+
+# Background refresh scheduler (started on startup with SCHEDULER_ENABLED=1)
+refresh_scheduler = None
+
+def get_scraper():
+    global scraper
+    if scraper is None:
+        from scraper import PriceScraper
+        scraper = PriceScraper()
+    return scraper
 
-# Create database tables
-create_tables()
+def get_refresh_scheduler():
+    global refresh_scheduler
+    if refresh_scheduler is None:
+        refresh_scheduler = RefreshScheduler(scraper=get_scraper(), queue=job_queue if JOB_QUEUE_ENABLED else None)
+    return refresh_scheduler
+
+# Refreshes of one product write one at a time, so a refresh that shared a
+# coalesced scrape sees the other's write (see recorded_since)
+price_write_locks = weakref.WeakValueDictionary()
+
+def price_write_lock(product_id):
+    lock = price_write_locks.get(product_id)
+    if lock is None:
+        lock = price_write_locks[product_id] = asyncio.Lock()
+    return lock
+
+def accepted(content):
+    """202 response for work handed to the scrape workers"""
+    return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content=jsonable_encoder(content))
 
 @app.get("/")
 async def root():
     return {"message": "Price Tracker API is running!"}
 
 @app.post("/products/", response_model=ProductResponse)
-async def create_product(product: ProductCreate, db: Session = Depends(get_db)):
+async def create_product(product: ProductCreate, db: AsyncSession = Depends(get_db)):
     """Add a new product to track"""
     try:
-        # Check if product already exists
-        existing_product = db.query(Product).filter(Product.url == str(product.url)).first()
+        key = canonical_key(str(product.url))
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid URL: {e}"
+        )
+    try:
+        # Check if product already exists, under this or any other spelling of its URL
+        existing_product = await db.scalar(select(Product.id).where(Product.canonical_key == key))
         if existing_product:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Product with this URL already exists"
             )
         
+        if JOB_QUEUE_ENABLED:
+            # A worker scrapes and adds it; the job's result carries the product id
+            return accepted(JobResponse(**await asyncio.to_thread(job_queue.enqueue, 'create', str(product.url))))
+        
         # Scrape product information
-        scrape_result = scraper.scrape_product(str(product.url))
+        scrape_result = await get_scraper().scrape_product_async(str(product.url))
         
         if not scrape_result['success'] or not scrape_result['name']:
             raise HTTPException(
@@ -67,24 +158,28 @@ async def create_product(product: ProductCreate, db: Session = Depends(get_db)):
             current_price=scrape_result['price']
         )
         
-        db.add(db_product)
-        db.commit()
-        db.refresh(db_product)
-        
-        # Add initial price to history
-        if scrape_result['price']:
-            price_entry = PriceHistory(
-                product_id=db_product.id,
-                price=scrape_result['price']
-            )
-            db.add(price_entry)
-            db.commit()
+        with DB_WRITE_SECONDS.time(operation='create_product'):
+            db.add(db_product)
+            await db.commit()
+            await db.refresh(db_product)
+            
+            # Add initial price to history (stats and alerts are sync helpers)
+            if scrape_result['price']:
+                await db.run_sync(record_price, db_product.id, scrape_result['price'])
+                await db.commit()
         
         logger.info(f"Created product: {db_product.name}")
         return db_product
         
     except HTTPException:
         raise
+    except IntegrityError:
+        # Added by a concurrent request while this one was scraping
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Product with this URL already exists"
+        )
     except Exception as e:
         logger.error(f"Error creating product: {e}")
         raise HTTPException(
@@ -93,43 +188,225 @@ async def create_product(product: ProductCreate, db: Session = Depends(get_db)):
         )
 
 @app.get("/products/", response_model=List[ProductResponse])
-async def get_products(db: Session = Depends(get_db)):
-    """Get all tracked products"""
-    products = db.query(Product).all()
-    return products
+async def get_products(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    sort: str = Query("id", pattern=f"^({'|'.join(SORT_FIELDS)})$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    domain: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    stale_since: Optional[datetime] = None,
+    fields: Optional[str] = None,
+    include_stats: bool = False,
+    db: AsyncSession = Depends(get_db)
+):
+    """Get tracked products.
+    
+    Without `limit` every matching product is returned. With `limit` the
+    result is a page and the `X-Next-Cursor` header holds the cursor for
+    the next one. `fields` is a comma-separated list of columns to return.
+    `include_stats` adds each product's precomputed price statistics.
+    """
+    try:
+        selected_fields = parse_fields(fields)
+        items, next_cursor = await db.run_sync(lambda session: fetch_page(
+            session, selected_fields,
+            limit=limit, cursor=cursor, sort=sort, descending=order == "desc", include_stats=include_stats,
+            domain=domain, min_price=min_price, max_price=max_price, stale_since=stale_since
+        ))
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    # Rows are already plain dicts, so skip response_model validation
+    return Response(
+        content=json.dumps(items, separators=(",", ":")),
+        media_type="application/json",
+        headers=headers
+    )
+
+@app.post("/products/refresh", response_model=BulkRefreshSummary)
+async def refresh_products(request: Optional[BulkRefreshRequest] = None):
+    """Refresh prices for many (by default all) tracked products concurrently"""
+    request = request or BulkRefreshRequest()
+    if JOB_QUEUE_ENABLED:
+        targets = await asyncio.to_thread(BulkRefresher(scraper=get_scraper()).load_targets, request.product_ids)
+        jobs = await asyncio.to_thread(
+            job_queue.enqueue_many, [('refresh', url, product_id) for product_id, url in targets]
+        )
+        return accepted(EnqueuedJobs(enqueued=len(jobs), job_ids=[job['id'] for job in jobs]))
+    refresher = BulkRefresher(
+        scraper=get_scraper(),
+        concurrency=request.concurrency or DEFAULT_CONCURRENCY,
+        per_domain_concurrency=request.per_domain_concurrency or DEFAULT_PER_DOMAIN_CONCURRENCY
+    )
+    return await refresher.refresh(request.product_ids)
+
+@app.post("/products/import")
+async def import_products(
+    request: Request,
+    concurrency: Optional[int] = Query(None, ge=1),
+    per_domain_concurrency: Optional[int] = Query(None, ge=1)
+):
+    """Add many products from a JSON list, CSV or newline-delimited body.
+    
+    The body may also be a multipart upload in a `file` field. Progress is
+    streamed as NDJSON: one line per URL as soon as it is created, skipped
+    as a duplicate, rejected or failed, then a final summary line.
+    """
+    content_type = request.headers.get("content-type", "")
+    filename = None
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Upload the URL list in a 'file' field"
+            )
+        data = await upload.read()
+        content_type, filename = upload.content_type, upload.filename
+    else:
+        data = await request.body()
+    
+    try:
+        urls = parse_urls(data, content_type, filename)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    importer = BulkImporter(
+        scraper=get_scraper(),
+        concurrency=concurrency or DEFAULT_CONCURRENCY,
+        per_domain_concurrency=per_domain_concurrency or DEFAULT_PER_DOMAIN_CONCURRENCY
+    )
+    
+    async def ndjson():
+        async for event in importer.import_urls(urls):
+            yield json.dumps(event) + "\n"
+    
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+@app.get("/products/stream")
+async def stream_price_updates(
+    request: Request,
+    product_ids: Optional[str] = Query(None, description="Comma-separated product ids to follow (default: all)"),
+    last_event_id: Optional[int] = Query(None, description="Resume after this event id")
+):
+    """Server-sent events with a delta for every price write and product deletion.
+    
+    `price` events carry {product_id, price, at} and `deleted` events
+    {product_id}. Each event has an id; reconnecting with the Last-Event-ID
+    header (EventSource does this itself) or `last_event_id` resumes after
+    it. A `reset` event means the gap was too long to replay and the client
+    should reload the products.
+    """
+    if not LIVE_UPDATES_ENABLED:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Live updates are disabled"
+        )
+    try:
+        followed = {int(part) for part in product_ids.split(",") if part.strip()} if product_ids else None
+        header = request.headers.get("last-event-id")
+        resume_after = int(header) if header else last_event_id
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Event and product ids must be integers"
+        )
+    
+    subscriber = await BROADCASTER.subscribe(resume_after, followed)
+    return StreamingResponse(
+        BROADCASTER.stream(subscriber),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/products/stream/stats", response_model=LiveUpdateStats)
+async def get_live_update_stats():
+    """Get subscriber and event counters for the live update stream"""
+    return BROADCASTER.stats()
+
+@app.get("/products/lookup", response_model=ProductResponse)
+async def lookup_product(url: str = Query(..., description="Any URL for the product"), db: AsyncSession = Depends(get_db)):
+    """Find the tracked product a URL points at, however the URL is spelled"""
+    try:
+        key = canonical_key(url)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid URL: {e}"
+        )
+    product = await db.scalar(select(Product).where(Product.canonical_key == key))
+    if not product:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Product not found"
+        )
+    return product
 
 @app.get("/products/{product_id}", response_model=ProductWithHistory)
-async def get_product_with_history(product_id: int, db: Session = Depends(get_db)):
-    """Get a specific product with its price history"""
-    product = db.query(Product).filter(Product.id == product_id).first()
+async def get_product_with_history(
+    product_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    max_points: Optional[int] = Query(None, ge=2, le=MAX_HISTORY_POINTS),
+    include_archived: bool = False,
+    db: AsyncSession = Depends(get_db)
+):
+    """Get a specific product with its price history (optionally windowed and downsampled) and stats"""
+    product = await db.get(Product, product_id)
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Product not found"
         )
     
-    price_history = db.query(PriceHistory).filter(
-        PriceHistory.product_id == product_id
-    ).order_by(PriceHistory.timestamp.desc()).all()
+    price_history = lttb(
+        await db.run_sync(history_rows, product_id, start, end, include_archived=include_archived), max_points
+    )
+    price_history.reverse()
     
     return ProductWithHistory(
         product=product,
-        price_history=price_history
+        price_history=price_history,
+        stats=await db.get(ProductStats, product_id)
     )
 
+@app.get("/products/{product_id}/stats", response_model=ProductStatsResponse)
+async def get_product_stats(product_id: int, db: AsyncSession = Depends(get_db)):
+    """Get a product's precomputed price statistics (min/max/avg, all-time low, recent changes)"""
+    stats = await db.get(ProductStats, product_id)
+    if not stats:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No stats for this product"
+        )
+    return stats
+
 @app.post("/products/{product_id}/update", response_model=ProductResponse)
-async def update_product_price(product_id: int, db: Session = Depends(get_db)):
+async def update_product_price(product_id: int, db: AsyncSession = Depends(get_db)):
     """Update product price by scraping again"""
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = await db.get(Product, product_id)
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Product not found"
         )
     
+    if JOB_QUEUE_ENABLED:
+        return accepted(JobResponse(**await asyncio.to_thread(job_queue.enqueue, 'refresh', product.url, product.id)))
+    
     try:
         # Scrape current price
-        scrape_result = scraper.scrape_product(product.url)
+        scrape_result = await get_scraper().scrape_product_async(product.url)
         
         if not scrape_result['success']:
             raise HTTPException(
@@ -137,19 +414,31 @@ async def update_product_price(product_id: int, db: Session = Depends(get_db)):
                 detail=f"Failed to scrape product: {scrape_result.get('error', 'Unknown error')}"
             )
         
-        # Update product with new price
-        if scrape_result['price']:
-            product.current_price = scrape_result['price']
-            product.last_updated = db.query(Product).filter(Product.id == product_id).first().last_updated
-            
-            # Add new price to history
-            price_entry = PriceHistory(
-                product_id=product_id,
-                price=scrape_result['price']
-            )
-            db.add(price_entry)
-            db.commit()
-            db.refresh(product)
+        async with price_write_lock(product_id):
+            if scrape_result.get('cached'):
+                # Shared with another refresh of this URL, which may have written it already
+                await db.refresh(product)
+                if recorded_since(product.last_updated, scrape_result):
+                    logger.info(f"Price for {product.name} already recorded by a concurrent refresh")
+                    return product
+
+            # Update product with new price (unchanged pages need no write,
+            # except to extend the price's run in change-only mode)
+            if scrape_result['price'] and not scrape_result.get('unchanged'):
+                product.current_price = scrape_result['price']
+                product.last_updated = datetime.utcnow()
+                
+                # Add new price to history
+                with DB_WRITE_SECONDS.time(operation='update_product'):
+                    await db.run_sync(record_price, product_id, scrape_result['price'], product.last_updated)
+                    await db.commit()
+                    await db.refresh(product)
+            elif scrape_result['price'] and HISTORY_CHANGE_ONLY:
+                product.last_updated = datetime.utcnow()
+                with DB_WRITE_SECONDS.time(operation='update_product'):
+                    await db.run_sync(extend_price, product_id, scrape_result['price'], product.last_updated)
+                    await db.commit()
+                    await db.refresh(product)
         
         logger.info(f"Updated product: {product.name} - New price: {product.current_price}")
         return product
@@ -164,36 +453,265 @@ async def update_product_price(product_id: int, db: Session = Depends(get_db)):
         )
 
 @app.delete("/products/{product_id}")
-async def delete_product(product_id: int, db: Session = Depends(get_db)):
+async def delete_product(product_id: int, db: AsyncSession = Depends(get_db)):
     """Delete a product and its price history"""
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = await db.get(Product, product_id)
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Product not found"
         )
     
-    db.delete(product)
-    db.commit()
+    # One DELETE per table rather than the ORM cascade, which loads all the history first
+    await db.run_sync(delete_products, [product_id])
+    publish_deleted(db, product_id)
+    await db.commit()
+    RULES.invalidate()
     
     logger.info(f"Deleted product: {product.name}")
     return {"message": "Product deleted successfully"}
 
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics: scrape, parse, Selenium, DB write and request timings plus scrape counters"""
+    return Response(content=REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/scraper/browser-pool", response_model=BrowserPoolMetrics)
+async def get_browser_pool_metrics():
+    """Get usage metrics for the pooled Selenium browsers"""
+    return get_scraper().browser_pool.metrics()
+
+@app.get("/scraper/page-cache", response_model=PageCacheStats)
+async def get_page_cache_stats():
+    """Get hit/miss counters for conditional page fetching"""
+    return get_scraper().page_cache.stats()
+
+@app.get("/scraper/result-cache", response_model=ScrapeCacheStats)
+async def get_result_cache_stats():
+    """Get hit, coalescing and eviction counters for the scrape result cache"""
+    return get_scraper().result_cache.stats()
+
+@app.get("/scraper/extraction-stats", response_model=Dict[str, ExtractionPathStats])
+async def get_extraction_stats():
+    """Get per-domain counts of which extraction path served each scrape"""
+    return get_scraper().extraction_stats.report()
+
+@app.get("/scraper/domains", response_model=Dict[str, DomainHealth])
+async def get_domain_health():
+    """Get circuit breaker, retry and rate limiter state per retailer"""
+    return get_scraper().guard.state()
+
+@app.get("/scraper/transport", response_model=TransportStats)
+async def get_transport_stats():
+    """Get connection reuse, pool and DNS cache statistics for page fetches"""
+    return get_scraper().transport.stats()
+
+@app.get("/jobs", response_model=List[JobResponse])
+async def list_jobs(
+    status_filter: Optional[str] = Query(None, alias="status", description="queued, leased, done or dead"),
+    limit: int = Query(100, ge=1, le=1000)
+):
+    """List scrape jobs, most recently updated first (status=dead is the dead-letter list)"""
+    if status_filter and status_filter not in JOB_STATUSES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown job status: {status_filter}"
+        )
+    return await asyncio.to_thread(job_queue.list, status_filter, limit)
+
+@app.get("/jobs/stats", response_model=JobQueueStats)
+async def get_job_stats():
+    """Get job counts per status and the age of the oldest queued job"""
+    return await asyncio.to_thread(job_queue.stats)
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: int):
+    """Get a scrape job's status and, once done, its result"""
+    job = await asyncio.to_thread(job_queue.get, job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    return job
+
+@app.post("/jobs/{job_id}/retry", response_model=JobResponse)
+async def retry_job(job_id: int):
+    """Put a dead job back on the queue with fresh attempts"""
+    job = await asyncio.to_thread(job_queue.retry, job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No dead job with this id"
+        )
+    return job
+
+@app.post("/alerts/rules", response_model=AlertRuleResponse)
+async def create_alert_rule(rule: AlertRuleCreate, db: AsyncSession = Depends(get_db)):
+    """Add an alert rule for one product, or for every product when product_id is omitted"""
+    error = rule_error(rule.kind, rule.threshold, rule.sink, rule.target)
+    if error:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=error
+        )
+    if rule.product_id is not None and not await db.get(Product, rule.product_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Product not found"
+        )
+    
+    db_rule = AlertRule(**rule.model_dump())
+    db.add(db_rule)
+    await db.commit()
+    await db.refresh(db_rule)
+    RULES.invalidate()
+    return db_rule
+
+@app.get("/alerts/rules", response_model=List[AlertRuleResponse])
+async def list_alert_rules(product_id: Optional[int] = None, db: AsyncSession = Depends(get_db)):
+    """List alert rules; with product_id, the rules that apply to that product (including global ones)"""
+    query = select(AlertRule)
+    if product_id is not None:
+        query = query.where((AlertRule.product_id == product_id) | AlertRule.product_id.is_(None))
+    return (await db.scalars(query.order_by(AlertRule.id))).all()
+
+@app.delete("/alerts/rules/{rule_id}")
+async def delete_alert_rule(rule_id: int, db: AsyncSession = Depends(get_db)):
+    """Delete an alert rule (alerts it already raised are kept)"""
+    rule = await db.get(AlertRule, rule_id)
+    if not rule:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Alert rule not found"
+        )
+    
+    await db.delete(rule)
+    await db.commit()
+    RULES.invalidate()
+    return {"message": "Alert rule deleted successfully"}
+
+@app.get("/alerts/events", response_model=List[AlertEventResponse])
+async def list_alert_events(
+    product_id: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_db)
+):
+    """List raised alerts, newest first"""
+    query = select(AlertEvent)
+    if product_id is not None:
+        query = query.where(AlertEvent.product_id == product_id)
+    query = query.order_by(AlertEvent.triggered_at.desc(), AlertEvent.id.desc()).limit(limit)
+    return (await db.scalars(query)).all()
+
+def parse_ids(product_ids):
+    """Comma-separated ids from a query parameter, or None"""
+    try:
+        return [int(part) for part in product_ids.split(",") if part.strip()] if product_ids else None
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Product ids must be integers"
+        )
+
+def export_response(chunks, export_format, name):
+    return StreamingResponse(
+        chunks,
+        media_type=MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{export_format}"'}
+    )
+
+@app.get("/export/history")
+async def export_price_history(
+    export_format: str = Query("ndjson", alias="format", description="ndjson, csv or parquet"),
+    product_ids: Optional[str] = Query(None, description="Comma-separated product ids (default: all)"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+):
+    """Stream price history rows as a download, read in chunks from a server-side cursor"""
+    error = format_error(export_format)
+    if error:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=error
+        )
+    # The sync engine: chunks are read in a worker thread, outside the event loop
+    chunks = export_history(engine, export_format, parse_ids(product_ids), start, end)
+    return export_response(chunks, export_format, "price_history")
+
+@app.get("/export/products")
+async def export_product_list(
+    export_format: str = Query("ndjson", alias="format", description="ndjson, csv or parquet"),
+    product_ids: Optional[str] = Query(None, description="Comma-separated product ids (default: all)")
+):
+    """Stream products as a download"""
+    error = format_error(export_format)
+    if error:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=error
+        )
+    chunks = export_products(engine, export_format, parse_ids(product_ids))
+    return export_response(chunks, export_format, "products")
+
+@app.get("/scheduler/status", response_model=SchedulerStatus)
+async def get_scheduler_status():
+    """Get the state of the background refresh scheduler"""
+    return get_refresh_scheduler().status()
+
 @app.get("/products/{product_id}/price-history", response_model=List[PriceHistoryResponse])
-async def get_price_history(product_id: int, db: Session = Depends(get_db)):
-    """Get price history for a specific product"""
-    product = db.query(Product).filter(Product.id == product_id).first()
+async def get_price_history(
+    product_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    max_points: Optional[int] = Query(None, ge=2, le=MAX_HISTORY_POINTS),
+    include_archived: bool = False,
+    db: AsyncSession = Depends(get_db)
+):
+    """Get price history for a specific product.
+    
+    `start`/`end` limit the time window; `max_points` downsamples the series
+    (LTTB) to at most that many of the original points. Days rolled up by
+    the retention policy come back as open/low/high/close points without
+    an id, or as their archived points with `include_archived`.
+    """
+    product = await db.get(Product, product_id)
+    if not product:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Product not found"
+        )
+    
+    return lttb(
+        await db.run_sync(history_rows, product_id, start, end, include_archived=include_archived), max_points
+    )
+
+@app.get("/products/{product_id}/price-history/buckets", response_model=List[PriceBucket])
+async def get_price_history_buckets(
+    product_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    bucket_seconds: Optional[int] = Query(None, ge=1),
+    max_points: int = Query(500, ge=1, le=MAX_HISTORY_POINTS),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get price history aggregated per time bucket (min/max/avg/last/count).
+    
+    Without `bucket_seconds` the bucket width is chosen so the window fits
+    in about `max_points` buckets.
+    """
+    product = await db.get(Product, product_id)
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Product not found"
         )
     
-    price_history = db.query(PriceHistory).filter(
-        PriceHistory.product_id == product_id
-    ).order_by(PriceHistory.timestamp.asc()).all()
+    def buckets(session):
+        width = bucket_seconds or bucket_width(session, product_id, start, end, max_points)
+        return bucket_series(session, product_id, width, start, end)
     
-    return price_history
+    return await db.run_sync(buckets)
 
 if __name__ == "__main__":
     import uvicorn
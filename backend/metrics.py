@@ -0,0 +1,219 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from operator import itemgetter
+
+# Set METRICS_ENABLED=0 to turn every observation into a no-op
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+
+# Histogram buckets in seconds, from a cached page parse to a slow browser load
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def format_labels(names, values, extra=None):
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    type = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        # Label values in labelnames order, as a tuple, with as little work as possible
+        if len(self.labelnames) > 1:
+            self.key = itemgetter(*self.labelnames)
+        elif self.labelnames:
+            name = self.labelnames[0]
+            self.key = lambda labels: (labels[name],)
+        else:
+            self.key = lambda labels: ()
+
+    def family(self):
+        return self.name
+
+    def render(self):
+        family = self.family()
+        lines = [f"# HELP {family} {self.documentation}", f"# TYPE {family} {self.type}"]
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self.render_samples(items))
+        return lines
+
+class Counter(Metric):
+    type = 'counter'
+
+    def family(self):
+        # The 0.0.4 text format names counter families after their _total samples
+        return f"{self.name}_total"
+
+    def inc(self, amount=1, **labels):
+        if not self.registry.enabled:
+            return
+        key = self.key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self.key(labels), 0)
+
+    def render_samples(self, items):
+        for key, value in items:
+            yield f"{self.name}_total{format_labels(self.labelnames, key)} {format_value(value)}"
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        if not self.registry.enabled:
+            return
+        key = self.key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # Per-bucket (non-cumulative) counts plus one for +Inf, then sum and count
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, **labels):
+        return Timer(self, labels)
+
+    def render_samples(self, items):
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = format_labels(self.labelnames, key, f'le="{format_value(bound)}"')
+                yield f"{self.name}_bucket{le} {cumulative}"
+            labels = format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {format_value(total)}"
+            yield f"{self.name}_count{labels} {count}"
+
+class Timer:
+    """Context manager observing the elapsed wall time into a histogram"""
+
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+class Registry:
+    """In-process metrics rendered in the Prometheus text exposition format"""
+
+    def __init__(self, enabled=METRICS_ENABLED):
+        self.enabled = enabled
+        self._metrics = []
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(self, name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(self, name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+
+# Scraper hot path
+FETCH_SECONDS = REGISTRY.histogram(
+    'scraper_fetch_seconds', 'Time to fetch a retailer page, including retries', ['site'])
+PARSE_SECONDS = REGISTRY.histogram(
+    'scraper_parse_seconds', 'Time to extract name and price from fetched content', ['site', 'path'])
+SELENIUM_SECONDS = REGISTRY.histogram(
+    'scraper_selenium_seconds', 'Time spent in the Selenium fallback', ['site'])
+SCRAPES = REGISTRY.counter(
+    'scraper_scrapes', 'Scrapes by outcome', ['site', 'outcome'])
+FALLBACKS = REGISTRY.counter(
+    'scraper_selenium_fallbacks', 'Scrapes that fell back to Selenium', ['site'])
+DOM_EXTRACTIONS = REGISTRY.counter(
+    'scraper_dom_extractions', 'Pages run through the DOM selectors, per field', ['site', 'field'])
+SELECTOR_HITS = REGISTRY.counter(
+    'scraper_selector_hits', 'DOM extractions won by each selector', ['site', 'field', 'selector'])
+
+# Database and API
+DB_WRITE_SECONDS = REGISTRY.histogram(
+    'db_write_seconds', 'Time to write and commit scrape results', ['operation'])
+REQUEST_SECONDS = REGISTRY.histogram(
+    'http_request_seconds', 'API request latency per route', ['method', 'route', 'status'])
+
+class MetricsMiddleware:
+    """Time every HTTP request, labelled with the route's path template"""
+
+    def __init__(self, app):
+        self.app = app
+        self._routes = {}
+
+    def route_path(self, scope):
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        path = self._routes.get(endpoint)
+        if path is None:
+            app = scope.get("app")
+            path = next(
+                (route.path for route in getattr(app, "routes", ()) if getattr(route, "endpoint", None) is endpoint),
+                "unmatched"
+            )
+            self._routes[endpoint] = path
+        return path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not REGISTRY.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                method=scope["method"], route=self.route_path(scope), status=str(status_code)
+            )
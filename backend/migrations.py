@@ -0,0 +1,159 @@
+import logging
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, bindparam, inspect, select, text
+from sqlalchemy.orm import Session
+
+from canonical import canonical_key, url_host
+
+logger = logging.getLogger(__name__)
+
+# Bookkeeping table recording which migrations have been applied
+migration_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations", migration_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+# (version, description, function(connection)) in the order they must run
+MIGRATIONS = []
+
+def migration(version, description):
+    """Register a schema migration; each runs once, in its own transaction"""
+    def register(func):
+        MIGRATIONS.append((version, description, func))
+        MIGRATIONS.sort(key=lambda entry: entry[0])
+        return func
+    return register
+
+def applied_versions(engine):
+    with engine.connect() as conn:
+        return {row.version for row in conn.execute(select(schema_migrations.c.version))}
+
+def run_migrations(engine):
+    """Apply every registered migration the database hasn't seen yet.
+
+    Migrations run after Base.metadata.create_all, so on a fresh database
+    they mostly find their changes already in place and must be idempotent.
+    """
+    migration_metadata.create_all(bind=engine)
+    done = applied_versions(engine)
+    for version, description, func in MIGRATIONS:
+        if version in done:
+            continue
+        logger.info(f"Applying migration {version}: {description}")
+        with engine.begin() as conn:
+            func(conn)
+            conn.execute(schema_migrations.insert().values(
+                version=version, description=description, applied_at=datetime.utcnow()
+            ))
+
+def index_names(conn, table):
+    return {index["name"] for index in inspect(conn).get_indexes(table)}
+
+def column_names(conn, table):
+    return {column["name"] for column in inspect(conn).get_columns(table)}
+
+@migration(1, "Composite (product_id, timestamp) index on price_history")
+def add_price_history_product_timestamp_index(conn):
+    if "ix_price_history_product_timestamp" not in index_names(conn, "price_history"):
+        conn.execute(text(
+            "CREATE INDEX ix_price_history_product_timestamp ON price_history (product_id, timestamp)"
+        ))
+    if conn.dialect.name == "sqlite":
+        conn.execute(text("ANALYZE price_history"))
+
+@migration(2, "Run-length columns (last_seen, samples) on price_history")
+def add_price_history_run_columns(conn):
+    columns = column_names(conn, "price_history")
+    if "last_seen" not in columns:
+        conn.execute(text("ALTER TABLE price_history ADD COLUMN last_seen DATETIME"))
+    if "samples" not in columns:
+        conn.execute(text("ALTER TABLE price_history ADD COLUMN samples INTEGER NOT NULL DEFAULT 1"))
+
+@migration(3, "canonical_key on products, merging products that share one")
+def add_product_canonical_key(conn):
+    if "canonical_key" not in column_names(conn, "products"):
+        conn.execute(text("ALTER TABLE products ADD COLUMN canonical_key VARCHAR"))
+
+    groups = defaultdict(list)
+    for row in conn.execute(text("SELECT id, url, current_price, last_updated FROM products ORDER BY id")):
+        groups[canonical_key(row.url)].append(row)
+
+    # The oldest product of each group survives and takes over the others'
+    # history; its current price becomes the most recently scraped one
+    merged = 0
+    for rows in groups.values():
+        if len(rows) < 2:
+            continue
+        keeper, ids = rows[0].id, [row.id for row in rows[1:]]
+        latest = max(rows, key=lambda row: (row.last_updated is not None, row.last_updated))
+        conn.execute(
+            text("UPDATE price_history SET product_id = :keeper WHERE product_id IN :ids")
+            .bindparams(bindparam("ids", expanding=True)),
+            {"keeper": keeper, "ids": ids}
+        )
+        for table in ("refresh_schedule", "products"):
+            column = "id" if table == "products" else "product_id"
+            conn.execute(
+                text(f"DELETE FROM {table} WHERE {column} IN :ids").bindparams(bindparam("ids", expanding=True)),
+                {"ids": ids}
+            )
+        conn.execute(
+            text("UPDATE products SET current_price = :price, last_updated = :updated WHERE id = :keeper"),
+            {"price": latest.current_price, "updated": latest.last_updated, "keeper": keeper}
+        )
+        merged += len(ids)
+
+    keys = [{"key": key, "id": rows[0].id} for key, rows in groups.items()]
+    if keys:
+        conn.execute(text("UPDATE products SET canonical_key = :key WHERE id = :id"), keys)
+    if "ix_products_canonical_key" not in index_names(conn, "products"):
+        conn.execute(text("CREATE UNIQUE INDEX ix_products_canonical_key ON products (canonical_key)"))
+    if merged:
+        logger.info(f"Merged {merged} duplicate products into {sum(len(rows) > 1 for rows in groups.values())}")
+
+@migration(4, "Average, last change and 7/30-day change columns on product_stats")
+def add_product_stats_summary_columns(conn):
+    columns = column_names(conn, "product_stats")
+    for name, kind in (
+        ("avg_price", "FLOAT"), ("previous_price", "FLOAT"), ("last_changed_at", "DATETIME"),
+        ("change_7d", "FLOAT"), ("change_30d", "FLOAT"), ("recent_changes", "TEXT"),
+    ):
+        if name not in columns:
+            conn.execute(text(f"ALTER TABLE product_stats ADD COLUMN {name} {kind}"))
+
+    # Fill in every product, so listings can include stats straight away.
+    # Imported here: product_stats needs the models, which import this module
+    from product_stats import rebuild_stats
+
+    product_ids = [row.id for row in conn.execute(text("SELECT id FROM products ORDER BY id"))]
+    db = Session(bind=conn, autoflush=False)
+    try:
+        rebuild_stats(db, product_ids)
+        db.flush()
+    finally:
+        db.close()
+    if product_ids:
+        logger.info(f"Built stats for {len(product_ids)} products")
+
+@migration(5, "Indexed domain (host) column on products for the domain filter")
+def add_product_domain(conn):
+    if "domain" not in column_names(conn, "products"):
+        conn.execute(text("ALTER TABLE products ADD COLUMN domain VARCHAR"))
+    hosts = [
+        {"domain": url_host(row.url), "id": row.id}
+        for row in conn.execute(text("SELECT id, url FROM products WHERE domain IS NULL"))
+    ]
+    if hosts:
+        conn.execute(text("UPDATE products SET domain = :domain WHERE id = :id"), hosts)
+    # The filter is a LIKE prefix match, which only uses an index that
+    # compares like LIKE does: case-insensitively on SQLite, bytewise on PostgreSQL
+    if "ix_products_domain" not in index_names(conn, "products"):
+        if conn.dialect.name == "sqlite":
+            conn.execute(text("CREATE INDEX ix_products_domain ON products (domain COLLATE NOCASE)"))
+        else:
+            conn.execute(text("CREATE INDEX ix_products_domain ON products (domain text_pattern_ops)"))
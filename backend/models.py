@@ -1,5 +1,5 @@
 from pydantic import BaseModel, HttpUrl
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 from datetime import datetime
 
 class ProductCreate(BaseModel):
@@ -16,8 +16,24 @@ class ProductResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class ProductStatsResponse(BaseModel):
+    observations: int
+    last_price: Optional[float]
+    last_observed_at: Optional[datetime]
+    avg_price: Optional[float]
+    all_time_low: Optional[float]
+    all_time_low_at: Optional[datetime]
+    all_time_high: Optional[float]
+    previous_price: Optional[float]
+    last_changed_at: Optional[datetime]
+    change_7d: Optional[float]
+    change_30d: Optional[float]
+    
+    class Config:
+        from_attributes = True
+
 class PriceHistoryResponse(BaseModel):
-    id: int
+    id: Optional[int] = None  # None for points of days rolled up by retention
     product_id: int
     price: float
     timestamp: datetime
@@ -25,13 +41,214 @@ class PriceHistoryResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class PriceBucket(BaseModel):
+    start: datetime
+    end: datetime
+    min: float
+    max: float
+    avg: float
+    last: float
+    count: int
+
 class ProductWithHistory(BaseModel):
     product: ProductResponse
     price_history: List[PriceHistoryResponse]
+    stats: Optional[ProductStatsResponse] = None
 
 class ScrapeResult(BaseModel):
     name: Optional[str]
     price: Optional[float]
     success: bool
     error: Optional[str] = None
+    unchanged: bool = False
+    currency: Optional[str] = None
+    source: Optional[str] = None
+
+
+class BulkRefreshRequest(BaseModel):
+    product_ids: Optional[List[int]] = None
+    concurrency: Optional[int] = None
+    per_domain_concurrency: Optional[int] = None
+
+class BulkRefreshError(BaseModel):
+    product_id: int
+    domain: str
+    error: str
+
+class BulkRefreshSummary(BaseModel):
+    total: int
+    succeeded: int
+    failed: int
+    skipped: int
+    unchanged: int
+    failures_by_domain: Dict[str, int]
+    errors: List[BulkRefreshError]
+    elapsed_seconds: float
+    products_per_second: float
+
+class BrowserPoolMetrics(BaseModel):
+    size: int
+    open: int
+    idle: int
+    in_use: int
+    borrows: int
+    hits: int
+    spawns: int
+    spawn_failures: int
+    recycled: int
+    evicted: int
+    unhealthy: int
+    wait_seconds: float
+    avg_wait_ms: float
+    hit_rate: float
+
+class SchedulerTick(BaseModel):
+    due: int
+    succeeded: int
+    failed: int
+    enqueued: Optional[int] = None
+    at: str
+
+class SchedulerStatus(BaseModel):
+    running: bool
+    scrapes_per_minute: int
+    budget_available: int
+    scheduled_products: int
+    due_products: int
+    last_tick: Optional[SchedulerTick] = None
+
+class PageCacheStats(BaseModel):
+    size: int
+    max_entries: int
+    hits: int
+    misses: int
+    not_modified: int
+    unchanged_content: int
+    evictions: int
+    hit_rate: float
+
+class ScrapeCacheStats(BaseModel):
+    backend: str
+    ttl_seconds: float
+    size: int
+    max_entries: int
+    hits: int
+    misses: int
+    coalesced: int
+    remote_waits: int
+    evictions: int
+    expirations: int
+    hit_rate: float
+
+class ExtractionPathStats(BaseModel):
+    pages: int
+    structured: int
+    dom: int
+    cache: int
+    selenium: int
+    failed: int
+    structured_rate: float
+
+class DomainHealth(BaseModel):
+    state: str
+    consecutive_failures: int
+    retry_in_seconds: float
+    tokens: Optional[float] = None
+    requests: int
+    retries: int
+    failures: int
+    short_circuited: int
+    throttled_seconds: float
+
+class HostConnectionStats(BaseModel):
+    requests: int
+    opened: Optional[int] = None
+    discarded: Optional[int] = None
+    reuse_rate: Optional[float] = None
+
+class DnsCacheStats(BaseModel):
+    entries: int
+    hits: int
+    misses: int
+    hit_rate: float
+
+class TransportStats(BaseModel):
+    http2: bool
+    pool_maxsize: int
+    hosts: Dict[str, HostConnectionStats]
+    dns_cache: Optional[DnsCacheStats] = None
+    http_versions: Optional[Dict[str, int]] = None
+
+class JobResponse(BaseModel):
+    id: int
+    kind: str
+    url: str
+    product_id: Optional[int] = None
+    status: str
+    attempts: int
+    max_attempts: int
+    available_at: datetime
+    lease_expires_at: Optional[datetime] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    finished_at: Optional[datetime] = None
+
+class EnqueuedJobs(BaseModel):
+    enqueued: int
+    job_ids: List[int]
+
+class JobQueueStats(BaseModel):
+    queued: int
+    leased: int
+    done: int
+    dead: int
+    total: int
+    oldest_queued_seconds: Optional[float] = None
+
+class AlertRuleCreate(BaseModel):
+    product_id: Optional[int] = None
+    kind: str
+    threshold: Optional[float] = None
+    sink: Optional[str] = None
+    target: Optional[str] = None
+    enabled: bool = True
+
+class AlertRuleResponse(BaseModel):
+    id: int
+    product_id: Optional[int]
+    kind: str
+    threshold: Optional[float]
+    sink: Optional[str]
+    target: Optional[str]
+    enabled: bool
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+class AlertEventResponse(BaseModel):
+    id: int
+    rule_id: int
+    product_id: int
+    kind: str
+    price: float
+    reference: Optional[float]
+    message: str
+    triggered_at: datetime
+    
+    class Config:
+        from_attributes = True
 
+class LiveUpdateStats(BaseModel):
+    subscribers: int
+    last_event_id: int
+    buffered: int
+    events: int
+    polls: int
+    replays: int
+    resets: int
+    slow_disconnects: int
+    # Events delivered after ones with higher ids (late commits)
+    late_events: int
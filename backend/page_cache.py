@@ -0,0 +1,92 @@
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+
+# Number of URLs whose validators and last result are remembered
+PAGE_CACHE_SIZE = int(os.environ.get("PAGE_CACHE_SIZE", 5000))
+
+# Markup that changes between requests without affecting name or price
+VOLATILE_MARKUP = re.compile(
+    rb'<script\b.*?</script>|<style\b.*?</style>|<!--.*?-->|<noscript\b.*?</noscript>',
+    re.IGNORECASE | re.DOTALL
+)
+WHITESPACE = re.compile(rb'\s+')
+
+def content_digest(body):
+    """Hash the parts of a page that can affect the scraped result"""
+    relevant = WHITESPACE.sub(b' ', VOLATILE_MARKUP.sub(b'', body))
+    return hashlib.blake2b(relevant, digest_size=16).hexdigest()
+
+class CachedPage:
+    """Validators, content hash and last scrape result for one URL"""
+
+    __slots__ = ('etag', 'last_modified', 'digest', 'result')
+
+    def __init__(self, etag=None, last_modified=None, digest=None, result=None):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.digest = digest
+        self.result = result
+
+    def conditional_headers(self):
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+class PageCache:
+    """Bounded LRU cache of CachedPage entries keyed by URL"""
+
+    def __init__(self, max_entries=PAGE_CACHE_SIZE):
+        self.max_entries = max(1, max_entries)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'not_modified': 0,
+            'unchanged_content': 0,
+            'evictions': 0,
+        }
+
+    def get(self, url):
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None:
+                self._entries.move_to_end(url)
+            return entry
+
+    def put(self, url, entry):
+        with self._lock:
+            self._entries[url] = entry
+            self._entries.move_to_end(url)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def record(self, outcome):
+        """Count a lookup outcome: 'not_modified', 'unchanged_content' or 'misses'"""
+        with self._lock:
+            self._stats[outcome] += 1
+            if outcome != 'misses':
+                self._stats['hits'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            size = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        return {
+            'size': size,
+            'max_entries': self.max_entries,
+            **stats,
+            'hit_rate': round(stats['hits'] / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,138 @@
+import base64
+import json
+import re
+from datetime import datetime
+
+from sqlalchemy import and_, or_, func
+
+from database import Product, ProductStats
+from product_stats import STATS_FIELDS
+
+# Columns of ProductResponse that can be requested with ?fields=
+PRODUCT_FIELDS = ('id', 'name', 'url', 'current_price', 'last_updated', 'created_at')
+DATETIME_FIELDS = {'last_updated', 'created_at'}
+
+# Sortable columns; products without a price sort as if priced -1
+SORT_FIELDS = ('id', 'name', 'current_price', 'last_updated', 'created_at')
+MISSING_PRICE = -1.0
+MAX_PAGE_SIZE = 1000
+
+class CursorError(ValueError):
+    pass
+
+def sort_expression(sort):
+    if sort == 'current_price':
+        return func.coalesce(Product.current_price, MISSING_PRICE)
+    return getattr(Product, sort)
+
+def sort_value(row, sort):
+    value = getattr(row, sort)
+    if sort == 'current_price' and value is None:
+        return MISSING_PRICE
+    return value
+
+def encode_cursor(value, product_id):
+    """Opaque cursor for the position just after (value, product_id)"""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([value, product_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, sort):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        value, product_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if sort in DATETIME_FIELDS:
+            value = datetime.fromisoformat(value)
+        return value, int(product_id)
+    except (ValueError, TypeError) as e:
+        raise CursorError(f"Invalid cursor: {e}")
+
+def parse_fields(fields):
+    """Turn ?fields=a,b into a tuple of known product fields"""
+    if not fields:
+        return PRODUCT_FIELDS
+    selected = tuple(dict.fromkeys(field.strip() for field in fields.split(',') if field.strip()))
+    unknown = [field for field in selected if field not in PRODUCT_FIELDS]
+    if unknown or not selected:
+        raise ValueError(f"Unknown fields: {', '.join(unknown) or fields}")
+    return selected
+
+def like_prefix(value):
+    """LIKE pattern matching strings that start with `value`, its wildcards escaped"""
+    return re.sub(r'([\\%_])', r'\\\1', value) + '%'
+
+def domain_prefix(domain):
+    """A domain filter in the form of Product.domain: lowercased, without `www.`"""
+    domain = domain.strip().lower()
+    return domain[4:] if domain.startswith('www.') else domain
+
+def apply_filters(query, domain=None, min_price=None, max_price=None, stale_since=None):
+    if domain:
+        # Matches hosts starting with it ('amazon' finds amazon.com and amazon.co.uk), from an index
+        query = query.filter(Product.domain.like(like_prefix(domain_prefix(domain)), escape='\\'))
+    if min_price is not None:
+        query = query.filter(Product.current_price >= min_price)
+    if max_price is not None:
+        query = query.filter(Product.current_price <= max_price)
+    if stale_since is not None:
+        query = query.filter(Product.last_updated < stale_since)
+    return query
+
+def apply_keyset(query, sort, descending, cursor):
+    """Order by (sort, id) and continue after the cursor position"""
+    column = sort_expression(sort)
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort)
+        if sort == 'id':
+            query = query.filter(Product.id < last_id if descending else Product.id > last_id)
+        elif descending:
+            query = query.filter(or_(column < value, and_(column == value, Product.id < last_id)))
+        else:
+            query = query.filter(or_(column > value, and_(column == value, Product.id > last_id)))
+
+    if sort == 'id':
+        return query.order_by(Product.id.desc() if descending else Product.id.asc())
+    if descending:
+        return query.order_by(column.desc(), Product.id.desc())
+    return query.order_by(column.asc(), Product.id.asc())
+
+def json_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def fetch_page(db, fields, limit=None, cursor=None, sort='id', descending=False, include_stats=False, **filters):
+    """Return (rows as dicts, next cursor or None).
+
+    With `include_stats` each row carries a `stats` object read from the
+    product_stats summary through one outer join; price_history is never
+    touched.
+    """
+    columns = tuple(dict.fromkeys(fields + ('id', sort)))
+    query = db.query(*[getattr(Product, name) for name in columns])
+    if include_stats:
+        query = query.outerjoin(ProductStats, ProductStats.product_id == Product.id).add_columns(
+            ProductStats.product_id.label('stats_product_id'),
+            *[getattr(ProductStats, name).label(f'stats_{name}') for name in STATS_FIELDS]
+        )
+    query = apply_keyset(apply_filters(query, **filters), sort, descending, cursor)
+    if limit is not None:
+        query = query.limit(limit + 1)
+    rows = query.all()
+
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(sort_value(last, sort), last.id)
+
+    items = []
+    for row in rows:
+        item = {}
+        for name in fields:
+            item[name] = json_value(getattr(row, name))
+        if include_stats:
+            item['stats'] = None if row.stats_product_id is None else {
+                name: json_value(getattr(row, f'stats_{name}')) for name in STATS_FIELDS
+            }
+        items.append(item)
+    return items, next_cursor
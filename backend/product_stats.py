@@ -0,0 +1,292 @@
+import argparse
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, create_tables, Product, PriceHistory, PriceHistoryDaily, ProductStats
+
+logger = logging.getLogger(__name__)
+
+# Window for the rolling maximum that percent-drop alerts compare against
+STATS_ROLLING_WINDOW_DAYS = float(os.environ.get("STATS_ROLLING_WINDOW_DAYS", 30))
+
+# Price change periods: column -> days before the last observation
+CHANGE_PERIODS = {'change_7d': 7, 'change_30d': 30}
+CHANGE_WINDOW = timedelta(days=max(CHANGE_PERIODS.values()))
+
+# Products recomputed per transaction by rebuilds
+REBUILD_BATCH_SIZE = 500
+
+# Summary fields returned by the API
+STATS_FIELDS = (
+    'observations', 'last_price', 'last_observed_at', 'avg_price', 'all_time_low', 'all_time_low_at',
+    'all_time_high', 'previous_price', 'last_changed_at', 'change_7d', 'change_30d',
+)
+
+# Timestamps are stored as naive UTC
+EPOCH = datetime(1970, 1, 1)
+
+def epoch_seconds(moment):
+    return (moment - EPOCH).total_seconds()
+
+def push_peak(peaks, moment, price, window):
+    """Add an observation to a monotonic deque of [epoch, price] peaks.
+
+    Peaks older than the window fall off the front, and earlier peaks no
+    higher than `price` can never be the maximum again, so they are dropped
+    from the back. The first peak is the window's maximum, and the deque
+    stays as short as the number of falling prices in the window.
+    """
+    cutoff = epoch_seconds(moment) - window.total_seconds()
+    start = 0
+    while start < len(peaks) and peaks[start][0] < cutoff:
+        start += 1
+    del peaks[:start]
+    while peaks and peaks[-1][1] <= price:
+        peaks.pop()
+    peaks.append([epoch_seconds(moment), price])
+    return peaks
+
+def push_change(changes, moment, price, window=CHANGE_WINDOW):
+    """Add an observation to a list of [epoch, price] price changes.
+
+    Only changes are kept, and of those older than the window only the
+    last one, which is the price in effect when the window starts.
+    """
+    if not changes or changes[-1][1] != price:
+        changes.append([epoch_seconds(moment), price])
+    cutoff = epoch_seconds(moment) - window.total_seconds()
+    start = 0
+    while start + 1 < len(changes) and changes[start + 1][0] <= cutoff:
+        start += 1
+    del changes[:start]
+    return changes
+
+def price_at(changes, seconds):
+    """The price in effect at an epoch time, or None before the first change"""
+    price = None
+    for at, value in changes:
+        if at > seconds:
+            break
+        price = value
+    return price
+
+def apply_changes(stats, changes):
+    """Set the change_* columns from the recent changes, as of the last observation"""
+    latest = epoch_seconds(stats.last_observed_at)
+    for column, days in CHANGE_PERIODS.items():
+        then = price_at(changes, latest - days * 86400)
+        setattr(stats, column, round(stats.last_price - then, 2) if then is not None else None)
+    stats.recent_changes = json.dumps(changes)
+
+def rolling_max(stats):
+    peaks = json.loads(stats.window_peaks) if stats.window_peaks else []
+    return peaks[0][1] if peaks else None
+
+def snapshot(stats):
+    """The fields alert rules compare against, before an update"""
+    if stats is None or not stats.observations:
+        return None
+    return {
+        'observations': stats.observations,
+        'last_price': stats.last_price,
+        'last_observed_at': stats.last_observed_at,
+        'all_time_low': stats.all_time_low,
+        'all_time_high': stats.all_time_high,
+        'rolling_max': rolling_max(stats),
+    }
+
+def compute_stats(db, product_id, now=None, window=None):
+    """Build a product's stats from its stored history.
+
+    Used once for products that have history but no stats row yet, and by
+    rebuilds. Aggregates run on the (product_id, timestamp) index; only the
+    rows of the last 30 days (or the rolling window, if longer) are read
+    individually. Days rolled up by retention count towards the all-time
+    figures; the previous price is only looked for in raw history.
+    """
+    now = now or datetime.utcnow()
+    window = window or timedelta(days=STATS_ROLLING_WINDOW_DAYS)
+    stats = ProductStats(product_id=product_id, observations=0, updated_at=now)
+    observations, total, low, high = db.query(
+        func.coalesce(func.sum(PriceHistory.samples), 0),
+        func.sum(PriceHistory.price * PriceHistory.samples),
+        func.min(PriceHistory.price),
+        func.max(PriceHistory.price),
+    ).filter(PriceHistory.product_id == product_id).one()
+    low_at = db.query(PriceHistory.timestamp).filter(
+        PriceHistory.product_id == product_id, PriceHistory.price == low
+    ).order_by(PriceHistory.timestamp).limit(1).scalar()
+    latest = db.query(PriceHistory.price, PriceHistory.timestamp, PriceHistory.last_seen).filter(
+        PriceHistory.product_id == product_id
+    ).order_by(PriceHistory.timestamp.desc(), PriceHistory.id.desc()).first()
+
+    days, days_total, days_low, days_high = db.query(
+        func.coalesce(func.sum(PriceHistoryDaily.samples), 0),
+        func.sum(PriceHistoryDaily.avg_price * PriceHistoryDaily.samples),
+        func.min(PriceHistoryDaily.low),
+        func.max(PriceHistoryDaily.high),
+    ).filter(PriceHistoryDaily.product_id == product_id).one()
+    if days:
+        # Rolled-up days are older than the raw rows, so they win ties for the low
+        if low is None or days_low <= low:
+            low = days_low
+            low_at = db.query(PriceHistoryDaily.low_at).filter(
+                PriceHistoryDaily.product_id == product_id, PriceHistoryDaily.low == days_low
+            ).order_by(PriceHistoryDaily.day).limit(1).scalar()
+        high = days_high if high is None else max(high, days_high)
+        observations += days
+        total = days_total + (total or 0)
+        if latest is None:
+            latest = db.query(
+                PriceHistoryDaily.close.label('price'), PriceHistoryDaily.closed_at.label('timestamp'),
+                PriceHistoryDaily.closed_at.label('last_seen')
+            ).filter(PriceHistoryDaily.product_id == product_id).order_by(PriceHistoryDaily.day.desc()).first()
+    if not observations:
+        return stats
+
+    # The current price started right after the last row with another price
+    previous = db.query(PriceHistory.price, PriceHistory.timestamp).filter(
+        PriceHistory.product_id == product_id, PriceHistory.price != latest.price
+    ).order_by(PriceHistory.timestamp.desc(), PriceHistory.id.desc()).first()
+    if previous is not None:
+        stats.previous_price = previous.price
+        stats.last_changed_at = db.query(func.min(PriceHistory.timestamp)).filter(
+            PriceHistory.product_id == product_id, PriceHistory.timestamp > previous.timestamp
+        ).scalar()
+
+    stats.observations = int(observations)
+    stats.avg_price = total / observations
+    stats.last_price = latest.price
+    stats.last_observed_at = latest.last_seen or latest.timestamp
+    stats.all_time_low = low
+    stats.all_time_low_at = low_at
+    stats.all_time_high = high
+
+    peaks = []
+    changes = []
+    cutoff = stats.last_observed_at - max(window, CHANGE_WINDOW)
+    opening = db.query(PriceHistory.price, PriceHistory.timestamp).filter(
+        PriceHistory.product_id == product_id, PriceHistory.timestamp < cutoff
+    ).order_by(PriceHistory.timestamp.desc(), PriceHistory.id.desc()).first()
+    if opening is not None:
+        push_change(changes, opening.timestamp, opening.price)
+    for row in db.query(PriceHistory.price, PriceHistory.timestamp, PriceHistory.last_seen).filter(
+        PriceHistory.product_id == product_id,
+        func.coalesce(PriceHistory.last_seen, PriceHistory.timestamp) >= cutoff
+    ).order_by(PriceHistory.timestamp, PriceHistory.id):
+        push_change(changes, row.timestamp, row.price)
+        push_peak(peaks, row.last_seen or row.timestamp, row.price, window)
+    stats.window_peaks = json.dumps(peaks)
+    apply_changes(stats, changes)
+    return stats
+
+def load_stats(db, product_id):
+    """The product's stats row for this session, created from history if missing.
+
+    Rows are cached in the session so several writes for one product in a
+    single transaction (without autoflush) keep updating the same object.
+    The row is read FOR UPDATE, so on PostgreSQL concurrent writers (API
+    and workers) take turns instead of overwriting each other's counts;
+    SQLite has one writer at a time anyway and ignores it.
+    """
+    cache = db.info.setdefault('product_stats', {})
+    stats = cache.get(product_id)
+    if stats is None:
+        stats = db.get(ProductStats, product_id, with_for_update=True)
+        if stats is None:
+            stats = compute_stats(db, product_id)
+            db.add(stats)
+        cache[product_id] = stats
+    return stats
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def forget_cached_stats(session):
+    # Rows added in a rolled back transaction are gone, and after a commit
+    # sessions that don't expire on commit (the API's) would keep stale rows
+    session.info.pop('product_stats', None)
+
+def update_stats(db, product_id, price, observed_at):
+    """Fold one observation into the product's stats in constant time.
+
+    Returns (snapshot before the update, stats row). Observations older
+    than the latest one (backfills) update the count, average and extremes
+    but not the last price, changes or the rolling window.
+    """
+    stats = load_stats(db, product_id)
+    before = snapshot(stats)
+
+    stats.observations = (stats.observations or 0) + 1
+    if stats.avg_price is None:
+        stats.avg_price = price
+    else:
+        stats.avg_price += (price - stats.avg_price) / stats.observations
+    if stats.all_time_low is None or price < stats.all_time_low:
+        stats.all_time_low = price
+        stats.all_time_low_at = observed_at
+    if stats.all_time_high is None or price > stats.all_time_high:
+        stats.all_time_high = price
+    if stats.last_observed_at is None or observed_at >= stats.last_observed_at:
+        if stats.last_price is not None and price != stats.last_price:
+            stats.previous_price = stats.last_price
+            stats.last_changed_at = observed_at
+        stats.last_price = price
+        stats.last_observed_at = observed_at
+        peaks = json.loads(stats.window_peaks) if stats.window_peaks else []
+        window = timedelta(days=STATS_ROLLING_WINDOW_DAYS)
+        stats.window_peaks = json.dumps(push_peak(peaks, observed_at, price, window))
+        changes = json.loads(stats.recent_changes) if stats.recent_changes else []
+        apply_changes(stats, push_change(changes, observed_at, price))
+    stats.updated_at = datetime.utcnow()
+    return before, stats
+
+def stats_dict(stats):
+    """API representation of a stats row"""
+    if stats is None:
+        return None
+    return {field: getattr(stats, field) for field in STATS_FIELDS}
+
+def rebuild_stats(db, product_ids):
+    """Recompute the stats rows of the given products from history (the caller commits)"""
+    cache = db.info.setdefault('product_stats', {})
+    for product_id in product_ids:
+        cache[product_id] = db.merge(compute_stats(db, product_id))
+    return len(product_ids)
+
+def rebuild_all(session_factory=SessionLocal, product_ids=None, batch_size=REBUILD_BATCH_SIZE):
+    """Rebuild the stats of the given products (all by default), one transaction per batch"""
+    started = time.perf_counter()
+    db = session_factory()
+    try:
+        query = db.query(Product.id).order_by(Product.id)
+        if product_ids:
+            query = query.filter(Product.id.in_(product_ids))
+        targets = [row.id for row in query]
+        for i in range(0, len(targets), batch_size):
+            rebuild_stats(db, targets[i:i + batch_size])
+            db.commit()
+    finally:
+        db.close()
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"Rebuilt stats for {len(targets)} products in {elapsed:.1f}s")
+    return {'products': len(targets), 'elapsed_seconds': round(elapsed, 3)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the product_stats summary table from price history")
+    parser.add_argument("--ids", type=int, nargs="*", help="Only rebuild these product ids")
+    parser.add_argument("--batch-size", type=int, default=REBUILD_BATCH_SIZE, help="Products per transaction")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    create_tables()
+    print(json.dumps(rebuild_all(product_ids=args.ids, batch_size=args.batch_size), indent=2))
+
+if __name__ == "__main__":
+    main()
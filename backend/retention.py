@@ -0,0 +1,244 @@
+import argparse
+import gzip
+import json
+import logging
+import os
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select, text
+
+from database import engine, create_tables, Product, PriceHistory, PriceHistoryDaily, DELETE_CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Days of raw price_history kept; older rows are rolled up into price_history_daily
+RETENTION_RAW_DAYS = int(os.environ.get("RETENTION_RAW_DAYS", 90))
+# Directory for gzipped NDJSON archives of the rolled-up rows (empty: the rows are dropped)
+RETENTION_ARCHIVE_DIR = os.environ.get("RETENTION_ARCHIVE_DIR", "")
+
+history = PriceHistory.__table__
+daily = PriceHistoryDaily.__table__
+
+# A price_history row read back from an archive file
+ArchivedRow = namedtuple('ArchivedRow', ['id', 'product_id', 'price', 'timestamp', 'last_seen', 'samples'])
+
+def day_of(moment):
+    return datetime(moment.year, moment.month, moment.day)
+
+def month_of(moment):
+    return datetime(moment.year, moment.month, 1)
+
+def retention_cutoff(now=None, days=RETENTION_RAW_DAYS):
+    """Midnight opening the raw retention window: rows last seen before it get rolled up"""
+    return day_of((now or datetime.utcnow()) - timedelta(days=days))
+
+def row_observations(row):
+    """(at, price, samples) of a stored row; a run's later samples count at its last_seen, as in bucket_series"""
+    samples = row.samples or 1
+    if row.last_seen is not None and row.last_seen > row.timestamp:
+        return [(row.timestamp, row.price, 1), (row.last_seen, row.price, samples - 1)]
+    return [(row.timestamp, row.price, samples)]
+
+def merge_day(a, b):
+    """Combine two aggregates of the same day, in either order"""
+    first = a if a['opened_at'] <= b['opened_at'] else b
+    last = b if b['closed_at'] >= a['closed_at'] else a
+    high = a if a['high'] >= b['high'] else b
+    low = a if a['low'] <= b['low'] else b
+    return {
+        'open': first['open'], 'opened_at': first['opened_at'],
+        'high': high['high'], 'high_at': high['high_at'],
+        'low': low['low'], 'low_at': low['low_at'],
+        'close': last['close'], 'closed_at': last['closed_at'],
+        'total': a['total'] + b['total'],
+        'samples': a['samples'] + b['samples'],
+    }
+
+def aggregate_days(rows):
+    """Daily OHLC aggregates of stored rows, keyed by day"""
+    days = {}
+    for row in rows:
+        for at, price, samples in row_observations(row):
+            point = {
+                'open': price, 'opened_at': at, 'high': price, 'high_at': at,
+                'low': price, 'low_at': at, 'close': price, 'closed_at': at,
+                'total': price * samples, 'samples': samples,
+            }
+            day = day_of(at)
+            days[day] = merge_day(days[day], point) if day in days else point
+    return days
+
+def archive_path(archive_dir, product_id, month):
+    return os.path.join(archive_dir, str(product_id), f"{month:%Y-%m}.ndjson.gz")
+
+def archive_rows(archive_dir, product_id, rows):
+    """Append rows to the product's monthly archive files.
+
+    Every call adds a gzip member to the file, which gzip readers see as
+    one stream. A row is written to the month of each of its points, so a
+    run crossing a month boundary is found from either side; readers drop
+    the copies by id.
+    """
+    months = {}
+    for row in rows:
+        line = json.dumps({
+            'id': row.id,
+            'price': row.price,
+            'timestamp': row.timestamp.isoformat(),
+            'last_seen': row.last_seen.isoformat() if row.last_seen else None,
+            'samples': row.samples or 1,
+        }, separators=(',', ':'))
+        for month in {month_of(row.timestamp), month_of(row.last_seen or row.timestamp)}:
+            months.setdefault(month, []).append(line)
+
+    os.makedirs(os.path.join(archive_dir, str(product_id)), exist_ok=True)
+    for month, lines in months.items():
+        with gzip.open(archive_path(archive_dir, product_id, month), 'at', encoding='utf-8') as archive:
+            archive.write('\n'.join(lines) + '\n')
+
+def read_archive(product_id, start=None, end=None, archive_dir=RETENTION_ARCHIVE_DIR):
+    """Archived rows of a product reaching into a time window, oldest first"""
+    directory = os.path.join(archive_dir, str(product_id))
+    if not archive_dir or not os.path.isdir(directory):
+        return []
+    first_month = month_of(start) if start is not None else None
+    rows = {}
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith('.ndjson.gz'):
+            continue
+        month = datetime.strptime(name[:-len('.ndjson.gz')], '%Y-%m')
+        if (first_month is not None and month < first_month) or (end is not None and month > end):
+            continue
+        with gzip.open(os.path.join(directory, name), 'rt', encoding='utf-8') as archive:
+            for line in archive:
+                data = json.loads(line)
+                timestamp = datetime.fromisoformat(data['timestamp'])
+                last_seen = datetime.fromisoformat(data['last_seen']) if data['last_seen'] else None
+                if (start is not None and (last_seen or timestamp) < start) or (end is not None and timestamp > end):
+                    continue
+                rows[data['id']] = ArchivedRow(data['id'], product_id, data['price'], timestamp, last_seen, data['samples'])
+    return sorted(rows.values(), key=lambda row: (row.timestamp, row.id))
+
+def roll_up_product(conn, product_id, cutoff, archive_dir=None):
+    """Replace a product's rows last seen before `cutoff` with daily aggregates.
+
+    Days that already have an aggregate (from an earlier run, or a run row
+    still being extended at the time) are merged with it. With
+    `archive_dir`, the rows are appended to archive files first. Returns
+    (rows rolled up, days touched).
+    """
+    rows = conn.execute(
+        select(history.c.id, history.c.price, history.c.timestamp, history.c.last_seen, history.c.samples)
+        .where(
+            history.c.product_id == product_id,
+            history.c.timestamp < cutoff,
+            func.coalesce(history.c.last_seen, history.c.timestamp) < cutoff,
+        )
+        .order_by(history.c.timestamp, history.c.id)
+    ).all()
+    if not rows:
+        return 0, 0
+
+    days = aggregate_days(rows)
+    archived = {day: bool(archive_dir) for day in days}
+    existing = conn.execute(
+        select(daily).where(daily.c.product_id == product_id, daily.c.day.between(min(days), max(days)))
+    ).all()
+    merged = []
+    for row in existing:
+        if row.day not in days:
+            continue
+        days[row.day] = merge_day({
+            'open': row.open, 'opened_at': row.opened_at, 'high': row.high, 'high_at': row.high_at,
+            'low': row.low, 'low_at': row.low_at, 'close': row.close, 'closed_at': row.closed_at,
+            'total': row.avg_price * row.samples, 'samples': row.samples,
+        }, days[row.day])
+        # A day is archived only if all of its raw rows are
+        archived[row.day] = archived[row.day] and row.archived
+        merged.append(row.day)
+
+    if archive_dir:
+        archive_rows(archive_dir, product_id, rows)
+    for i in range(0, len(merged), DELETE_CHUNK_SIZE):
+        conn.execute(daily.delete().where(
+            daily.c.product_id == product_id, daily.c.day.in_(merged[i:i + DELETE_CHUNK_SIZE])
+        ))
+    conn.execute(daily.insert(), [
+        {
+            'product_id': product_id,
+            'day': day,
+            'open': aggregate['open'],
+            'high': aggregate['high'],
+            'low': aggregate['low'],
+            'close': aggregate['close'],
+            'avg_price': aggregate['total'] / aggregate['samples'],
+            'samples': aggregate['samples'],
+            'opened_at': aggregate['opened_at'],
+            'high_at': aggregate['high_at'],
+            'low_at': aggregate['low_at'],
+            'closed_at': aggregate['closed_at'],
+            'archived': archived[day],
+        }
+        for day, aggregate in days.items()
+    ])
+    ids = [row.id for row in rows]
+    for i in range(0, len(ids), DELETE_CHUNK_SIZE):
+        conn.execute(history.delete().where(history.c.id.in_(ids[i:i + DELETE_CHUNK_SIZE])))
+    return len(rows), len(days)
+
+def apply_retention(bind=engine, days=RETENTION_RAW_DAYS, archive_dir=RETENTION_ARCHIVE_DIR, product_ids=None,
+                    vacuum=False, now=None):
+    """Roll up history older than `days` for the given products (all by default), one transaction per product"""
+    started = time.perf_counter()
+    cutoff = retention_cutoff(now, days)
+    with bind.connect() as conn:
+        query = select(Product.__table__.c.id).order_by(Product.__table__.c.id)
+        if product_ids:
+            query = query.where(Product.__table__.c.id.in_(product_ids))
+        targets = [row.id for row in conn.execute(query)]
+
+    rows_rolled_up = days_touched = 0
+    for product_id in targets:
+        with bind.begin() as conn:
+            rows, touched = roll_up_product(conn, product_id, cutoff, archive_dir)
+        rows_rolled_up += rows
+        days_touched += touched
+
+    # Deleted rows only become free pages; VACUUM gives the space back to the filesystem
+    if vacuum and bind.dialect.name == 'sqlite':
+        with bind.connect() as conn:
+            conn.execution_options(isolation_level="AUTOCOMMIT").execute(text("VACUUM"))
+
+    elapsed = time.perf_counter() - started
+    logger.info(
+        f"Rolled up {rows_rolled_up} history rows older than {cutoff:%Y-%m-%d} into {days_touched} daily "
+        f"aggregates for {len(targets)} products in {elapsed:.1f}s"
+    )
+    return {
+        'products': len(targets),
+        'cutoff': cutoff.isoformat(),
+        'rows_rolled_up': rows_rolled_up,
+        'days': days_touched,
+        'archived': bool(archive_dir),
+        'elapsed_seconds': round(elapsed, 3),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Roll price history older than the retention window into daily aggregates")
+    parser.add_argument("--days", type=int, default=RETENTION_RAW_DAYS, help="Days of raw history to keep")
+    parser.add_argument("--archive-dir", default=RETENTION_ARCHIVE_DIR,
+                        help="Append the rolled-up rows to gzipped NDJSON files here")
+    parser.add_argument("--ids", type=int, nargs="*", help="Only roll up these product ids")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM the SQLite file afterwards")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    create_tables()
+    print(json.dumps(apply_retention(
+        days=args.days, archive_dir=args.archive_dir, product_ids=args.ids, vacuum=args.vacuum
+    ), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+from database import SessionLocal, create_tables, Product, RefreshSchedule
+from bulk_refresh import BulkRefresher
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Scheduler settings, overridable through the environment
+SCHEDULER_ENABLED = os.environ.get("SCHEDULER_ENABLED", "0") == "1"
+SCHEDULER_POLL_SECONDS = float(os.environ.get("SCHEDULER_POLL_SECONDS", 15))
+SCHEDULER_SCRAPES_PER_MINUTE = int(os.environ.get("SCHEDULER_SCRAPES_PER_MINUTE", 30))
+SCHEDULER_MIN_INTERVAL = float(os.environ.get("SCHEDULER_MIN_INTERVAL", 15 * 60))
+SCHEDULER_MAX_INTERVAL = float(os.environ.get("SCHEDULER_MAX_INTERVAL", 24 * 60 * 60))
+SCHEDULER_INITIAL_INTERVAL = float(os.environ.get("SCHEDULER_INITIAL_INTERVAL", 6 * 60 * 60))
+
+# How fast intervals react to a price change / an unchanged price
+SPEEDUP_FACTOR = 0.5
+BACKOFF_FACTOR = 1.5
+
+class ScrapeBudget:
+    """Sliding one-minute window capping how many scrapes may start"""
+
+    def __init__(self, per_minute):
+        self.per_minute = max(1, per_minute)
+        self._started = deque()
+
+    def available(self):
+        cutoff = time.monotonic() - 60
+        while self._started and self._started[0] < cutoff:
+            self._started.popleft()
+        return self.per_minute - len(self._started)
+
+    def spend(self, count):
+        now = time.monotonic()
+        self._started.extend([now] * count)
+
+class RefreshScheduler:
+    """Background refresher with adaptive per-product intervals.
+
+    Each product gets a row in `refresh_schedule` holding its current poll
+    interval and next due time. When a refresh sees a new price the interval
+    shrinks, when the price is unchanged it backs off, bounded by
+    SCHEDULER_MIN_INTERVAL and SCHEDULER_MAX_INTERVAL. Because the due times
+    live in the database, a restart resumes the existing spread instead of
+    refreshing everything at once.
+
+    With a job `queue` the scheduler only enqueues refresh jobs and pushes
+    the due time one interval ahead; the worker that runs a job adapts the
+    interval from its result through reschedule().
+    """
+
+    def __init__(self, scraper=None, session_factory=SessionLocal,
+                 scrapes_per_minute=SCHEDULER_SCRAPES_PER_MINUTE,
+                 poll_seconds=SCHEDULER_POLL_SECONDS,
+                 min_interval=SCHEDULER_MIN_INTERVAL,
+                 max_interval=SCHEDULER_MAX_INTERVAL,
+                 initial_interval=SCHEDULER_INITIAL_INTERVAL,
+                 queue=None):
+        self.session_factory = session_factory
+        self.queue = queue
+        self.refresher = BulkRefresher(scraper=scraper, session_factory=session_factory)
+        self.budget = ScrapeBudget(scrapes_per_minute)
+        self.poll_seconds = poll_seconds
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.initial_interval = min(max(initial_interval, min_interval), max_interval)
+
+        self._task = None
+        self._stopping = None
+        self.last_tick = None
+
+    def next_interval(self, interval, changed):
+        """Shrink the interval for volatile prices, grow it for static ones"""
+        factor = SPEEDUP_FACTOR if changed else BACKOFF_FACTOR
+        return min(self.max_interval, max(self.min_interval, interval * factor))
+
+    def schedule_new_products(self, db, now):
+        """Create schedule rows for products that don't have one yet.
+
+        Products that are already stale are spread over the time the scrape
+        budget needs to work through them rather than all becoming due now.
+        """
+        rows = db.query(Product.id, Product.last_updated, Product.current_price).outerjoin(
+            RefreshSchedule, RefreshSchedule.product_id == Product.id
+        ).filter(RefreshSchedule.product_id.is_(None)).all()
+        if not rows:
+            return 0
+
+        spread = max(60.0, len(rows) / self.budget.per_minute * 60.0)
+        for row in rows:
+            due = (row.last_updated or now) + timedelta(seconds=self.initial_interval)
+            if due <= now:
+                due = now + timedelta(seconds=random.uniform(0, spread))
+            db.add(RefreshSchedule(
+                product_id=row.id,
+                interval_seconds=self.initial_interval,
+                next_run_at=due,
+                last_price=row.current_price,
+                unchanged_runs=0,
+            ))
+        db.commit()
+        return len(rows)
+
+    def claim_due(self, limit):
+        """Return ids of up to `limit` products that are due, oldest first"""
+        now = datetime.utcnow()
+        db = self.session_factory()
+        try:
+            self.schedule_new_products(db, now)
+            if limit <= 0:
+                return []
+            rows = db.query(RefreshSchedule.product_id).filter(
+                RefreshSchedule.next_run_at <= now
+            ).order_by(RefreshSchedule.next_run_at).limit(limit).all()
+            return [row.product_id for row in rows]
+        finally:
+            db.close()
+
+    def reschedule(self, results):
+        """Adapt intervals from a batch of scrape results and persist them"""
+        now = datetime.utcnow()
+        db = self.session_factory()
+        try:
+            schedules = db.query(RefreshSchedule).filter(
+                RefreshSchedule.product_id.in_(list(results))
+            ).all()
+            for schedule in schedules:
+                result = results[schedule.product_id]
+                if result['success'] and result['price']:
+                    changed = schedule.last_price is not None and result['price'] != schedule.last_price
+                    schedule.interval_seconds = self.next_interval(schedule.interval_seconds, changed)
+                    schedule.unchanged_runs = 0 if changed else (schedule.unchanged_runs or 0) + 1
+                    if changed:
+                        schedule.last_changed_at = now
+                    schedule.last_price = result['price']
+                # Failed scrapes keep their interval and are retried next cycle
+                schedule.next_run_at = now + timedelta(seconds=schedule.interval_seconds)
+            db.commit()
+        finally:
+            db.close()
+
+    def enqueue_due(self, product_ids):
+        """Queue refresh jobs for due products and postpone them by their interval"""
+        now = datetime.utcnow()
+        db = self.session_factory()
+        try:
+            rows = db.query(RefreshSchedule, Product.url).join(
+                Product, Product.id == RefreshSchedule.product_id
+            ).filter(RefreshSchedule.product_id.in_(product_ids)).all()
+            jobs = self.queue.enqueue_many([('refresh', url, schedule.product_id) for schedule, url in rows])
+            for schedule, _ in rows:
+                schedule.next_run_at = now + timedelta(seconds=schedule.interval_seconds)
+            db.commit()
+            return len(jobs)
+        finally:
+            db.close()
+
+    async def tick(self):
+        """Refresh whatever is due, within the remaining scrape budget"""
+        loop = asyncio.get_running_loop()
+        product_ids = await loop.run_in_executor(None, self.claim_due, self.budget.available())
+        summary = {'due': len(product_ids), 'succeeded': 0, 'failed': 0}
+        if product_ids and self.queue is not None:
+            self.budget.spend(len(product_ids))
+            summary['enqueued'] = await loop.run_in_executor(None, self.enqueue_due, product_ids)
+        elif product_ids:
+            self.budget.spend(len(product_ids))
+            results = {}
+            refresh_summary = await self.refresher.refresh(
+                product_ids, on_result=lambda product_id, result: results.__setitem__(product_id, result)
+            )
+            await loop.run_in_executor(None, self.reschedule, results)
+            summary['succeeded'] = refresh_summary['succeeded']
+            summary['failed'] = refresh_summary['failed']
+        self.last_tick = {**summary, 'at': datetime.utcnow().isoformat()}
+        return summary
+
+    async def run_forever(self):
+        self._stopping = asyncio.Event()
+        logger.info(
+            f"Refresh scheduler started ({self.budget.per_minute} scrapes/min, "
+            f"polling every {self.poll_seconds}s)"
+        )
+        while not self._stopping.is_set():
+            try:
+                await self.tick()
+            except Exception as e:
+                logger.error(f"Scheduler tick failed: {e}")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        """Run the scheduler as a task on the current event loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run_forever())
+        return self._task
+
+    async def stop(self):
+        if self._task is None:
+            return
+        if self._stopping is not None:
+            self._stopping.set()
+        await self._task
+        self._task = None
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def status(self):
+        db = self.session_factory()
+        try:
+            now = datetime.utcnow()
+            scheduled = db.query(RefreshSchedule).count()
+            due = db.query(RefreshSchedule).filter(RefreshSchedule.next_run_at <= now).count()
+        finally:
+            db.close()
+        return {
+            'running': self.running,
+            'scrapes_per_minute': self.budget.per_minute,
+            'budget_available': self.budget.available(),
+            'scheduled_products': scheduled,
+            'due_products': due,
+            'last_tick': self.last_tick,
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the background price refresh scheduler")
+    parser.add_argument("--once", action="store_true", help="Run a single scheduling pass and exit")
+    parser.add_argument("--per-minute", type=int, default=SCHEDULER_SCRAPES_PER_MINUTE)
+    parser.add_argument("--poll", type=float, default=SCHEDULER_POLL_SECONDS)
+    parser.add_argument("--no-selenium", action="store_true", help="Disable the Selenium fallback")
+    args = parser.parse_args()
+
+    from scraper import PriceScraper
+
+    create_tables()
+    scheduler = RefreshScheduler(
+        scraper=PriceScraper(use_selenium_fallback=not args.no_selenium),
+        scrapes_per_minute=args.per_minute,
+        poll_seconds=args.poll,
+    )
+    if args.once:
+        print(json.dumps(asyncio.run(scheduler.tick()), indent=2))
+    else:
+        asyncio.run(scheduler.run_forever())
+
+if __name__ == "__main__":
+    main()
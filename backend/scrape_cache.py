@@ -0,0 +1,295 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime
+
+from canonical import canonical_key
+
+# Seconds a successful scrape is served to repeated requests for the same URL
+SCRAPE_CACHE_TTL = float(os.environ.get("SCRAPE_CACHE_TTL", 30))
+SCRAPE_CACHE_SIZE = int(os.environ.get("SCRAPE_CACHE_SIZE", 5000))
+
+# "memory" keeps results per process, "sqlite" shares them (and in-flight
+# scrapes) between uvicorn workers through a file next to the database
+SCRAPE_CACHE_BACKEND = os.environ.get("SCRAPE_CACHE_BACKEND", "memory")
+SCRAPE_CACHE_PATH = os.environ.get("SCRAPE_CACHE_PATH", "./scrape_cache.db")
+
+# How long another worker may hold a URL before its scrape is presumed lost
+SCRAPE_CACHE_LEASE_SECONDS = float(os.environ.get("SCRAPE_CACHE_LEASE_SECONDS", 60))
+LEASE_POLL_SECONDS = 0.05
+
+def recorded_since(last_updated, result):
+    """True when a shared result was already written by the caller that scraped it"""
+    scraped_at = result.get('scraped_at')
+    if not result.get('cached') or scraped_at is None or last_updated is None:
+        return False
+    return last_updated >= datetime.utcfromtimestamp(scraped_at)
+
+class MemoryBackend:
+    """Per-process LRU of scrape results with expiry times"""
+
+    shared = False
+
+    def __init__(self, max_entries=SCRAPE_CACHE_SIZE):
+        self.max_entries = max(1, max_entries)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            result, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                self.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            return result
+
+    def put(self, key, result, ttl):
+        with self._lock:
+            self._entries[key] = (result, time.time() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def acquire(self, key, owner, lease_seconds):
+        return True
+
+    def release(self, key, owner):
+        pass
+
+    def size(self):
+        with self._lock:
+            return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class SqliteBackend:
+    """Scrape results and in-flight leases in a SQLite file shared by all workers.
+
+    A worker that wants to scrape a URL first takes a lease row for it; the
+    others wait for the result row instead of fetching the page again.
+    Entries are evicted oldest-first once the table exceeds max_entries,
+    since tracking reads would turn every hit into a write.
+    """
+
+    shared = True
+
+    def __init__(self, path=SCRAPE_CACHE_PATH, max_entries=SCRAPE_CACHE_SIZE):
+        self.path = path
+        self.max_entries = max(1, max_entries)
+        self._local = threading.local()
+        self.evictions = 0
+        self.expirations = 0
+        conn = self.connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS scrape_cache "
+            "(key TEXT PRIMARY KEY, result TEXT NOT NULL, stored_at REAL NOT NULL, expires_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_scrape_cache_stored_at ON scrape_cache (stored_at)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS scrape_leases "
+            "(key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def connection(self):
+        # One connection per thread, in autocommit mode
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self.connection().execute(
+            "SELECT result, expires_at FROM scrape_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[1] <= time.time():
+            self.expirations += 1
+            return None
+        return json.loads(row[0])
+
+    def put(self, key, result, ttl):
+        now = time.time()
+        conn = self.connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO scrape_cache (key, result, stored_at, expires_at) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(result), now, now + ttl)
+        )
+        # Expired rows go first, then the oldest entries over the cap
+        conn.execute("DELETE FROM scrape_cache WHERE expires_at <= ?", (now,))
+        excess = conn.execute("SELECT COUNT(*) FROM scrape_cache").fetchone()[0] - self.max_entries
+        if excess > 0:
+            deleted = conn.execute(
+                "DELETE FROM scrape_cache WHERE key IN "
+                "(SELECT key FROM scrape_cache ORDER BY stored_at LIMIT ?)", (excess,)
+            ).rowcount
+            self.evictions += deleted
+
+    def acquire(self, key, owner, lease_seconds):
+        """Take the lease on a URL unless another live owner holds it"""
+        now = time.time()
+        cursor = self.connection().execute(
+            "INSERT INTO scrape_leases (key, owner, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+            "WHERE scrape_leases.expires_at <= ?",
+            (key, owner, now + lease_seconds, now)
+        )
+        return cursor.rowcount == 1
+
+    def release(self, key, owner):
+        self.connection().execute("DELETE FROM scrape_leases WHERE key = ? AND owner = ?", (key, owner))
+
+    def lease_expired(self, key):
+        row = self.connection().execute(
+            "SELECT expires_at FROM scrape_leases WHERE key = ?", (key,)
+        ).fetchone()
+        return row is None or row[0] <= time.time()
+
+    def size(self):
+        return self.connection().execute(
+            "SELECT COUNT(*) FROM scrape_cache WHERE expires_at > ?", (time.time(),)
+        ).fetchone()[0]
+
+    def clear(self):
+        conn = self.connection()
+        conn.execute("DELETE FROM scrape_cache")
+        conn.execute("DELETE FROM scrape_leases")
+
+def create_backend(kind=SCRAPE_CACHE_BACKEND, max_entries=SCRAPE_CACHE_SIZE):
+    if kind == 'sqlite':
+        return SqliteBackend(max_entries=max_entries)
+    if kind != 'memory':
+        raise ValueError(f"Unknown scrape cache backend: {kind}")
+    return MemoryBackend(max_entries=max_entries)
+
+class ScrapeCache:
+    """Single-flight scrapes with a short TTL cache of their results.
+
+    Concurrent callers asking for the same product (by canonical_key) share one
+    scrape: the first becomes the owner and the rest wait for its result.
+    Successful results are then served for `ttl` seconds. Served copies are
+    marked `cached` and carry the owner's `scraped_at`, so callers can tell
+    that the owner already wrote the price (see recorded_since). Failures
+    are shared with callers already waiting but never cached.
+
+    With a shared backend the same holds across processes: one worker
+    scrapes while the others poll for the result, until the owner's lease
+    runs out. A ttl of 0 keeps in-process coalescing and disables the rest.
+    """
+
+    def __init__(self, backend=None, ttl=SCRAPE_CACHE_TTL, lease_seconds=SCRAPE_CACHE_LEASE_SECONDS):
+        self.backend = backend or create_backend()
+        self.ttl = ttl
+        self.lease_seconds = lease_seconds
+        self.owner_id = uuid.uuid4().hex
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'remote_waits': 0,
+        }
+
+    def count(self, outcome):
+        with self._lock:
+            self._stats[outcome] += 1
+
+    def served(self, result):
+        return {**result, 'cached': True}
+
+    def get_or_scrape(self, url, scrape):
+        """Return scrape(url), reusing a cached or in-flight result for the same URL"""
+        key = canonical_key(url)
+        if self.ttl > 0:
+            cached = self.backend.get(key)
+            if cached is not None:
+                self.count('hits')
+                return self.served(cached)
+
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+            else:
+                self._stats['coalesced'] += 1
+
+        if not owner:
+            return self.served(future.result())
+
+        try:
+            result = self.scrape_once(key, url, scrape)
+            future.set_result(result)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+        return dict(result)
+
+    def scrape_once(self, key, url, scrape):
+        shared = self.backend.shared and self.ttl > 0
+        if shared and not self.backend.acquire(key, self.owner_id, self.lease_seconds):
+            # Another worker is scraping this URL; wait for its result
+            result = self.wait_for_result(key)
+            if result is not None:
+                self.count('remote_waits')
+                return {**result, 'cached': True}
+
+        self.count('misses')
+        try:
+            result = {**scrape(url), 'scraped_at': time.time()}
+            if self.ttl > 0 and result.get('success'):
+                self.backend.put(key, result, self.ttl)
+            return result
+        finally:
+            if shared:
+                self.backend.release(key, self.owner_id)
+
+    def wait_for_result(self, key):
+        while True:
+            result = self.backend.get(key)
+            if result is not None:
+                return result
+            if self.backend.lease_expired(key):
+                # The owner is done (it stores before releasing) or died
+                return self.backend.get(key)
+            time.sleep(LEASE_POLL_SECONDS)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses'] + stats['coalesced'] + stats['remote_waits']
+        return {
+            'backend': 'sqlite' if self.backend.shared else 'memory',
+            'ttl_seconds': self.ttl,
+            'size': self.backend.size(),
+            'max_entries': self.backend.max_entries,
+            **stats,
+            'evictions': self.backend.evictions,
+            'expirations': self.backend.expirations,
+            'hit_rate': round((lookups - stats['misses']) / lookups, 4) if lookups else 0.0,
+        }
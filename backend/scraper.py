@@ -1,22 +1,56 @@
-import requests
-from bs4 import BeautifulSoup
 import re
 from urllib.parse import urlparse
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+import asyncio
+import os
 import time
 import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from browser_pool import BrowserPool
+from domain_guard import DomainGuard
+from transport import create_transport
+from page_cache import PageCache, CachedPage, content_digest
+from scrape_cache import ScrapeCache
+from extraction import HtmlExtractor
+from structured_data import extract_structured, ExtractionStats
+from metrics import (
+    FETCH_SECONDS, PARSE_SECONDS, SELENIUM_SECONDS, SCRAPES, FALLBACKS, DOM_EXTRACTIONS, SELECTOR_HITS
+)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Retailers with dedicated scrapers, matched against the URL's domain
+SUPPORTED_SITES = ('amazon', 'ebay', 'walmart')
+
+# Threads available to scrapes started from async code
+SCRAPE_WORKERS = int(os.environ.get("SCRAPE_WORKERS", 8))
+
+# Seconds to wait for a retailer to respond
+SCRAPE_TIMEOUT = float(os.environ.get("SCRAPE_TIMEOUT", 10))
+
 class PriceScraper:
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
+    def __init__(self, use_selenium_fallback=True, max_workers=SCRAPE_WORKERS, browser_pool=None, page_cache=None, extractor=None, use_structured_data=True, guard=None, timeout=SCRAPE_TIMEOUT, transport=None, result_cache=None):
+        self.use_selenium_fallback = use_selenium_fallback
+        self.use_structured_data = use_structured_data
+        # Which path (structured data, DOM, cache, Selenium) served each scrape
+        self.extraction_stats = ExtractionStats()
+        # HTML parsing backend for the site-specific scrapers
+        self.extractor = extractor or HtmlExtractor()
+        # Validators and last results per URL for conditional fetching
+        self.page_cache = page_cache or PageCache()
+        # Single-flight scrapes plus a short TTL cache of their results
+        self.result_cache = result_cache or ScrapeCache()
+        # Per-domain rate limits, retries and circuit breakers for page fetches
+        self.guard = guard or DomainGuard()
+        self.timeout = timeout
+        # Warm browsers for the Selenium fallback, started on first use
+        self.browser_pool = browser_pool or BrowserPool()
+        # Bounded pool so async callers never run the blocking scrape on the event loop
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scraper")
+        # Pooled keep-alive HTTP client shared by all scrape threads
+        self.transport = transport or create_transport()
+        self.transport.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         })
     
@@ -25,6 +59,14 @@ class PriceScraper:
         parsed_url = urlparse(url)
         return parsed_url.netloc.lower()
     
+    def get_site(self, url):
+        """Map a URL to its retailer key, falling back to the raw domain"""
+        domain = self.get_domain(url)
+        for site in SUPPORTED_SITES:
+            if site in domain:
+                return site
+        return domain
+    
     def clean_price(self, price_text):
         """Clean and extract numeric price from text"""
         if not price_text:
@@ -39,12 +81,102 @@ class PriceScraper:
         except ValueError:
             return None
     
+    def fetch_page(self, url):
+        """Fetch a page, revalidating it against the page cache.
+        
+        Returns (content, entry). content is None when the server answered
+        304 Not Modified or the relevant page content hashes the same as last
+        time; entry.result then holds the previous scrape result.
+        """
+        cached = self.page_cache.get(url)
+        headers = cached.conditional_headers() if cached else {}
+        site = self.get_site(url)
+        with FETCH_SECONDS.time(site=site):
+            response = self.guard.fetch(
+                site,
+                lambda: self.transport.get(url, timeout=self.timeout, headers=headers)
+            )
+        
+        if cached and response.status_code == 304:
+            self.page_cache.record('not_modified')
+            return None, cached
+        
+        response.raise_for_status()
+        entry = CachedPage(
+            etag=response.headers.get('ETag'),
+            last_modified=response.headers.get('Last-Modified'),
+            digest=content_digest(response.content)
+        )
+        
+        if cached and cached.digest == entry.digest:
+            entry.result = cached.result
+            self.page_cache.put(url, entry)
+            self.page_cache.record('unchanged_content')
+            return None, entry
+        
+        self.page_cache.record('misses')
+        return response.content, entry
+    
+    def remember_result(self, url, entry, result):
+        """Cache a complete scrape result so unchanged pages can skip parsing"""
+        if result['name'] and result['price']:
+            entry.result = {'name': result['name'], 'price': result['price']}
+            self.page_cache.put(url, entry)
+    
+    def unchanged_result(self, entry):
+        """Result for a page that hasn't changed since it was last scraped"""
+        return {'name': entry.result['name'], 'price': entry.result['price'], 'success': True, 'unchanged': True, 'source': 'cache'}
+    
+    def structured_result(self, content, site):
+        """Result from JSON-LD/meta price data, or None if it's incomplete"""
+        if not self.use_structured_data:
+            return None
+        with PARSE_SECONDS.time(site=site, path='structured'):
+            values = extract_structured(content, self.clean_price)
+        if not values['name'] or not values['price']:
+            return None
+        return {
+            'name': values['name'],
+            'price': values['price'],
+            'currency': values['currency'],
+            'success': True,
+            'source': 'structured'
+        }
+    
+    def extract_product(self, content, name_selectors, price_selectors, site):
+        """Pull name and price from page content using ordered selector lists"""
+        matched = {}
+        with PARSE_SECONDS.time(site=site, path='dom'):
+            values = self.extractor.extract(
+                content,
+                {'name': name_selectors, 'price': price_selectors},
+                converters={'price': self.clean_price},
+                matched=matched
+            )
+        # Hit rate of a selector = its hits / the extractions of its field
+        for field in ('name', 'price'):
+            DOM_EXTRACTIONS.inc(site=site, field=field)
+            if field in matched:
+                SELECTOR_HITS.inc(site=site, field=field, selector=matched[field])
+        return {
+            'name': values['name'],
+            'price': values['price'],
+            'success': True,
+            'source': 'dom'
+        }
+    
     def scrape_amazon(self, url):
         """Scrape Amazon product page"""
         try:
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, 'html.parser')
+            content, entry = self.fetch_page(url)
+            if content is None:
+                return self.unchanged_result(entry)
+            
+            # Embedded structured data avoids parsing the page at all
+            result = self.structured_result(content, 'amazon')
+            if result:
+                self.remember_result(url, entry, result)
+                return result
             
             # Product name
             name_selectors = [
@@ -54,13 +186,6 @@ class PriceScraper:
                 'h1[data-automation-id="product-title"]'
             ]
             
-            name = None
-            for selector in name_selectors:
-                element = soup.select_one(selector)
-                if element:
-                    name = element.get_text(strip=True)
-                    break
-            
             # Price
             price_selectors = [
                 '.a-price-whole',
@@ -71,20 +196,9 @@ class PriceScraper:
                 '[data-automation-id="product-price"]'
             ]
             
-            price = None
-            for selector in price_selectors:
-                element = soup.select_one(selector)
-                if element:
-                    price_text = element.get_text(strip=True)
-                    price = self.clean_price(price_text)
-                    if price:
-                        break
-            
-            return {
-                'name': name,
-                'price': price,
-                'success': True
-            }
+            result = self.extract_product(content, name_selectors, price_selectors, 'amazon')
+            self.remember_result(url, entry, result)
+            return result
             
         except Exception as e:
             logger.error(f"Error scraping Amazon: {e}")
@@ -93,9 +207,15 @@ class PriceScraper:
     def scrape_ebay(self, url):
         """Scrape eBay product page"""
         try:
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, 'html.parser')
+            content, entry = self.fetch_page(url)
+            if content is None:
+                return self.unchanged_result(entry)
+            
+            # Embedded structured data avoids parsing the page at all
+            result = self.structured_result(content, 'ebay')
+            if result:
+                self.remember_result(url, entry, result)
+                return result
             
             # Product name
             name_selectors = [
@@ -105,13 +225,6 @@ class PriceScraper:
                 '.u-flL.condText'
             ]
             
-            name = None
-            for selector in name_selectors:
-                element = soup.select_one(selector)
-                if element:
-                    name = element.get_text(strip=True)
-                    break
-            
             # Price
             price_selectors = [
                 '.notranslate',
@@ -120,20 +233,9 @@ class PriceScraper:
                 '[data-testid="x-price-primary"]'
             ]
             
-            price = None
-            for selector in price_selectors:
-                element = soup.select_one(selector)
-                if element:
-                    price_text = element.get_text(strip=True)
-                    price = self.clean_price(price_text)
-                    if price:
-                        break
-            
-            return {
-                'name': name,
-                'price': price,
-                'success': True
-            }
+            result = self.extract_product(content, name_selectors, price_selectors, 'ebay')
+            self.remember_result(url, entry, result)
+            return result
             
         except Exception as e:
             logger.error(f"Error scraping eBay: {e}")
@@ -142,9 +244,15 @@ class PriceScraper:
     def scrape_walmart(self, url):
         """Scrape Walmart product page"""
         try:
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, 'html.parser')
+            content, entry = self.fetch_page(url)
+            if content is None:
+                return self.unchanged_result(entry)
+            
+            # Embedded structured data avoids parsing the page at all
+            result = self.structured_result(content, 'walmart')
+            if result:
+                self.remember_result(url, entry, result)
+                return result
             
             # Product name
             name_selectors = [
@@ -154,13 +262,6 @@ class PriceScraper:
                 'h1[data-testid="product-title"]'
             ]
             
-            name = None
-            for selector in name_selectors:
-                element = soup.select_one(selector)
-                if element:
-                    name = element.get_text(strip=True)
-                    break
-            
             # Price
             price_selectors = [
                 '[data-automation-id="product-price"]',
@@ -169,110 +270,137 @@ class PriceScraper:
                 '[data-testid="price-current"]'
             ]
             
-            price = None
-            for selector in price_selectors:
-                element = soup.select_one(selector)
-                if element:
-                    price_text = element.get_text(strip=True)
-                    price = self.clean_price(price_text)
-                    if price:
-                        break
-            
-            return {
-                'name': name,
-                'price': price,
-                'success': True
-            }
+            result = self.extract_product(content, name_selectors, price_selectors, 'walmart')
+            self.remember_result(url, entry, result)
+            return result
             
         except Exception as e:
             logger.error(f"Error scraping Walmart: {e}")
             return {'name': None, 'price': None, 'success': False, 'error': str(e)}
     
-    def scrape_with_selenium(self, url):
-        """Fallback scraping method using Selenium for dynamic content"""
+    def scrape_generic(self, url):
+        """Scrape a page from an unsupported site using embedded structured data"""
         try:
-            chrome_options = Options()
-            chrome_options.add_argument("--headless")
-            chrome_options.add_argument("--no-sandbox")
-            chrome_options.add_argument("--disable-dev-shm-usage")
-            chrome_options.add_argument("--disable-gpu")
-            chrome_options.add_argument("--window-size=1920,1080")
-            
-            driver = webdriver.Chrome(options=chrome_options)
-            driver.get(url)
-            
-            # Wait for page to load
-            WebDriverWait(driver, 10).until(
-                EC.presence_of_element_located((By.TAG_NAME, "body"))
-            )
-            
-            # Try to find product name and price
-            name = None
-            price = None
-            
-            # Common selectors for product name
-            name_selectors = [
-                "h1", "[data-testid*='title']", ".product-title", "#productTitle"
-            ]
+            content, entry = self.fetch_page(url)
+            if content is None:
+                return self.unchanged_result(entry)
             
-            for selector in name_selectors:
-                try:
-                    element = driver.find_element(By.CSS_SELECTOR, selector)
-                    if element and element.text.strip():
-                        name = element.text.strip()
-                        break
-                except:
-                    continue
-            
-            # Common selectors for price
-            price_selectors = [
-                "[data-testid*='price']", ".price", "[class*='price']", ".cost"
-            ]
-            
-            for selector in price_selectors:
-                try:
-                    element = driver.find_element(By.CSS_SELECTOR, selector)
-                    if element and element.text.strip():
-                        price_text = element.text.strip()
-                        price = self.clean_price(price_text)
-                        if price:
-                            break
-                except:
-                    continue
+            result = self.structured_result(content, self.get_site(url))
+            if result:
+                self.remember_result(url, entry, result)
+                return result
+            return {'name': None, 'price': None, 'success': False, 'error': "No structured product data found"}
             
-            driver.quit()
-            
-            return {
-                'name': name,
-                'price': price,
-                'success': True
-            }
+        except Exception as e:
+            logger.error(f"Error scraping {self.get_domain(url)}: {e}")
+            return {'name': None, 'price': None, 'success': False, 'error': str(e)}
+    
+    def scrape_with_selenium(self, url):
+        """Fallback scraping method using Selenium for dynamic content"""
+        # Selenium is imported on first use (see browser_pool.create_chrome_driver)
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
+        
+        try:
+            with SELENIUM_SECONDS.time(site=self.get_site(url)), self.browser_pool.driver() as driver:
+                driver.get(url)
+                
+                # Wait for page to load
+                WebDriverWait(driver, 10).until(
+                    EC.presence_of_element_located((By.TAG_NAME, "body"))
+                )
+                
+                return self.extract_with_driver(driver)
             
         except Exception as e:
             logger.error(f"Error with Selenium scraping: {e}")
             return {'name': None, 'price': None, 'success': False, 'error': str(e)}
     
+    def extract_with_driver(self, driver):
+        """Read product name and price from the page loaded in a driver"""
+        from selenium.webdriver.common.by import By
+        
+        name = None
+        price = None
+        
+        # Common selectors for product name
+        name_selectors = [
+            "h1", "[data-testid*='title']", ".product-title", "#productTitle"
+        ]
+        
+        for selector in name_selectors:
+            try:
+                element = driver.find_element(By.CSS_SELECTOR, selector)
+                if element and element.text.strip():
+                    name = element.text.strip()
+                    break
+            except:
+                continue
+        
+        # Common selectors for price
+        price_selectors = [
+            "[data-testid*='price']", ".price", "[class*='price']", ".cost"
+        ]
+        
+        for selector in price_selectors:
+            try:
+                element = driver.find_element(By.CSS_SELECTOR, selector)
+                if element and element.text.strip():
+                    price_text = element.text.strip()
+                    price = self.clean_price(price_text)
+                    if price:
+                        break
+            except:
+                continue
+        
+        return {
+            'name': name,
+            'price': price,
+            'success': True,
+            'source': 'selenium'
+        }
+    
     def scrape_product(self, url):
-        """Main method to scrape product information"""
-        domain = self.get_domain(url)
+        """Main method to scrape product information.
+
+        Concurrent and repeated requests for the same URL share one scrape
+        through the result cache; their copies are marked `cached`.
+        """
+        return self.result_cache.get_or_scrape(url, self.scrape_fresh)
+
+    def scrape_fresh(self, url):
+        """Scrape a product page, bypassing the result cache"""
+        site = self.get_site(url)
         
         # Try specific scraper first
-        if 'amazon' in domain:
+        if site == 'amazon':
             result = self.scrape_amazon(url)
-        elif 'ebay' in domain:
+        elif site == 'ebay':
             result = self.scrape_ebay(url)
-        elif 'walmart' in domain:
+        elif site == 'walmart':
             result = self.scrape_walmart(url)
         else:
             # Generic scraping attempt
-            result = self.scrape_with_selenium(url)
+            result = self.scrape_generic(url)
         
-        # If specific scraper failed, try Selenium as fallback
-        if not result['success'] or not result['name'] or not result['price']:
+        # If specific scraper failed, try Selenium as fallback (not while the site is failing fast)
+        incomplete = not result['success'] or not result['name'] or not result['price']
+        if self.use_selenium_fallback and incomplete and self.guard.is_open(site):
+            logger.info(f"Skipping Selenium fallback, circuit open for {site}")
+        elif self.use_selenium_fallback and incomplete:
             logger.info("Trying Selenium fallback...")
+            FALLBACKS.inc(site=site)
             selenium_result = self.scrape_with_selenium(url)
             if selenium_result['success'] and selenium_result['name'] and selenium_result['price']:
                 result = selenium_result
         
+        complete = result['success'] and result['name'] and result['price']
+        self.extraction_stats.record(site, result.get('source') if complete else 'failed')
+        SCRAPES.inc(site=site, outcome='success' if complete else 'failure')
         return result
-
+    
+    async def scrape_product_async(self, url):
+        """Run scrape_product on the scraper's thread pool without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.scrape_product, url)
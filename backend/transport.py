@@ -0,0 +1,297 @@
+import importlib.util
+import ipaddress
+import logging
+import os
+import socket
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# HTTP/2 is optional (requests handles HTTP/1.1); httpx is imported only by
+# the HTTP/2 transport, as it takes longer to load than the rest of the scraper
+HAVE_HTTPX = all(importlib.util.find_spec(name) is not None for name in ('httpx', 'h2'))
+
+logger = logging.getLogger(__name__)
+
+# Connection pools: how many hosts keep a pool, and connections kept per host
+HTTP_POOL_CONNECTIONS = int(os.environ.get("HTTP_POOL_CONNECTIONS", 32))
+HTTP_POOL_MAXSIZE = int(os.environ.get("HTTP_POOL_MAXSIZE", 32))
+# Wait for a free connection instead of opening one that is thrown away afterwards
+HTTP_POOL_BLOCK = os.environ.get("HTTP_POOL_BLOCK", "1") == "1"
+# Multiplex requests over HTTP/2 connections (needs `pip install httpx[http2]`)
+HTTP2_ENABLED = os.environ.get("HTTP2_ENABLED", "0") == "1"
+# Seconds a resolved address is reused (0 disables the DNS cache)
+DNS_CACHE_TTL = float(os.environ.get("DNS_CACHE_TTL", 300))
+
+class DnsCache:
+    """Thread-safe TTL cache of host -> IP address lookups"""
+
+    def __init__(self, ttl=DNS_CACHE_TTL):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def resolve(self, host, port):
+        """Cached address for `host`, or None to let the connection resolve it"""
+        if self.ttl <= 0 or not host:
+            return None
+        try:
+            ipaddress.ip_address(host.strip('[]'))
+            return None
+        except ValueError:
+            pass
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(host)
+            if entry and entry[1] > now:
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        try:
+            info = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except OSError:
+            return None
+        address = info[0][4][0]
+        with self._lock:
+            self._entries[host] = (address, now + self.ttl)
+        return address
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+class ConnectionStats:
+    """Per-host request, new-connection and discarded-connection counts"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = defaultdict(lambda: {'requests': 0, 'opened': 0, 'discarded': 0})
+
+    def record(self, host, key):
+        with self._lock:
+            self._counts[host][key] += 1
+
+    def report(self):
+        with self._lock:
+            counts = {host: dict(values) for host, values in self._counts.items()}
+        for values in counts.values():
+            requests_made = values['requests']
+            reused = max(0, requests_made - values['opened'])
+            values['reuse_rate'] = round(reused / requests_made, 4) if requests_made else 0.0
+        return counts
+
+class CachedDnsMixin:
+    """Connect to the cached address while keeping the hostname for Host and SNI"""
+
+    dns_cache = None
+
+    def _new_conn(self):
+        host = self._dns_host
+        address = self.dns_cache.resolve(host, self.port) if self.dns_cache else None
+        if address is None:
+            return super()._new_conn()
+        # Only the socket connect uses _dns_host; restore it before TLS and headers
+        self._dns_host = address
+        try:
+            return super()._new_conn()
+        finally:
+            self._dns_host = host
+
+class TrackedPoolMixin:
+    """Count requests a pool serves, connections it opens and the ones it has to throw away.
+
+    Counts are keyed by the host the pool connects to (the proxy, if any).
+    """
+
+    stats = None
+
+    def urlopen(self, method, url, *args, **kwargs):
+        self.stats.record(self.host, 'requests')
+        return super().urlopen(method, url, *args, **kwargs)
+
+    def _new_conn(self):
+        self.stats.record(self.host, 'opened')
+        return super()._new_conn()
+
+    def _put_conn(self, conn):
+        if conn is not None and self.pool is not None and self.pool.full():
+            self.stats.record(self.host, 'discarded')
+        super()._put_conn(conn)
+
+def tracked_pool_classes(stats, dns_cache):
+    def pool_class(pool_base, connection_base):
+        connection_cls = type(f"Cached{connection_base.__name__}", (CachedDnsMixin, connection_base), {
+            'dns_cache': dns_cache,
+        })
+        return type(f"Tracked{pool_base.__name__}", (TrackedPoolMixin, pool_base), {
+            'ConnectionCls': connection_cls,
+            'stats': stats,
+        })
+    return {
+        'http': pool_class(HTTPConnectionPool, HTTPConnection),
+        'https': pool_class(HTTPSConnectionPool, HTTPSConnection),
+    }
+
+class TrackingAdapter(HTTPAdapter):
+    """HTTPAdapter whose pools (direct and proxied) record reuse stats and use the DNS cache"""
+
+    def __init__(self, stats, dns_cache, **kwargs):
+        self.stats = stats
+        self.pool_classes = tracked_pool_classes(stats, dns_cache)
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = self.pool_classes
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+        manager.pool_classes_by_scheme = self.pool_classes
+        return manager
+
+class RequestsTransport:
+    """HTTP/1.1 keep-alive transport on a shared requests.Session.
+
+    The session is safe to share between scrape threads: each host gets a
+    pool of up to `pool_maxsize` connections and, with `pool_block`, threads
+    wait for a free connection rather than opening extra ones.
+    """
+
+    http2 = False
+
+    def __init__(self, pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE,
+                 pool_block=HTTP_POOL_BLOCK, dns_cache=None):
+        self.connection_stats = ConnectionStats()
+        self.dns_cache = dns_cache or DnsCache()
+        self.pool_maxsize = pool_maxsize
+        self.session = requests.Session()
+        adapter = TrackingAdapter(
+            self.connection_stats, self.dns_cache,
+            pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=pool_block
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    @property
+    def headers(self):
+        return self.session.headers
+
+    def get(self, url, timeout=None, headers=None):
+        return self.session.get(url, timeout=timeout, headers=headers)
+
+    def set_proxy(self, proxy_url):
+        """Send plain-HTTP traffic through `proxy_url`, ignoring proxy environment variables"""
+        self.session.proxies.update({'http': proxy_url})
+        self.session.trust_env = False
+
+    def stats(self):
+        return {
+            'http2': False,
+            'pool_maxsize': self.pool_maxsize,
+            'hosts': self.connection_stats.report(),
+            'dns_cache': self.dns_cache.stats(),
+        }
+
+    def close(self):
+        self.session.close()
+
+class HttpxResponse:
+    """The parts of requests.Response the scraper uses, on top of an httpx response"""
+
+    def __init__(self, response):
+        self._response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.content = response.content
+        self.http_version = response.http_version
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error for url: {self._response.url}")
+
+class Http2Transport:
+    """httpx client multiplexing requests to each host over HTTP/2 (HTTP/1.1 where the server lacks it).
+
+    Transport errors are re-raised as their requests equivalents, so the
+    retry and breaker logic treats both transports the same way. httpx
+    resolves and pools connections itself, so only requests per host and
+    the negotiated protocol versions are counted.
+    """
+
+    http2 = True
+
+    def __init__(self, pool_maxsize=HTTP_POOL_MAXSIZE):
+        self.pool_maxsize = pool_maxsize
+        self.requests = defaultdict(int)
+        self.versions = defaultdict(int)
+        self._headers = {}
+        self._proxy = None
+        self.client = self._client()
+
+    def _client(self):
+        import httpx
+
+        return httpx.Client(
+            http2=True,
+            proxies={'http://': self._proxy} if self._proxy else None,
+            trust_env=self._proxy is None,
+            headers=self._headers,
+            limits=httpx.Limits(max_connections=self.pool_maxsize, max_keepalive_connections=self.pool_maxsize),
+        )
+
+    @property
+    def headers(self):
+        return self.client.headers
+
+    def get(self, url, timeout=None, headers=None):
+        import httpx
+
+        self.requests[urlparse(url).netloc.lower()] += 1
+        try:
+            response = self.client.get(url, timeout=timeout, headers=headers)
+        except httpx.TimeoutException as e:
+            raise requests.Timeout(str(e))
+        except httpx.TransportError as e:
+            raise requests.ConnectionError(str(e))
+        self.versions[response.http_version] += 1
+        return HttpxResponse(response)
+
+    def set_proxy(self, proxy_url):
+        self._headers = dict(self.client.headers)
+        self._proxy = proxy_url
+        self.client.close()
+        self.client = self._client()
+
+    def stats(self):
+        return {
+            'http2': True,
+            'pool_maxsize': self.pool_maxsize,
+            'hosts': {host: {'requests': count} for host, count in self.requests.items()},
+            'http_versions': dict(self.versions),
+        }
+
+    def close(self):
+        self.client.close()
+
+def create_transport(http2=HTTP2_ENABLED, **kwargs):
+    """HTTP/2 transport if enabled and installed, otherwise the requests transport"""
+    if http2:
+        if HAVE_HTTPX:
+            return Http2Transport(pool_maxsize=kwargs.get('pool_maxsize', HTTP_POOL_MAXSIZE))
+        logger.warning("HTTP2_ENABLED is set but httpx[http2] is not installed, using HTTP/1.1")
+    return RequestsTransport(**kwargs)
@@ -0,0 +1,222 @@
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError
+
+from canonical import canonical_key
+from database import SessionLocal, create_tables, engine, async_engine, Product
+from history import record_price, extend_price, HISTORY_CHANGE_ONLY
+from job_queue import create_queue, JOB_QUEUE_BACKEND
+from metrics import DB_WRITE_SECONDS
+from scheduler import RefreshScheduler
+from scrape_cache import recorded_since
+from scraper import PriceScraper
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Scrape jobs a worker process runs at once
+WORKER_CONCURRENCY = int(os.environ.get("WORKER_CONCURRENCY", 8))
+# Seconds to wait before asking an empty queue again
+WORKER_POLL_SECONDS = float(os.environ.get("WORKER_POLL_SECONDS", 1.0))
+
+class ScrapeWorker:
+    """Pull scrape jobs from the queue, scrape them and write the results.
+
+    Up to `concurrency` jobs run at once on a thread pool. Whenever a slot
+    frees up the worker claims more, so a slow page never holds back the
+    rest of a batch. Leases of jobs still running after half the lease time
+    are renewed. A scrape that fails is handed back to the queue for a
+    retry; jobs that can never succeed (the product was deleted) go
+    straight to the dead-letter list.
+    """
+
+    def __init__(self, queue=None, scraper=None, session_factory=SessionLocal,
+                 concurrency=WORKER_CONCURRENCY, poll_seconds=WORKER_POLL_SECONDS,
+                 worker_id=None, scheduler=None):
+        self.queue = queue or create_queue(session_factory=session_factory)
+        self.scraper = scraper or PriceScraper()
+        self.session_factory = session_factory
+        self.concurrency = max(1, concurrency)
+        self.poll_seconds = poll_seconds
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        # Adapts refresh intervals from results, whoever enqueued the job
+        self.scheduler = scheduler or RefreshScheduler(scraper=self.scraper, session_factory=session_factory)
+        self.processed = 0
+        self.failed = 0
+
+    def apply_refresh(self, job, result):
+        """Write a refreshed price; returns an error if the job can't succeed"""
+        db = self.session_factory()
+        try:
+            product = db.query(Product).filter(Product.id == job['product_id']).first()
+            if product is None:
+                return "Product not found"
+            if not result['price'] or recorded_since(product.last_updated, result):
+                return None
+            if not result.get('unchanged'):
+                with DB_WRITE_SECONDS.time(operation='job_refresh'):
+                    product.current_price = result['price']
+                    product.last_updated = datetime.utcnow()
+                    record_price(db, product.id, result['price'], product.last_updated)
+                    db.commit()
+            elif HISTORY_CHANGE_ONLY:
+                # An unchanged page still extends the price's run
+                with DB_WRITE_SECONDS.time(operation='job_refresh'):
+                    product.last_updated = datetime.utcnow()
+                    extend_price(db, product.id, result['price'], product.last_updated)
+                    db.commit()
+            return None
+        finally:
+            db.close()
+
+    def apply_create(self, job, result):
+        """Add the scraped product; returns its id"""
+        db = self.session_factory()
+        try:
+            existing = db.query(Product.id).filter(Product.canonical_key == canonical_key(job['url'])).first()
+            if existing:
+                return existing.id
+            with DB_WRITE_SECONDS.time(operation='job_create'):
+                product = Product(name=result['name'], url=job['url'], current_price=result['price'])
+                db.add(product)
+                db.flush()
+                if product.current_price:
+                    record_price(db, product.id, product.current_price)
+                db.commit()
+            return product.id
+        except IntegrityError:
+            # Created by someone else since the lookup
+            db.rollback()
+            return db.query(Product.id).filter(Product.canonical_key == canonical_key(job['url'])).scalar()
+        finally:
+            db.close()
+
+    def process(self, job):
+        try:
+            result = self.scraper.scrape_product(job['url'])
+        except Exception as e:
+            result = {'name': None, 'price': None, 'success': False, 'error': str(e)}
+
+        if job['kind'] == 'refresh':
+            self.scheduler.reschedule({job['product_id']: result})
+
+        if not result['success'] or (job['kind'] == 'create' and not result['name']):
+            self.failed += 1
+            status = self.queue.fail(job, result.get('error') or 'No product name found')
+            logger.info(f"Job {job['id']} attempt {job['attempts']} failed, now {status}")
+            return
+
+        try:
+            if job['kind'] == 'refresh':
+                error = self.apply_refresh(job, result)
+                if error:
+                    self.queue.fail(job, error, retry=False)
+                    return
+            else:
+                result = {**result, 'product_id': self.apply_create(job, result)}
+        except Exception as e:
+            logger.error(f"Error writing job {job['id']}: {e}")
+            self.queue.fail(job, str(e))
+            return
+
+        self.queue.complete(job, {key: value for key, value in result.items() if key != 'scraped_at'})
+        self.processed += 1
+
+    def run(self, stop=None, max_jobs=None, exit_when_empty=False):
+        """Work until `stop` is set, `max_jobs` are done or (optionally) the queue is empty"""
+        stop = stop or threading.Event()
+        executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="worker")
+        running = {}
+        claimed = 0
+        logger.info(f"Worker {self.worker_id} started ({self.concurrency} concurrent jobs)")
+        try:
+            while not stop.is_set():
+                slots = self.concurrency - len(running)
+                if max_jobs is not None:
+                    slots = min(slots, max_jobs - claimed)
+                jobs = self.queue.claim(self.worker_id, slots) if slots > 0 else []
+                for job in jobs:
+                    running[executor.submit(self.process, job)] = (job, time.monotonic())
+                claimed += len(jobs)
+
+                if not running:
+                    if exit_when_empty or (max_jobs is not None and claimed >= max_jobs):
+                        break
+                    stop.wait(self.poll_seconds)
+                    continue
+
+                done, _ = wait(running, timeout=self.poll_seconds, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job, _ = running.pop(future)
+                    try:
+                        future.result()
+                    except Exception as e:
+                        # The lease runs out and another attempt picks the job up
+                        logger.error(f"Job {job['id']} crashed: {e}")
+
+                # Keep leases of slow scrapes (e.g. Selenium) from running out
+                now = time.monotonic()
+                for future, (job, renewed) in list(running.items()):
+                    if now - renewed > self.queue.lease_seconds / 2:
+                        self.queue.extend(job)
+                        running[future] = (job, now)
+        finally:
+            wait(running)
+            executor.shutdown(wait=True)
+        logger.info(f"Worker {self.worker_id} stopped: {self.processed} done, {self.failed} failed attempts")
+        return {'processed': self.processed, 'failed': self.failed}
+
+def run_worker(concurrency, no_selenium, with_scheduler, exit_when_empty):
+    # A forked worker inherits the parent's pooled connections (create_tables
+    # checked one in); drop them without closing, so it opens its own
+    engine.dispose(close=False)
+    async_engine.sync_engine.dispose(close=False)
+    scraper = PriceScraper(use_selenium_fallback=not no_selenium)
+    scheduler = RefreshScheduler(scraper=scraper) if with_scheduler else None
+    worker = ScrapeWorker(scraper=scraper, concurrency=concurrency, scheduler=scheduler)
+    if with_scheduler:
+        # The scheduler only enqueues; this and every other worker run the jobs
+        scheduler.queue = worker.queue
+        threading.Thread(target=asyncio.run, args=(scheduler.run_forever(),), daemon=True).start()
+    return worker.run(exit_when_empty=exit_when_empty)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run scrape workers against the job queue")
+    parser.add_argument("--processes", type=int, default=1, help="Worker processes to start (e.g. one per core)")
+    parser.add_argument("--concurrency", type=int, default=WORKER_CONCURRENCY, help="Concurrent jobs per process")
+    parser.add_argument("--no-selenium", action="store_true", help="Disable the Selenium fallback")
+    parser.add_argument("--scheduler", action="store_true", help="Also run the refresh scheduler (in one worker only)")
+    parser.add_argument("--exit-when-empty", action="store_true", help="Stop once the queue has no available jobs")
+    args = parser.parse_args()
+
+    if JOB_QUEUE_BACKEND == 'memory':
+        parser.error("JOB_QUEUE_BACKEND=memory is per-process; workers need the database queue")
+
+    create_tables()
+    if args.processes <= 1:
+        run_worker(args.concurrency, args.no_selenium, args.scheduler, args.exit_when_empty)
+        return
+
+    processes = [
+        multiprocessing.Process(
+            target=run_worker,
+            args=(args.concurrency, args.no_selenium, args.scheduler and i == 0, args.exit_when_empty)
+        )
+        for i in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Measure the per-ingest cost of price-drop alert evaluation.
+
+Seeds one product with N hourly observations for each history size, then
+times record_price + commit for new prices with per-product and global
+rules of every kind active. Rules compare against the product_stats
+summary row, so the cost should stay flat as history grows. For contrast,
+the same rules are evaluated the naive way, with aggregate queries over
+price_history on every ingest.
+"""
+
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+# The rules append to os.devnull; file targets must be next to ALERT_FILE_PATH, set before the backend is imported
+os.environ["ALERT_FILE_PATH"] = os.devnull
+
+from common import temp_database, describe
+
+from database import Product, PriceHistory, AlertRule, AlertEvent
+from history import record_price
+
+def seed(engine, session_factory, points, global_rules):
+    with engine.begin() as conn:
+        conn.execute(Product.__table__.insert(), [
+            {"name": "Product", "url": "http://www.amazon.com/dp/B000000001", "current_price": 100.0}
+        ])
+    db = session_factory()
+    product_id = db.query(Product.id).scalar()
+    start = datetime.utcnow() - timedelta(hours=points + 1)
+    price = 100.0
+    rows = []
+    for i in range(points):
+        price = max(50.0, min(150.0, round(price * random.uniform(0.98, 1.02), 2)))
+        rows.append({"product_id": product_id, "price": price, "timestamp": start + timedelta(hours=i)})
+    for offset in range(0, len(rows), 50000):
+        with engine.begin() as conn:
+            conn.execute(PriceHistory.__table__.insert(), rows[offset:offset + 50000])
+
+    db.add_all([
+        AlertRule(product_id=product_id, kind='below_price', threshold=60, sink='file', target=os.devnull),
+        AlertRule(product_id=product_id, kind='drop_percent', threshold=15, sink='file', target=os.devnull),
+        AlertRule(product_id=product_id, kind='all_time_low', sink='file', target=os.devnull),
+    ] + [
+        AlertRule(
+            kind=('below_price', 'drop_percent', 'all_time_low')[i % 3], threshold=(40, 25, None)[i % 3],
+            sink='file', target=os.devnull
+        )
+        for i in range(global_rules)
+    ])
+    db.commit()
+    # The first write builds the stats row from history, once
+    record_price(db, product_id, price, start + timedelta(hours=points))
+    db.commit()
+    db.close()
+    return product_id, start + timedelta(hours=points + 1)
+
+def naive_check(db, product_id, price):
+    # What evaluation costs without the summary row
+    db.query(func.min(PriceHistory.price), func.max(PriceHistory.price)).filter(
+        PriceHistory.product_id == product_id
+    ).one()
+    db.query(func.max(PriceHistory.price)).filter(
+        PriceHistory.product_id == product_id,
+        PriceHistory.timestamp >= datetime.utcnow() - timedelta(days=30)
+    ).scalar()
+
+def measure(session_factory, product_id, first_at, ingests, naive):
+    db = session_factory()
+    samples = []
+    price = 100.0
+    try:
+        for i in range(ingests):
+            price = max(40.0, min(160.0, round(price * random.uniform(0.95, 1.05), 2)))
+            started = time.perf_counter()
+            if naive:
+                naive_check(db, product_id, price)
+                db.add(PriceHistory(product_id=product_id, price=price, timestamp=first_at + timedelta(minutes=i)))
+            else:
+                record_price(db, product_id, price, first_at + timedelta(minutes=i))
+            db.commit()
+            samples.append(time.perf_counter() - started)
+        alerts = db.query(AlertEvent).count()
+    finally:
+        db.close()
+    return describe(samples), alerts
+
+def run(sizes, ingests, global_rules):
+    random.seed(1)
+    print(f"{ingests} ingests per size, {3 + global_rules} rules")
+    print("-" * 78)
+    for points in sizes:
+        engine, session_factory = temp_database()
+        product_id, first_at = seed(engine, session_factory, points, global_rules)
+        stats, alerts = measure(session_factory, product_id, first_at, ingests, naive=False)
+        naive, _ = measure(session_factory, product_id, first_at + timedelta(days=1), ingests, naive=True)
+        print(
+            f"history={points:>8}  incremental p50 {stats['p50_ms']:>6.2f}ms p99 {stats['p99_ms']:>6.2f}ms  "
+            f"naive p50 {naive['p50_ms']:>7.2f}ms  alerts={alerts}"
+        )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="*", default=[1000, 10000, 100000, 1000000])
+    parser.add_argument("--ingests", type=int, default=300)
+    parser.add_argument("--global-rules", type=int, default=20)
+    args = parser.parse_args()
+    run(args.sizes, args.ingests, args.global_rules)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark bulk product import against the local fixture stub.
+
+Compares adding N URLs one POST /products/ call at a time (a uniqueness
+query, a scrape and two commits each) with BulkImporter at a few
+concurrency levels. The URL list includes repeats and already-tracked
+URLs, so the dedupe path is exercised too. Reports total throughput and
+how soon the first NDJSON progress line arrives.
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+from fastapi.testclient import TestClient
+
+from common import temp_database, use_database, release_database
+from stub_server import StubServer, sample_urls
+
+import main
+from bulk_import import BulkImporter
+from database import Product
+from scraper import PriceScraper
+
+def url_list(products, tracked):
+    urls = sample_urls(products)
+    # A few repeats inside the list itself
+    return urls + random.sample(urls, max(1, products // 20)), urls[:tracked]
+
+def seed(session_factory, urls):
+    db = session_factory()
+    db.add_all([Product(name=f"Product {i}", url=url) for i, url in enumerate(urls)])
+    db.commit()
+    db.close()
+
+def sequential(server, urls, tracked):
+    engine, session_factory = temp_database()
+    seed(session_factory, tracked)
+
+    use_database(main.app, engine)
+    main.scraper = server.attach(PriceScraper(use_selenium_fallback=False))
+    client = TestClient(main.app)
+    created = 0
+    started = time.perf_counter()
+    for url in urls:
+        created += client.post("/products/", json={"url": url}).status_code == 200
+    elapsed = time.perf_counter() - started
+    print(f"{'sequential POST':<22} {len(urls) / elapsed:>8.1f} urls/s  {elapsed:>7.2f}s  created={created}")
+    release_database(main.app)
+
+async def consume(importer, urls):
+    started = time.perf_counter()
+    first_event = None
+    async for event in importer.import_urls(urls):
+        if first_event is None:
+            first_event = time.perf_counter() - started
+        summary = event.get('summary')
+    return summary, first_event
+
+def bulk(server, urls, tracked, concurrency):
+    _, session_factory = temp_database()
+    seed(session_factory, tracked)
+    importer = BulkImporter(
+        scraper=server.attach(PriceScraper(use_selenium_fallback=False)),
+        session_factory=session_factory,
+        concurrency=concurrency,
+        per_domain_concurrency=max(1, concurrency // 3),
+    )
+    summary, first_event = asyncio.run(consume(importer, urls))
+    print(
+        f"bulk concurrency={concurrency:<5} {summary['urls_per_second']:>8.1f} urls/s  "
+        f"{summary['elapsed_seconds']:>7.2f}s  created={summary['created']} "
+        f"duplicates={summary['duplicates']} failed={summary['failed']}  "
+        f"first line after {first_event * 1000:.1f}ms"
+    )
+
+def run(products, tracked, latency, levels):
+    server = StubServer(latency=latency).start()
+    try:
+        urls, already = url_list(products, tracked)
+        print(f"Importing {len(urls)} URLs ({len(already)} already tracked), stub latency {latency * 1000:.0f}ms")
+        print("-" * 50)
+        sequential(server, urls, already)
+        for concurrency in levels:
+            bulk(server, urls, already, concurrency)
+    finally:
+        server.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--products", type=int, default=300)
+    parser.add_argument("--tracked", type=int, default=30, help="URLs that already exist in the database")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--levels", type=int, nargs="*", default=[1, 12, 48])
+    args = parser.parse_args()
+    run(args.products, args.tracked, args.latency, args.levels)
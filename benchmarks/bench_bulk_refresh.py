@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Benchmark the bulk refresh engine against the local fixture stub.
+
+Compares a sequential refresh (what POST /products/{id}/update amounts to
+when called once per product) with BulkRefresher at a few concurrency levels.
+"""
+
+import argparse
+import asyncio
+
+from common import temp_database
+from stub_server import StubServer, sample_urls
+
+from bulk_refresh import BulkRefresher
+from database import Product
+from scraper import PriceScraper
+
+def seed(session_factory, urls):
+    db = session_factory()
+    db.add_all([Product(name=f"Product {i}", url=url) for i, url in enumerate(urls)])
+    db.commit()
+    db.close()
+
+def run(products, latency, levels):
+    server = StubServer(latency=latency).start()
+    try:
+        urls = sample_urls(products)
+        print(f"Refreshing {products} products, stub latency {latency * 1000:.0f}ms")
+        print("-" * 50)
+        for concurrency in levels:
+            _, session_factory = temp_database()
+            seed(session_factory, urls)
+            scraper = server.attach(PriceScraper(use_selenium_fallback=False))
+            refresher = BulkRefresher(
+                scraper=scraper,
+                session_factory=session_factory,
+                concurrency=concurrency,
+                per_domain_concurrency=max(1, concurrency // 3),
+            )
+            summary = asyncio.run(refresher.refresh())
+            print(
+                f"concurrency={concurrency:<3} "
+                f"{summary['products_per_second']:>8.1f} products/s  "
+                f"{summary['elapsed_seconds']:>7.2f}s  "
+                f"ok={summary['succeeded']} failed={summary['failed']}"
+            )
+    finally:
+        server.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--products", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--levels", type=int, nargs="*", default=[1, 6, 12, 24, 48])
+    args = parser.parse_args()
+    run(args.products, args.latency, args.levels)
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Benchmark conditional fetching and the page-content cache.
+
+Scrapes the same set of fixture URLs repeatedly through the local stub:
+  - with ETag/Last-Modified support, repeat scrapes get 304 Not Modified
+  - without validators, repeat scrapes are short-circuited by the content hash
+  - after a price change, the changed pages are parsed again
+"""
+
+import argparse
+import time
+
+from stub_server import StubServer, sample_urls, load_fixture
+
+from scraper import PriceScraper
+
+def scrape_all(scraper, urls):
+    started = time.perf_counter()
+    results = [scraper.scrape_product(url) for url in urls]
+    elapsed = time.perf_counter() - started
+    unchanged = sum(1 for result in results if result.get('unchanged'))
+    return elapsed, unchanged
+
+def run_pass(label, server, scraper, urls):
+    before = server.not_modified_count
+    elapsed, unchanged = scrape_all(scraper, urls)
+    print(
+        f"{label:<24} {elapsed * 1000 / len(urls):>7.2f} ms/page  "
+        f"unchanged={unchanged:<4} 304s={server.not_modified_count - before}"
+    )
+
+def run(products, latency):
+    urls = sample_urls(products)
+    for conditional in (True, False):
+        server = StubServer(latency=latency, conditional=conditional).start()
+        scraper = server.attach(PriceScraper(use_selenium_fallback=False))
+        try:
+            print(f"Validators {'on' if conditional else 'off'} ({products} URLs)")
+            print("-" * 50)
+            run_pass("cold", server, scraper, urls)
+            run_pass("warm", server, scraper, urls)
+            server.set_page("amazon", load_fixture("amazon").replace(b"49.99", b"44.99"))
+            run_pass("after amazon change", server, scraper, urls)
+            print(f"cache stats: {scraper.page_cache.stats()}")
+            print()
+        finally:
+            server.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--products", type=int, default=150)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+    run(args.products, args.latency)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Measure GET /products/ latency while product refreshes are in flight.
+
+Runs the FastAPI app in-process on one event loop (like a single uvicorn
+worker), fires several POST /products/{id}/update calls against a slow
+local stub, and samples read latency meanwhile. The "blocking" mode calls
+scrape_product directly on the loop, which is how the handlers used to
+behave, for comparison with the executor-backed path.
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from common import temp_database, use_database, release_database, describe
+from stub_server import StubServer, sample_urls
+
+import main
+from database import Product
+from scraper import PriceScraper
+
+def install_database(products):
+    engine, session_factory = temp_database()
+    db = session_factory()
+    db.add_all([Product(name=f"Product {i}", url=url) for i, url in enumerate(sample_urls(products))])
+    db.commit()
+    db.close()
+
+    use_database(main.app, engine)
+
+async def sample_reads(client, stop, samples):
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await client.get("/products/")
+        response.raise_for_status()
+        samples.append(time.perf_counter() - started)
+        await asyncio.sleep(0.01)
+
+async def measure(scrapes, blocking):
+    scraper = main.scraper
+    if blocking:
+        async def scrape_on_loop(url):
+            return scraper.scrape_product(url)
+        scraper.scrape_product_async = scrape_on_loop
+    else:
+        scraper.__dict__.pop("scrape_product_async", None)
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        idle = []
+        stop = asyncio.Event()
+        reader = asyncio.create_task(sample_reads(client, stop, idle))
+        await asyncio.sleep(0.5)
+        stop.set()
+        await reader
+
+        busy = []
+        stop = asyncio.Event()
+        reader = asyncio.create_task(sample_reads(client, stop, busy))
+        started = time.perf_counter()
+        await asyncio.gather(*(client.post(f"/products/{i}/update") for i in range(1, scrapes + 1)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await reader
+    return idle, busy, elapsed
+
+def run(scrapes, latency):
+    install_database(scrapes)
+    server = StubServer(latency=latency).start()
+    main.scraper = server.attach(PriceScraper(use_selenium_fallback=False))
+    try:
+        print(f"{scrapes} concurrent refreshes, stub latency {latency * 1000:.0f}ms")
+        print("-" * 50)
+        for mode, blocking in (("blocking", True), ("executor", False)):
+            idle, busy, elapsed = asyncio.run(measure(scrapes, blocking))
+            print(f"{mode:<9} idle reads {describe(idle)}")
+            print(f"{'':<9} busy reads {describe(busy)} ({len(busy)} samples)")
+            print(f"{'':<9} refreshes finished in {elapsed:.2f}s")
+    finally:
+        server.stop()
+        release_database(main.app)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--scrapes", type=int, default=6)
+    parser.add_argument("--latency", type=float, default=0.5)
+    args = parser.parse_args()
+    run(args.scrapes, args.latency)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Benchmark streaming export of price history from a multi-million-row database.
+
+Seeds P products with N observations each (2 million rows by default),
+then exports all of it, and a filtered slice, as NDJSON and CSV (and
+Parquet when pyarrow is installed). Each export runs in a fresh process
+so its peak RSS can be compared with the process before the export: it
+should stay flat as the row count grows. SQLite's page cache and mapped
+pages count towards RSS too, up to SQLITE_CACHE_SIZE_KB/SQLITE_MMAP_SIZE;
+set both low to see the export's own memory. For contrast, the old way of
+getting history out (load every row into a list, then serialize it) runs
+on the same rows.
+"""
+
+import argparse
+import json
+import multiprocessing
+import resource
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, text
+
+from common import temp_database
+
+from database import Product, PriceHistory, configure_sqlite
+from export import export_history, history_select, json_value, HISTORY_COLUMNS, HAVE_PYARROW
+
+def seed(engine, products, points):
+    with engine.begin() as conn:
+        conn.execute(Product.__table__.insert(), [
+            {"name": f"Product {i}", "url": f"http://www.amazon.com/dp/B{i:09d}", "current_price": 100.0}
+            for i in range(products)
+        ])
+        product_ids = [row.id for row in conn.execute(text("SELECT id FROM products"))]
+
+    start = datetime.utcnow() - timedelta(hours=points)
+    batch = []
+    for i in range(points):
+        timestamp = start + timedelta(hours=i)
+        batch.extend(
+            {"product_id": product_id, "price": 100.0 + (i * 7 + product_id) % 50, "timestamp": timestamp}
+            for product_id in product_ids
+        )
+        if len(batch) >= 100000 or i == points - 1:
+            with engine.begin() as conn:
+                conn.execute(PriceHistory.__table__.insert(), batch)
+            batch = []
+    return product_ids
+
+def max_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def export_job(database_url, export_format, product_ids, naive, results):
+    engine = configure_sqlite(create_engine(database_url, connect_args={"check_same_thread": False}))
+    # Warm up the connection and imports, so the baseline excludes them
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    baseline = max_rss_mb()
+    started = time.perf_counter()
+    written = 0
+    if naive:
+        with engine.connect() as conn:
+            rows = conn.execute(history_select(product_ids)).all()
+        body = json.dumps([dict(zip(HISTORY_COLUMNS, map(json_value, row))) for row in rows]).encode("utf-8")
+        written = len(body)
+    else:
+        for chunk in export_history(engine, export_format, product_ids):
+            written += len(chunk)
+    results.put((time.perf_counter() - started, written, baseline, max_rss_mb()))
+
+def measure(database_url, export_format, product_ids=None, naive=False):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=export_job, args=(database_url, export_format, product_ids, naive, results))
+    process.start()
+    outcome = results.get()
+    process.join()
+    return outcome
+
+def run(products, points, formats):
+    engine, _ = temp_database()
+    started = time.perf_counter()
+    product_ids = seed(engine, products, points)
+    database_url = str(engine.url)
+    total = products * points
+    print(f"Seeded {total} history rows in {time.perf_counter() - started:.0f}s")
+    print("-" * 84)
+
+    subset = product_ids[:max(1, products // 10)]
+    cases = [(export_format, None, total, False) for export_format in formats]
+    cases.append((formats[0], subset, len(subset) * points, False))
+    cases.append(("json list (old way)", None, total, True))
+    for export_format, ids, rows, naive in cases:
+        elapsed, written, baseline, peak = measure(database_url, export_format, ids, naive)
+        label = f"{export_format}{' (10% of products)' if ids else ''}"
+        print(
+            f"{label:<28} {rows:>9} rows  {rows / elapsed:>9.0f} rows/s  {written / 1e6:>7.1f} MB  "
+            f"peak RSS +{peak - baseline:>6.1f} MB"
+        )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--points", type=int, default=1000)
+    parser.add_argument("--formats", nargs="*", default=["ndjson", "csv"] + (["parquet"] if HAVE_PYARROW else []))
+    args = parser.parse_args()
+    run(args.products, args.points, args.formats)
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Compare HTML extraction backends on the saved retailer fixture pages.
+
+Fixture pages are inflated to a realistic product-page size by appending
+recommendation carousels and inline scripts after the product block, the
+way real retailer pages put most of their weight below the price. For each
+backend the script reports mean parse+extract time (with the structured
+data fast path disabled, so the DOM path is always exercised) and the peak Python
+heap allocation per page (tracemalloc; memory allocated inside libxml2 is
+not visible to it).
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from stub_server import SITES, load_fixture
+
+from extraction import HtmlExtractor, HAVE_LXML
+from structured_data import extract_structured
+from page_cache import CachedPage
+from scraper import PriceScraper
+
+FILLER_BLOCK = (
+    '<div class="carousel-card"><a href="/dp/B0{0:08d}"><img src="/images/{0}.jpg" alt="Related item {0}">'
+    '<span class="card-title">Related item {0} with a fairly long marketing title</span></a>'
+    '<span class="card-rating" aria-label="4.5 out of 5 stars">4.5</span><ul class="card-bullets">'
+    '<li>Feature one</li><li>Feature two</li><li>Feature three</li></ul></div>\n'
+    '<script>window.__data_{0} = {{"id": {0}, "tracking": "abcdefghijklmnopqrstuvwxyz0123456789"}};</script>\n'
+)
+
+def inflate(page, target_kb):
+    filler = []
+    size = len(page)
+    i = 0
+    while size < target_kb * 1024:
+        block = FILLER_BLOCK.format(i).encode()
+        filler.append(block)
+        size += len(block)
+        i += 1
+    return page.replace(b'</body>', b''.join(filler) + b'</body>')
+
+def backends():
+    configs = [("html.parser", HtmlExtractor(backend='soup'))]
+    if HAVE_LXML:
+        configs += [
+            ("bs4+lxml", HtmlExtractor(backend='soup-lxml')),
+            ("lxml", HtmlExtractor(backend='lxml', partial=False)),
+            ("lxml partial", HtmlExtractor(backend='lxml', partial=True)),
+        ]
+    return configs
+
+class FixtureScraper(PriceScraper):
+    """Scraper whose fetch step returns an in-memory page, isolating parsing"""
+
+    def __init__(self, page, **kwargs):
+        super().__init__(use_selenium_fallback=False, use_structured_data=False, **kwargs)
+        self.page = page
+
+    def fetch_page(self, url):
+        return self.page, CachedPage()
+
+def measure(scraper, site, repeats):
+    scrape = getattr(scraper, f"scrape_{site}")
+    url = f"http://www.{site}.com/product"
+    scrape(url)
+    started = time.perf_counter()
+    for _ in range(repeats):
+        result = scrape(url)
+    elapsed = (time.perf_counter() - started) / repeats
+
+    tracemalloc.start()
+    scrape(url)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, result
+
+def run(target_kb, repeats):
+    print(f"Pages inflated to ~{target_kb}KB, {repeats} repeats")
+    print("-" * 50)
+    for site in SITES:
+        page = inflate(load_fixture(site), target_kb)
+        print(f"{site} ({len(page) // 1024}KB)")
+        for label, extractor in backends():
+            scraper = FixtureScraper(page, extractor=extractor)
+            elapsed, peak, result = measure(scraper, site, repeats)
+            print(
+                f"  {label:<13} {elapsed * 1000:>8.2f} ms/page  "
+                f"{peak / 1024:>9.0f} KB peak  price={result['price']}"
+            )
+        structured = extract_structured(page, scraper.clean_price)
+        started = time.perf_counter()
+        for _ in range(repeats):
+            extract_structured(page, scraper.clean_price)
+        elapsed = (time.perf_counter() - started) / repeats
+        found = "complete" if structured['name'] and structured['price'] else "not found"
+        print(f"  {'structured':<13} {elapsed * 1000:>8.2f} ms/page  ({found}, price={structured['price']})")
+    if not HAVE_LXML:
+        print("\nlxml/cssselect not installed; only the html.parser backend was measured")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size-kb", type=int, default=400)
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args()
+    run(args.size_kb, args.repeats)
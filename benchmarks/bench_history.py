@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Benchmark price-history reads on a large synthetic history.
+
+Seeds one product with N history rows (a random walk sampled every few
+minutes) and compares the full series against a time window, LTTB
+downsampling and SQL bucket aggregation.
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+
+from common import temp_database, use_database, release_database, describe
+
+import main
+from database import Product, PriceHistory
+
+def seed(engine, session_factory, points):
+    db = session_factory()
+    product = Product(name="Synthetic product", url="http://www.amazon.com/dp/BSYNTHETIC", current_price=100.0)
+    db.add(product)
+    db.commit()
+    product_id = product.id
+    db.close()
+
+    start = datetime.utcnow() - timedelta(minutes=5 * points)
+    price = 100.0
+    rows = []
+    for i in range(points):
+        if random.random() < 0.05:
+            price = max(1.0, round(price * random.uniform(0.9, 1.1), 2))
+        rows.append({"product_id": product_id, "price": price, "timestamp": start + timedelta(minutes=5 * i)})
+    with engine.begin() as conn:
+        conn.execute(PriceHistory.__table__.insert(), rows)
+    return product_id, start
+
+def install(points):
+    engine, session_factory = temp_database()
+    product_id, start = seed(engine, session_factory, points)
+
+    use_database(main.app, engine)
+    return product_id, start
+
+def measure(client, label, path, params, repeats):
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        response = client.get(path, params=params, headers={"accept-encoding": "identity"})
+        samples.append(time.perf_counter() - started)
+        response.raise_for_status()
+    stats = describe(samples)
+    print(
+        f"{label:<30} p50={stats['p50_ms']:>8.2f}ms p99={stats['p99_ms']:>8.2f}ms  "
+        f"{len(response.json()):>7} points  {len(response.content) / 1024:>8.1f} KB"
+    )
+
+def run(points, repeats):
+    product_id, start = install(points)
+    client = TestClient(main.app)
+    history = f"/products/{product_id}/price-history"
+    last_30_days = (datetime.utcnow() - timedelta(days=30)).isoformat()
+    print(f"Price history with {points} points")
+    print("-" * 50)
+    measure(client, "full series", history, {}, 3)
+    measure(client, "last 30 days", history, {"start": last_30_days}, repeats)
+    measure(client, "LTTB 1000 points", history, {"max_points": 1000}, repeats)
+    measure(client, "LTTB 1000, last 30 days", history, {"max_points": 1000, "start": last_30_days}, repeats)
+    measure(client, "buckets (500)", f"{history}/buckets", {"max_points": 500}, repeats)
+    measure(client, "daily buckets", f"{history}/buckets", {"bucket_seconds": 86400}, repeats)
+    release_database(main.app)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--points", type=int, default=100000)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+    run(args.points, args.repeats)
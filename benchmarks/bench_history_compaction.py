@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Benchmark change-only history storage.
+
+Seeds P products with N hourly observations each, stored the old way (one
+row per poll, mostly repeats of the previous price), then measures table
+size and history query times before and after compaction.py folds the
+repeats into run-length rows. Also checks that the compacted history
+still answers with an equivalent series: every original observation is
+reproduced by the step line of the new points, and the daily buckets keep
+the same min/max/last/count.
+"""
+
+import argparse
+import bisect
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from common import temp_database, describe
+
+from database import Product, PriceHistory
+from history import history_rows, bucket_series, record_price
+from compaction import compact_history
+
+def seed(engine, products, points, change_rate):
+    with engine.begin() as conn:
+        conn.execute(Product.__table__.insert(), [
+            {"name": f"Product {i}", "url": f"http://www.amazon.com/dp/B{i:09d}", "current_price": 100.0}
+            for i in range(products)
+        ])
+        product_ids = [row.id for row in conn.execute(text("SELECT id FROM products"))]
+
+    start = datetime.utcnow() - timedelta(hours=points)
+    prices = {product_id: 100.0 for product_id in product_ids}
+    for i in range(points):
+        timestamp = start + timedelta(hours=i)
+        rows = []
+        for product_id in product_ids:
+            if random.random() < change_rate:
+                prices[product_id] = max(1.0, round(prices[product_id] * random.uniform(0.9, 1.1), 2))
+            rows.append({"product_id": product_id, "price": prices[product_id], "timestamp": timestamp})
+        with engine.begin() as conn:
+            conn.execute(PriceHistory.__table__.insert(), rows)
+    return product_ids, start
+
+def table_size(engine):
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT COUNT(*) FROM price_history")).scalar()
+        pages = conn.execute(text("PRAGMA page_count")).scalar()
+        page_size = conn.execute(text("PRAGMA page_size")).scalar()
+    return rows, pages * page_size
+
+def measure(session_factory, product_ids, window_start, repeats):
+    workloads = {
+        "full series": lambda db, pid: history_rows(db, pid),
+        "last 7 days": lambda db, pid: history_rows(db, pid, start=window_start),
+        "daily buckets": lambda db, pid: bucket_series(db, pid, 86400),
+    }
+    results = {}
+    for label, workload in workloads.items():
+        samples = []
+        for _ in range(repeats):
+            product_id = random.choice(product_ids)
+            db = session_factory()
+            started = time.perf_counter()
+            workload(db, product_id)
+            samples.append(time.perf_counter() - started)
+            db.close()
+        results[label] = describe(samples)
+    return results
+
+def snapshot(session_factory, product_ids):
+    db = session_factory()
+    try:
+        return {
+            product_id: (
+                [(point.timestamp, point.price) for point in history_rows(db, product_id)],
+                bucket_series(db, product_id, 86400),
+            )
+            for product_id in product_ids
+        }
+    finally:
+        db.close()
+
+def check_equivalent(reference, compacted):
+    for product_id, (observations, buckets) in reference.items():
+        points, new_buckets = compacted[product_id]
+        times = [timestamp for timestamp, _ in points]
+        for timestamp, price in observations:
+            at = bisect.bisect_right(times, timestamp) - 1
+            assert at >= 0 and points[at][1] == price, f"product {product_id}: price at {timestamp} differs"
+        assert len(points) <= len(observations), f"product {product_id}: compaction added points"
+
+        by_start = {bucket['start']: bucket for bucket in new_buckets}
+        for bucket in buckets:
+            new = by_start.get(bucket['start'])
+            # Buckets entirely inside a run have no stored point of their own
+            if new is None:
+                continue
+            for key in ('min', 'max', 'last'):
+                assert new[key] == bucket[key], f"product {product_id}: bucket {bucket['start']} {key} differs"
+        assert sum(b['count'] for b in new_buckets) == sum(b['count'] for b in buckets), \
+            f"product {product_id}: observation count differs"
+
+def change_only_writes(session_factory, product_id, rounds):
+    """Append identical observations through record_price in change-only mode"""
+    db = session_factory()
+    before = db.query(PriceHistory).filter(PriceHistory.product_id == product_id).count()
+    latest = db.query(PriceHistory).filter(PriceHistory.product_id == product_id).order_by(
+        PriceHistory.timestamp.desc()
+    ).first()
+    started = time.perf_counter()
+    for i in range(rounds):
+        record_price(db, product_id, latest.price, datetime.utcnow() + timedelta(hours=i + 1), change_only=True)
+        db.commit()
+    elapsed = time.perf_counter() - started
+    after = db.query(PriceHistory).filter(PriceHistory.product_id == product_id).count()
+    db.close()
+    return rounds / elapsed, after - before
+
+def report(label, rows, size, reads):
+    print(f"{label}: {rows} rows, {size / 1024 / 1024:.1f} MB")
+    for name, stats in reads.items():
+        print(f"  {name:<14} p50={stats['p50_ms']:>8.2f}ms p99={stats['p99_ms']:>8.2f}ms")
+
+def run(products, points, change_rate, repeats, check):
+    engine, session_factory = temp_database("history.db")
+    print(f"Seeding {products} products x {points} hourly observations ({change_rate:.0%} change rate)...")
+    product_ids, start = seed(engine, products, points, change_rate)
+    window_start = start + timedelta(hours=points - 24 * 7)
+
+    sample = random.sample(product_ids, min(check, len(product_ids)))
+    reference = snapshot(session_factory, sample)
+    rows, size = table_size(engine)
+    report("before", rows, size, measure(session_factory, product_ids, window_start, repeats))
+
+    summary = compact_history(engine, vacuum=True)
+    print(f"compaction: {summary['elapsed_seconds']:.1f}s")
+    rows, size = table_size(engine)
+    report("after", rows, size, measure(session_factory, product_ids, window_start, repeats))
+
+    check_equivalent(reference, snapshot(session_factory, sample))
+    print(f"equivalent series for {len(sample)} sampled products")
+
+    rate, added = change_only_writes(session_factory, product_ids[0], 200)
+    print(f"change-only writes of an unchanged price: {rate:.0f}/s, {added} new rows")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--points", type=int, default=2000, help="hourly observations per product")
+    parser.add_argument("--change-rate", type=float, default=0.05, help="chance a poll sees a new price")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--check", type=int, default=50, help="products to verify for equivalence")
+    args = parser.parse_args()
+    run(args.products, args.points, args.change_rate, args.repeats, args.check)
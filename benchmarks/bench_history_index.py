@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Benchmark the (product_id, timestamp) index and SQLite pragmas on a large
+price_history table.
+
+Seeds P products with N history rows each, then times the hot history
+reads twice on the same file: first with the composite index dropped and
+SQLite's default pragmas, then after the migration restores the index and
+with the tuned pragmas from database.configure_sqlite. Before timing the
+"after" run it checks EXPLAIN QUERY PLAN to make sure the history queries
+use the index and need no temporary sort.
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from common import temp_database, describe
+
+from database import Product, PriceHistory, configure_sqlite, create_tables
+from history import history_query, history_rows, bucket_series, explain_query_plan
+
+INDEX_NAME = "ix_price_history_product_timestamp"
+
+def seed(engine, session_factory, products, points):
+    with engine.begin() as conn:
+        conn.execute(Product.__table__.insert(), [
+            {"name": f"Product {i}", "url": f"http://www.amazon.com/dp/B{i:09d}", "current_price": 100.0}
+            for i in range(products)
+        ])
+        product_ids = [row.id for row in conn.execute(text("SELECT id FROM products"))]
+
+    # Rows arrive interleaved across products, the way scrape rounds write them
+    start = datetime.utcnow() - timedelta(hours=points)
+    prices = {product_id: 100.0 for product_id in product_ids}
+    for i in range(points):
+        timestamp = start + timedelta(hours=i)
+        rows = []
+        for product_id in product_ids:
+            if random.random() < 0.05:
+                prices[product_id] = max(1.0, round(prices[product_id] * random.uniform(0.9, 1.1), 2))
+            rows.append({"product_id": product_id, "price": prices[product_id], "timestamp": timestamp})
+        with engine.begin() as conn:
+            conn.execute(PriceHistory.__table__.insert(), rows)
+    return product_ids, start
+
+def plain_engine(url):
+    """Engine with SQLite defaults: rollback journal, synchronous=FULL, 2MB cache, no mmap"""
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+    with engine.begin() as conn:
+        conn.execute(text("PRAGMA journal_mode=DELETE"))
+    return engine
+
+def check_plan(session_factory, product_id, window_start):
+    db = session_factory()
+    try:
+        for descending in (False, True):
+            for start in (None, window_start):
+                plan = explain_query_plan(db, history_query(db, product_id, start=start, descending=descending))
+                print(f"  plan: {' | '.join(plan)}")
+                assert any(INDEX_NAME in line for line in plan), f"history query does not use {INDEX_NAME}: {plan}"
+                assert not any("TEMP B-TREE" in line for line in plan), f"history query needs a sort: {plan}"
+    finally:
+        db.close()
+
+def measure(session_factory, product_ids, window_start, repeats):
+    workloads = {
+        "full series": lambda db, pid: history_rows(db, pid),
+        "last 7 days": lambda db, pid: history_rows(db, pid, start=window_start),
+        "latest point": lambda db, pid: history_query(db, pid, descending=True).first(),
+        "daily buckets": lambda db, pid: bucket_series(db, pid, 86400),
+    }
+    results = {}
+    for label, workload in workloads.items():
+        samples = []
+        for _ in range(repeats):
+            product_id = random.choice(product_ids)
+            db = session_factory()
+            started = time.perf_counter()
+            workload(db, product_id)
+            samples.append(time.perf_counter() - started)
+            db.close()
+        results[label] = describe(samples)
+    return results
+
+def write_throughput(session_factory, product_ids, rounds):
+    """Scrape-shaped writes: one small transaction per product"""
+    timestamp = datetime.utcnow()
+    started = time.perf_counter()
+    for i in range(rounds):
+        db = session_factory()
+        db.add(PriceHistory(product_id=product_ids[i % len(product_ids)], price=99.0, timestamp=timestamp))
+        db.commit()
+        db.close()
+    return rounds / (time.perf_counter() - started)
+
+def run(products, points, repeats, writes):
+    engine, session_factory = temp_database("history.db")
+    print(f"Seeding {products} products x {points} points = {products * points} rows...")
+    started = time.perf_counter()
+    product_ids, start = seed(engine, session_factory, products, points)
+    print(f"Seeded in {time.perf_counter() - started:.1f}s")
+    window_start = start + timedelta(hours=points - 24 * 7)
+    url = str(engine.url)
+    engine.dispose()
+
+    before = plain_engine(url)
+    with before.begin() as conn:
+        conn.execute(text(f"DROP INDEX {INDEX_NAME}"))
+        conn.execute(text("DELETE FROM schema_migrations"))
+    before_sessions = sessionmaker(autocommit=False, autoflush=False, bind=before)
+    before_reads = measure(before_sessions, product_ids, window_start, repeats)
+    before_writes = write_throughput(before_sessions, product_ids, writes)
+    before.dispose()
+
+    # Re-running migrations on the un-indexed file is exactly an upgrade of an old database
+    after = configure_sqlite(create_engine(url, connect_args={"check_same_thread": False}))
+    started = time.perf_counter()
+    create_tables(after)
+    print(f"Migration built the index in {time.perf_counter() - started:.1f}s")
+    after_sessions = sessionmaker(autocommit=False, autoflush=False, bind=after)
+    check_plan(after_sessions, product_ids[0], window_start)
+    after_reads = measure(after_sessions, product_ids, window_start, repeats)
+    after_writes = write_throughput(after_sessions, product_ids, writes)
+
+    print()
+    print(f"{'query':<16} {'before p50':>12} {'after p50':>12} {'before p99':>12} {'after p99':>12} {'speedup':>9}")
+    print("-" * 78)
+    for label in before_reads:
+        b, a = before_reads[label], after_reads[label]
+        speedup = b['p50_ms'] / a['p50_ms'] if a['p50_ms'] else float('inf')
+        print(
+            f"{label:<16} {b['p50_ms']:>10.2f}ms {a['p50_ms']:>10.2f}ms "
+            f"{b['p99_ms']:>10.2f}ms {a['p99_ms']:>10.2f}ms {speedup:>8.1f}x"
+        )
+    print(f"{'single-row writes':<16} {before_writes:>9.0f}/s {after_writes:>10.0f}/s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--points", type=int, default=1000, help="history rows per product")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--writes", type=int, default=200)
+    args = parser.parse_args()
+    run(args.products, args.points, args.repeats, args.writes)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Measure scrape throughput of worker processes sharing the durable job queue.
+
+Enqueues one refresh job per product in a temporary SQLite database, then
+drains the queue with 1, 2, 4... worker processes (each running several
+jobs at once) against the local stub. Parsing the fixture pages is the
+CPU-bound part one process can't spread across cores. A last run makes
+every eBay fetch fail, to show retries ending in the dead-letter list.
+"""
+
+import argparse
+import multiprocessing
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from common import temp_database
+from stub_server import StubServer, sample_urls
+
+from database import Product, configure_sqlite
+from job_queue import DatabaseJobQueue
+from scraper import PriceScraper
+from worker import ScrapeWorker
+
+def database_with_products(products):
+    engine, session_factory = temp_database()
+    db = session_factory()
+    db.add_all([Product(name=f"Product {i}", url=url) for i, url in enumerate(sample_urls(products))])
+    db.commit()
+    db.close()
+    return str(engine.url)
+
+def session_factory_for(url):
+    engine = configure_sqlite(create_engine(url, connect_args={"check_same_thread": False}))
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def queue_for(url, **options):
+    return DatabaseJobQueue(session_factory=session_factory_for(url), **options)
+
+def run_worker(database_url, proxy, concurrency, queue_options, ready):
+    session_factory = session_factory_for(database_url)
+    scraper = PriceScraper(use_selenium_fallback=False)
+    scraper.transport.set_proxy(proxy)
+    scraper.guard.rate = 0
+    scraper.guard.base_delay = 0.01
+    worker = ScrapeWorker(
+        queue=DatabaseJobQueue(session_factory=session_factory, **queue_options),
+        scraper=scraper,
+        session_factory=session_factory,
+        concurrency=concurrency,
+        poll_seconds=0.05,
+    )
+    # Start together, after the interpreter and imports are up
+    ready.wait()
+    worker.run(exit_when_empty=True)
+
+def drain(database_url, proxy, processes, concurrency, queue_options):
+    context = multiprocessing.get_context("spawn")
+    ready = context.Barrier(processes + 1)
+    workers = [
+        context.Process(target=run_worker, args=(database_url, proxy, concurrency, queue_options, ready))
+        for _ in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    ready.wait()
+    started = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - started
+
+def enqueue_all(queue, database_url):
+    db = session_factory_for(database_url)()
+    try:
+        targets = [(product.id, product.url) for product in db.query(Product).order_by(Product.id)]
+    finally:
+        db.close()
+    return queue.enqueue_many([('refresh', url, product_id) for product_id, url in targets])
+
+def run(products, levels, concurrency, latency):
+    server = StubServer(latency=latency, conditional=False).start()
+    queue_options = {'max_attempts': 3, 'retry_base_delay': 0.05, 'retry_max_delay': 0.2}
+    try:
+        print(f"{products} jobs, {concurrency} concurrent per process, stub latency {latency * 1000:.0f}ms")
+        print("-" * 50)
+        for processes in levels:
+            database_url = database_with_products(products)
+            queue = queue_for(database_url, **queue_options)
+            enqueue_all(queue, database_url)
+            elapsed = drain(database_url, server.url, processes, concurrency, queue_options)
+            stats = queue.stats()
+            print(
+                f"processes={processes:<3} {products / elapsed:>7.1f} jobs/s  {elapsed:>6.2f}s  "
+                f"done={stats['done']} dead={stats['dead']} queued={stats['queued']}"
+            )
+
+        database_url = database_with_products(products)
+        queue = queue_for(database_url, **queue_options)
+        enqueue_all(queue, database_url)
+        server.inject_fault("ebay", status=503)
+        elapsed = drain(database_url, server.url, max(levels), concurrency, queue_options)
+        server.clear_faults()
+        stats = queue.stats()
+        dead = queue.list("dead", limit=1)
+        print(
+            f"\nwith eBay down: {elapsed:.2f}s  done={stats['done']} dead={stats['dead']} "
+            f"(attempts per dead job: {dead[0]['attempts'] if dead else '-'}, last error: {dead[0]['error'] if dead else '-'})"
+        )
+    finally:
+        server.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--products", type=int, default=300)
+    parser.add_argument("--levels", type=int, nargs="*", default=[1, 2, 4])
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+    run(args.products, args.levels, args.concurrency, args.latency)
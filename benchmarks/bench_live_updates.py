@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Load test GET /products/stream with thousands of server-sent event subscribers.
+
+Starts the API under uvicorn in a subprocess on a temporary database,
+opens N subscriber connections from this process, then writes price
+updates from here, the way a scrape worker would (a separate process, so
+the API picks them up on its next poll). Reports how many deltas arrived
+and the delay from commit to delivery, and how many queries the API made
+for them. A last round disconnects some subscribers, writes more prices
+and reconnects them with Last-Event-ID to check they get exactly what
+they missed.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from common import percentile
+from stub_server import BACKEND_DIR
+
+from database import Product, configure_sqlite
+from history import record_price
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_api(workdir, port, poll_seconds):
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR, LIVE_POLL_SECONDS=str(poll_seconds), SCHEDULER_ENABLED="0")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning",
+         "--backlog", "8192"],
+        cwd=workdir, env=env
+    )
+    for _ in range(300):
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/", timeout=1)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("API did not start")
+
+class Subscriber:
+    """Minimal SSE client on a raw socket, recording delivery delays"""
+
+    def __init__(self, port, delays):
+        self.port = port
+        self.delays = delays
+        self.last_id = None
+        self.received = 0
+        self.task = None
+
+    async def connect(self, ready):
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+        resume = f"Last-Event-ID: {self.last_id}\r\n" if self.last_id is not None else ""
+        writer.write(
+            f"GET /products/stream HTTP/1.1\r\nHost: localhost\r\nAccept: text/event-stream\r\n{resume}\r\n".encode()
+        )
+        await writer.drain()
+        # Status line and headers
+        while (await reader.readline()) not in (b"\r\n", b""):
+            pass
+        ready()
+        self.task = asyncio.ensure_future(self.read(reader, writer))
+
+    async def read(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    return
+                # Chunk size lines of the chunked encoding match neither prefix
+                line = line.strip()
+                if line.startswith(b"id: "):
+                    self.last_id = int(line[4:])
+                elif line.startswith(b"data: {\"product_id\""):
+                    data = json.loads(line[6:])
+                    if "at" in data:
+                        at = datetime.fromisoformat(data["at"])
+                        self.delays.append((datetime.utcnow() - at).total_seconds())
+                    self.received += 1
+        except asyncio.CancelledError:
+            writer.close()
+            raise
+
+    async def disconnect(self):
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+
+def writer_thread(database_url, product_ids, updates, rate, done):
+    engine = configure_sqlite(create_engine(database_url, connect_args={"check_same_thread": False}))
+    db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        for i in range(updates):
+            record_price(db, product_ids[i % len(product_ids)], 100.0 + i % 50, datetime.utcnow())
+            db.commit()
+            time.sleep(1.0 / rate)
+    finally:
+        db.close()
+        done.set()
+
+async def publish(database_url, product_ids, updates, rate):
+    done = threading.Event()
+    threading.Thread(target=writer_thread, args=(database_url, product_ids, updates, rate, done), daemon=True).start()
+    while not done.is_set():
+        await asyncio.sleep(0.05)
+
+async def settle(subscribers, expected, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and sum(s.received for s in subscribers) < expected:
+        await asyncio.sleep(0.1)
+
+async def run(subscribers_count, updates, rate, poll_seconds, reconnects):
+    workdir = tempfile.mkdtemp(prefix="price-tracker-bench-")
+    port = free_port()
+    process = start_api(workdir, port, poll_seconds)
+    database_url = f"sqlite:///{os.path.join(workdir, 'price_tracker.db')}"
+    try:
+        engine = configure_sqlite(create_engine(database_url))
+        with engine.begin() as conn:
+            conn.execute(Product.__table__.insert(), [
+                {"name": f"Product {i}", "url": f"http://www.amazon.com/dp/B{i:09d}"} for i in range(50)
+            ])
+        with engine.connect() as conn:
+            product_ids = [row.id for row in conn.execute(Product.__table__.select())]
+
+        delays = []
+        subscribers = [Subscriber(port, delays) for _ in range(subscribers_count)]
+        connected = 0
+
+        def ready():
+            nonlocal connected
+            connected += 1
+
+        started = time.perf_counter()
+        for offset in range(0, subscribers_count, 200):
+            await asyncio.gather(*(s.connect(ready) for s in subscribers[offset:offset + 200]))
+        print(f"{connected} subscribers connected in {time.perf_counter() - started:.1f}s "
+              f"(poll interval {poll_seconds * 1000:.0f}ms for out-of-process writes)")
+
+        before = httpx.get(f"http://127.0.0.1:{port}/products/stream/stats").json()
+        await publish(database_url, product_ids, updates, rate)
+        await settle(subscribers, updates * subscribers_count)
+        after = httpx.get(f"http://127.0.0.1:{port}/products/stream/stats").json()
+        received = sum(s.received for s in subscribers)
+        print(
+            f"{updates} updates x {subscribers_count} subscribers: {received}/{updates * subscribers_count} delivered, "
+            f"delay p50 {percentile(delays, 50) * 1000:.0f}ms p99 {percentile(delays, 99) * 1000:.0f}ms "
+            f"max {max(delays, default=0) * 1000:.0f}ms"
+        )
+        print(f"API queries for them: {after['polls'] - before['polls']} polls (one per poll, not per subscriber)")
+
+        if reconnects:
+            # Resume: drop some subscribers, write while they are away, reconnect with Last-Event-ID
+            away = subscribers[:reconnects]
+            for subscriber in away:
+                await subscriber.disconnect()
+            counts = [s.received for s in away]
+            await publish(database_url, product_ids, updates, rate)
+            for offset in range(0, len(away), 200):
+                await asyncio.gather(*(s.connect(ready) for s in away[offset:offset + 200]))
+            await settle(away, sum(counts) + updates * len(away))
+            exact = sum(s.received - count == updates for s, count in zip(away, counts))
+            print(f"resume: {exact}/{len(away)} reconnected subscribers got exactly the {updates} missed deltas")
+
+        for subscriber in subscribers:
+            await subscriber.disconnect()
+    finally:
+        process.terminate()
+        process.wait()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--subscribers", type=int, default=2000)
+    parser.add_argument("--updates", type=int, default=50)
+    parser.add_argument("--rate", type=float, default=10, help="Price updates written per second")
+    parser.add_argument("--poll", type=float, default=0.1, help="LIVE_POLL_SECONDS for the API")
+    parser.add_argument("--reconnects", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(args.subscribers, args.updates, args.rate, args.poll, args.reconnects))
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Measure the cost of the metrics instrumentation.
+
+Reports the raw cost of one counter increment, histogram observation and
+timer, then runs the same workloads with the registry enabled and
+disabled: full scrapes against the local stub (fetch, parse, selector
+counters) and API requests through the route-latency middleware. Runs are
+interleaved so both modes see the same machine noise.
+"""
+
+import argparse
+import statistics
+import time
+
+from fastapi.testclient import TestClient
+
+from stub_server import StubServer, sample_urls
+
+import main
+from metrics import REGISTRY, Registry
+from scraper import PriceScraper
+
+def micro(iterations):
+    registry = Registry(enabled=True)
+    counter = registry.counter("bench_counter", "bench", ["site", "outcome"])
+    histogram = registry.histogram("bench_seconds", "bench", ["site"])
+
+    def timed():
+        with histogram.time(site="amazon"):
+            pass
+
+    results = {}
+    for label, operation in (
+        ("counter.inc", lambda: counter.inc(site="amazon", outcome="success")),
+        ("histogram.observe", lambda: histogram.observe(0.0123, site="amazon")),
+        ("histogram.time", timed),
+    ):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            operation()
+        results[label] = (time.perf_counter() - started) / iterations * 1e6
+    return results
+
+def scrape_round(server, urls):
+    scraper = server.attach(PriceScraper(use_selenium_fallback=False))
+    started = time.perf_counter()
+    for url in urls:
+        scraper.scrape_product(url)
+    return (time.perf_counter() - started) / len(urls) * 1e6
+
+def api_round(client, requests_per_round):
+    started = time.perf_counter()
+    for _ in range(requests_per_round):
+        client.get("/")
+    return (time.perf_counter() - started) / requests_per_round * 1e6
+
+def compare(label, measure, rounds):
+    timings = {True: [], False: []}
+    for _ in range(rounds):
+        for enabled in (True, False):
+            REGISTRY.enabled = enabled
+            timings[enabled].append(measure())
+    REGISTRY.enabled = True
+    on, off = statistics.median(timings[True]), statistics.median(timings[False])
+    print(f"{label:<22} on={on:>9.1f}us  off={off:>9.1f}us  overhead={on - off:>7.1f}us ({(on - off) / off:+.2%})")
+
+def run(iterations, products, requests_per_round, rounds):
+    print("Per-call cost")
+    for label, micros in micro(iterations).items():
+        print(f"  {label:<20} {micros:.3f}us")
+    print()
+
+    server = StubServer().start()
+    try:
+        urls = sample_urls(products)
+        compare("scrape (stub)", lambda: scrape_round(server, urls), rounds)
+    finally:
+        server.stop()
+
+    client = TestClient(main.app)
+    compare("GET / (middleware)", lambda: api_round(client, requests_per_round), rounds)
+    print(f"\n/metrics renders {len(REGISTRY.render().splitlines())} lines")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=200000)
+    parser.add_argument("--products", type=int, default=150)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--rounds", type=int, default=7)
+    args = parser.parse_args()
+    run(args.iterations, args.products, args.requests, args.rounds)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Benchmark GET /products/ on a large local SQLite database.
+
+Seeds N products (100k by default), then measures p50/p99 latency and
+payload size for the unpaginated list, cursor-paginated pages, sparse
+field selection, precomputed stats and compressed responses.
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+
+from common import temp_database, use_database, release_database, describe
+from stub_server import sample_urls
+
+import main
+from database import Product, ProductStats
+
+def seed(engine, count):
+    now = datetime.utcnow()
+    rows = [
+        {
+            "name": f"Product {i} with a reasonably descriptive title",
+            "url": url,
+            "current_price": round(random.uniform(5, 500), 2),
+            "last_updated": now - timedelta(minutes=random.randint(0, 60 * 24 * 30)),
+            "created_at": now - timedelta(days=random.randint(0, 365)),
+        }
+        for i, url in enumerate(sample_urls(count))
+    ]
+    with engine.begin() as conn:
+        conn.execute(Product.__table__.insert(), rows)
+        stats = [
+            {
+                "product_id": product_id,
+                "observations": 100,
+                "last_price": price,
+                "last_observed_at": now,
+                "avg_price": price,
+                "all_time_low": price * 0.8,
+                "all_time_low_at": now - timedelta(days=10),
+                "all_time_high": price * 1.2,
+                "change_7d": 0.0,
+                "change_30d": 0.0,
+            }
+            for product_id, price in conn.execute(Product.__table__.select().with_only_columns(
+                Product.__table__.c.id, Product.__table__.c.current_price
+            ))
+        ]
+        conn.execute(ProductStats.__table__.insert(), stats)
+
+def install(count):
+    engine, session_factory = temp_database()
+    seed(engine, count)
+
+    use_database(main.app, engine)
+
+def measure(client, label, params, repeats, headers=None, walk=False):
+    samples = []
+    size = 0
+    cursor = None
+    for _ in range(repeats):
+        request_params = dict(params)
+        if walk and cursor:
+            request_params["cursor"] = cursor
+        started = time.perf_counter()
+        response = client.get("/products/", params=request_params, headers=headers or {"accept-encoding": "identity"})
+        samples.append(time.perf_counter() - started)
+        response.raise_for_status()
+        size = int(response.headers.get("content-length", len(response.content)))
+        cursor = response.headers.get("x-next-cursor")
+    stats = describe(samples)
+    print(f"{label:<34} p50={stats['p50_ms']:>8.2f}ms p99={stats['p99_ms']:>8.2f}ms  {size / 1024:>9.1f} KB")
+
+def run(count, repeats):
+    install(count)
+    client = TestClient(main.app)
+    print(f"GET /products/ with {count} products")
+    print("-" * 50)
+    measure(client, "full list", {}, max(3, repeats // 20))
+    measure(client, "full list (gzip)", {}, max(3, repeats // 20), headers={"accept-encoding": "gzip"})
+    measure(client, "full list (br)", {}, max(3, repeats // 20), headers={"accept-encoding": "br"})
+    measure(client, "page of 100 (cursor walk)", {"limit": 100}, repeats, walk=True)
+    measure(client, "page of 100, id+name+price", {"limit": 100, "fields": "id,name,current_price"}, repeats, walk=True)
+    measure(client, "page of 100, sorted by price", {"limit": 100, "sort": "current_price", "order": "desc"}, repeats, walk=True)
+    measure(client, "page of 100, amazon $50-$100", {"limit": 100, "domain": "amazon", "min_price": 50, "max_price": 100}, repeats, walk=True)
+    measure(client, "page of 100 with stats", {"limit": 100, "include_stats": "true"}, repeats, walk=True)
+    measure(client, "page of 100 (gzip)", {"limit": 100}, repeats, headers={"accept-encoding": "gzip"}, walk=True)
+    release_database(main.app)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--products", type=int, default=100000)
+    parser.add_argument("--repeats", type=int, default=100)
+    args = parser.parse_args()
+    run(args.products, args.repeats)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Exercise retries and circuit breaking against a fault-injecting stub.
+
+Amazon answers every request with 503, eBay fails 30% of requests with 503
+and Walmart drops 10% of connections. The same scrape workload runs with
+the guard reduced to the old behaviour (one attempt, no breaker) and with
+the default policy. The Selenium fallback is simulated by a fixed delay, so
+the cost of launching it for a failing site shows up without a browser.
+Finally the Amazon fault is lifted to show the breaker closing again.
+"""
+
+import argparse
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from stub_server import StubServer, sample_urls
+
+from domain_guard import DomainGuard
+from scraper import PriceScraper
+
+class SimulatedFallbackScraper(PriceScraper):
+    """PriceScraper whose Selenium fallback just costs time"""
+
+    def __init__(self, fallback_seconds, **kwargs):
+        super().__init__(**kwargs)
+        self.fallback_seconds = fallback_seconds
+        self.fallback_calls = defaultdict(int)
+        self._fallback_lock = threading.Lock()
+
+    def scrape_with_selenium(self, url):
+        with self._fallback_lock:
+            self.fallback_calls[self.get_site(url)] += 1
+        time.sleep(self.fallback_seconds)
+        return {'name': None, 'price': None, 'success': False, 'error': 'simulated browser'}
+
+def inject(server):
+    server.clear_faults()
+    server.inject_fault("amazon", status=503)
+    server.inject_fault("ebay", status=503, probability=0.3)
+    server.inject_fault("walmart", reset=True, probability=0.1)
+
+def scrape_all(scraper, urls, workers):
+    outcomes = defaultdict(lambda: {'ok': 0, 'failed': 0, 'seconds': 0.0})
+    lock = threading.Lock()
+
+    def scrape(url):
+        started = time.perf_counter()
+        result = scraper.scrape_product(url)
+        elapsed = time.perf_counter() - started
+        with lock:
+            outcome = outcomes[scraper.get_site(url)]
+            outcome['ok' if result['success'] and result['price'] else 'failed'] += 1
+            outcome['seconds'] += elapsed
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(scrape, urls))
+    return outcomes, time.perf_counter() - started
+
+def run_policy(server, label, guard, urls, workers, fallback_seconds):
+    inject(server)
+    scraper = server.attach(SimulatedFallbackScraper(fallback_seconds, guard=guard, timeout=2))
+    # Every URL is new to the page cache, so each scrape really fetches
+    outcomes, elapsed = scrape_all(scraper, urls, workers)
+    state = scraper.guard.state()
+    print(f"{label} ({elapsed:.2f}s wall)")
+    for site in sorted(outcomes):
+        outcome, site_state = outcomes[site], state.get(site, {})
+        print(
+            f"  {site:<8} ok={outcome['ok']:<4} failed={outcome['failed']:<4} "
+            f"avg={outcome['seconds'] / (outcome['ok'] + outcome['failed']) * 1000:>7.1f}ms  "
+            f"requests={site_state.get('requests', 0):<4} retries={site_state.get('retries', 0):<4} "
+            f"short_circuited={site_state.get('short_circuited', 0):<4} "
+            f"fallbacks={scraper.fallback_calls[site]:<4} breaker={site_state.get('state', 'closed')}"
+        )
+    return scraper
+
+def run(products, workers, fallback_seconds, reset_seconds):
+    server = StubServer().start()
+    try:
+        urls = sample_urls(products)
+        print(f"Scraping {products} products with {workers} workers, simulated fallback {fallback_seconds}s")
+        print("-" * 50)
+        legacy = DomainGuard(rate=0, attempts=1, failure_threshold=10 ** 9)
+        run_policy(server, "no retries, no breaker", legacy, urls, workers, fallback_seconds)
+
+        guard = DomainGuard(rate=0, base_delay=0.05, max_delay=0.5, reset_seconds=reset_seconds)
+        scraper = run_policy(server, "retry + breaker", guard, urls, workers, fallback_seconds)
+
+        server.clear_faults("amazon")
+        time.sleep(reset_seconds)
+        result = scraper.scrape_product(sample_urls(3)[0] + "?recovered")
+        print(
+            f"after the outage: amazon scrape success={result['success']} "
+            f"breaker={scraper.guard.state()['amazon']['state']}"
+        )
+    finally:
+        server.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--products", type=int, default=150)
+    parser.add_argument("--workers", type=int, default=12)
+    parser.add_argument("--fallback-seconds", type=float, default=1.0)
+    parser.add_argument("--reset-seconds", type=float, default=2.0)
+    args = parser.parse_args()
+    run(args.products, args.workers, args.fallback_seconds, args.reset_seconds)
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Benchmark tiered history retention and product deletion.
+
+Seeds P products with N hourly observations each (a year by default), then:
+deletes a few products through the ORM cascade and a few with
+delete_products' set-based DELETEs; rolls everything older than --days
+into daily aggregates with retention.py, archiving the raw rows; and
+reports database and archive size, history query times and deletion
+times before and after. Also checks that history read back with
+include_archived matches the original rows.
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+# The history queries read archives from RETENTION_ARCHIVE_DIR, set before the backend is imported
+os.environ["RETENTION_ARCHIVE_DIR"] = tempfile.mkdtemp(prefix="price-tracker-archive-")
+
+from common import temp_database, describe
+
+from database import Product, PriceHistory, delete_products
+from history import history_rows, bucket_series
+from retention import apply_retention, RETENTION_ARCHIVE_DIR
+
+def seed(engine, products, points, change_rate):
+    with engine.begin() as conn:
+        conn.execute(Product.__table__.insert(), [
+            {"name": f"Product {i}", "url": f"http://www.amazon.com/dp/B{i:09d}", "current_price": 100.0}
+            for i in range(products)
+        ])
+        product_ids = [row.id for row in conn.execute(text("SELECT id FROM products"))]
+
+    now = datetime.utcnow()
+    for product_id in product_ids:
+        price = 100.0
+        rows = []
+        for i in range(points):
+            if random.random() < change_rate:
+                price = max(1.0, round(price * random.uniform(0.9, 1.1), 2))
+            rows.append({"product_id": product_id, "price": price, "timestamp": now - timedelta(hours=points - i)})
+        with engine.begin() as conn:
+            conn.execute(PriceHistory.__table__.insert(), rows)
+    return product_ids, now
+
+def database_size(engine):
+    with engine.connect() as conn:
+        raw = conn.execute(text("SELECT COUNT(*) FROM price_history")).scalar()
+        days = conn.execute(text("SELECT COUNT(*) FROM price_history_daily")).scalar()
+        pages = conn.execute(text("PRAGMA page_count")).scalar()
+        page_size = conn.execute(text("PRAGMA page_size")).scalar()
+    return raw, days, pages * page_size
+
+def directory_size(path):
+    return sum(
+        os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names
+    )
+
+def orm_delete(session_factory, product_id):
+    db = session_factory()
+    db.delete(db.get(Product, product_id))
+    db.commit()
+    db.close()
+
+def bulk_delete(session_factory, product_id):
+    db = session_factory()
+    delete_products(db, [product_id])
+    db.commit()
+    db.close()
+
+def time_deletes(session_factory, delete, product_ids):
+    samples = []
+    for product_id in product_ids:
+        started = time.perf_counter()
+        delete(session_factory, product_id)
+        samples.append(time.perf_counter() - started)
+    return describe(samples)
+
+def measure_reads(session_factory, product_ids, now, repeats):
+    month = now - timedelta(days=300)
+    workloads = {
+        "full series": lambda db, pid: history_rows(db, pid),
+        "last 30 days": lambda db, pid: history_rows(db, pid, start=now - timedelta(days=30)),
+        "old month": lambda db, pid: history_rows(db, pid, month, month + timedelta(days=30)),
+        "old month raw": lambda db, pid: history_rows(
+            db, pid, month, month + timedelta(days=30), include_archived=True
+        ),
+        "daily buckets": lambda db, pid: bucket_series(db, pid, 86400),
+    }
+    results = {}
+    for label, workload in workloads.items():
+        samples = []
+        for _ in range(repeats):
+            product_id = random.choice(product_ids)
+            db = session_factory()
+            started = time.perf_counter()
+            workload(db, product_id)
+            samples.append(time.perf_counter() - started)
+            db.close()
+        results[label] = describe(samples)
+    return results
+
+def report(label, engine, reads):
+    raw, days, size = database_size(engine)
+    print(f"{label}: {raw} raw rows, {days} daily rows, {size / 1024 / 1024:.1f} MB")
+    for name, stats in reads.items():
+        print(f"  {name:<14} p50={stats['p50_ms']:>8.2f}ms p99={stats['p99_ms']:>8.2f}ms")
+
+def report_deletes(label, stats):
+    print(f"  {label:<22} p50={stats['p50_ms']:>8.2f}ms p99={stats['p99_ms']:>8.2f}ms per product")
+
+def check_archived(session_factory, product_ids, reference):
+    db = session_factory()
+    try:
+        for product_id in product_ids:
+            points = [(point.id, point.price, point.timestamp)
+                      for point in history_rows(db, product_id, include_archived=True)]
+            assert points == reference[product_id], f"product {product_id}: archived history differs"
+    finally:
+        db.close()
+
+def run(products, points, days, change_rate, deletes, repeats):
+    engine, session_factory = temp_database("retention.db")
+
+    print(f"Seeding {products} products x {points} hourly observations ({change_rate:.0%} change rate)...")
+    product_ids, now = seed(engine, products, points, change_rate)
+    victims = random.sample(product_ids, deletes * 4)
+    survivors = [product_id for product_id in product_ids if product_id not in victims]
+    check = random.sample(survivors, min(10, len(survivors)))
+    db = session_factory()
+    reference = {
+        product_id: [(point.id, point.price, point.timestamp) for point in history_rows(db, product_id)]
+        for product_id in check
+    }
+    db.close()
+
+    report("before", engine, measure_reads(session_factory, survivors, now, repeats))
+    print(f"deleting {deletes} products with {points} history rows each:")
+    report_deletes("ORM cascade", time_deletes(session_factory, orm_delete, victims[:deletes]))
+    report_deletes("set-based DELETEs", time_deletes(session_factory, bulk_delete, victims[deletes:deletes * 2]))
+
+    summary = apply_retention(engine, days=days, archive_dir=RETENTION_ARCHIVE_DIR, vacuum=True, now=now)
+    archive_size = directory_size(RETENTION_ARCHIVE_DIR)
+    print(f"retention (raw {days} days, archived): {summary['rows_rolled_up']} rows -> {summary['days']} "
+          f"daily rows in {summary['elapsed_seconds']:.1f}s, archive {archive_size / 1024 / 1024:.1f} MB")
+    report("after", engine, measure_reads(session_factory, survivors, now, repeats))
+    print(f"deleting {deletes} products with {days} days of raw history each:")
+    report_deletes("ORM cascade", time_deletes(session_factory, orm_delete, victims[deletes * 2:deletes * 3]))
+    report_deletes("set-based DELETEs", time_deletes(session_factory, bulk_delete, victims[deletes * 3:]))
+
+    check_archived(session_factory, check, reference)
+    print(f"archived history matches the original rows for {len(check)} sampled products")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--products", type=int, default=100)
+    parser.add_argument("--points", type=int, default=24 * 365, help="hourly observations per product")
+    parser.add_argument("--days", type=int, default=90, help="days of raw history to keep")
+    parser.add_argument("--change-rate", type=float, default=0.05, help="chance a poll sees a new price")
+    parser.add_argument("--deletes", type=int, default=5, help="products deleted per method and phase")
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+    random.seed(1)
+    run(args.products, args.points, args.days, args.change_rate, args.deletes, args.repeats)
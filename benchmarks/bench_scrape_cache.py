@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Measure how the scrape result cache dedupes refreshes of the same URL.
+
+1. Concurrent POST /products/{id}/update calls for one product, against a
+   slow local stub: pages fetched from the stub, history rows written and
+   wall time, with the cache off (every call scrapes) and on.
+2. Repeated sequential updates inside the TTL window.
+3. Several processes (like uvicorn workers) scraping the same URLs at once
+   through the SQLite backend, versus each with its own in-memory cache.
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import time
+
+import httpx
+
+from common import temp_database, use_database, release_database
+from stub_server import StubServer, sample_urls
+
+import main
+from database import Product, PriceHistory
+from scraper import PriceScraper
+from scrape_cache import ScrapeCache, MemoryBackend, SqliteBackend
+
+class NoCache:
+    """Stand-in for the result cache: every call scrapes"""
+
+    ttl = 0
+
+    def get_or_scrape(self, url, scrape):
+        return scrape(url)
+
+def install_database():
+    engine, session_factory = temp_database()
+    db = session_factory()
+    db.add(Product(name="Product 0", url=sample_urls(1)[0]))
+    db.commit()
+    db.close()
+
+    use_database(main.app, engine)
+    return session_factory
+
+def history_rows(session_factory):
+    db = session_factory()
+    try:
+        return db.query(PriceHistory).count()
+    finally:
+        db.close()
+
+async def concurrent_updates(callers):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(client.post("/products/1/update") for _ in range(callers)))
+        elapsed = time.perf_counter() - started
+    for response in responses:
+        response.raise_for_status()
+    return elapsed
+
+async def sequential_updates(count):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        for _ in range(count):
+            (await client.post("/products/1/update")).raise_for_status()
+
+def api_scenarios(server, callers, repeats):
+    for label, cache in (("cache off", NoCache()), ("cache on", ScrapeCache(backend=MemoryBackend()))):
+        session_factory = install_database()
+        main.scraper = server.attach(PriceScraper(use_selenium_fallback=False, result_cache=cache), cache=True)
+        fetched = server.request_count
+        elapsed = asyncio.run(concurrent_updates(callers))
+        print(
+            f"{label:<10} {callers} concurrent updates: {elapsed:.2f}s  "
+            f"fetches={server.request_count - fetched:<3} history rows={history_rows(session_factory)}"
+        )
+
+        fetched = server.request_count
+        started = time.perf_counter()
+        asyncio.run(sequential_updates(repeats))
+        print(
+            f"{'':<10} {repeats} sequential updates: {time.perf_counter() - started:.2f}s  "
+            f"fetches={server.request_count - fetched:<3} history rows={history_rows(session_factory)}"
+        )
+        if isinstance(cache, ScrapeCache):
+            print(f"{'':<10} stats: {cache.stats()}")
+    release_database(main.app)
+
+def worker(proxy, backend, path, urls, barrier):
+    scraper = PriceScraper(use_selenium_fallback=False, result_cache=ScrapeCache(
+        backend=SqliteBackend(path=path) if backend == "sqlite" else MemoryBackend()
+    ))
+    scraper.transport.set_proxy(proxy)
+    scraper.guard.rate = 0
+    barrier.wait()
+    for url in urls:
+        scraper.scrape_product(url)
+
+def process_scenario(server, workers, products):
+    urls = sample_urls(products)
+    context = multiprocessing.get_context("spawn")
+    for backend in ("memory", "sqlite"):
+        path = os.path.join(tempfile.mkdtemp(prefix="price-tracker-bench-"), "scrape_cache.db")
+        if backend == "sqlite":
+            SqliteBackend(path=path)
+        barrier = context.Barrier(workers)
+        fetched = server.request_count
+        started = time.perf_counter()
+        processes = [
+            context.Process(target=worker, args=(server.url, backend, path, urls, barrier))
+            for _ in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        print(
+            f"{backend:<7} {workers} workers x {products} URLs: {time.perf_counter() - started:.2f}s  "
+            f"fetches={server.request_count - fetched}"
+        )
+
+def run(callers, repeats, latency, workers, products):
+    server = StubServer(latency=latency).start()
+    try:
+        print(f"Stub latency {latency * 1000:.0f}ms")
+        print("-" * 50)
+        api_scenarios(server, callers, repeats)
+        print()
+        process_scenario(server, workers, products)
+    finally:
+        server.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--callers", type=int, default=12)
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--products", type=int, default=30)
+    args = parser.parse_args()
+    run(args.callers, args.repeats, args.latency, args.workers, args.products)
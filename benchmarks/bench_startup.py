@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Benchmark API cold start: import time and time to first response.
+
+Each run starts fresh processes in an empty temporary directory (so the
+schema is created from scratch, as on a new instance): one imports
+backend/main.py and reports how long that took and which heavy modules
+(Selenium, httpx, BeautifulSoup, requests, pyarrow) it loaded; another
+runs the API under uvicorn and is polled until it answers GET / and then
+GET /products/. With --record, the medians are appended as one JSON line
+to a file, so startup time can be tracked from commit to commit.
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import httpx
+
+from common import describe
+from stub_server import BACKEND_DIR
+
+# Modules the API should only load when a request needs them
+HEAVY_MODULES = ("selenium", "httpx", "bs4", "requests", "pyarrow", "scraper")
+
+IMPORT_PROBE = f"""
+import json, sys, time
+started = time.perf_counter()
+import main
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))
+"""
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def api_env():
+    return dict(os.environ, PYTHONPATH=BACKEND_DIR, SCHEDULER_ENABLED="0")
+
+def measure_import():
+    with tempfile.TemporaryDirectory(prefix="price-tracker-startup-") as workdir:
+        output = subprocess.run(
+            [sys.executable, "-c", IMPORT_PROBE], cwd=workdir, env=api_env(),
+            capture_output=True, text=True, check=True
+        ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def wait_for(client, url, deadline):
+    while time.perf_counter() < deadline:
+        try:
+            response = client.get(url, timeout=1)
+            response.raise_for_status()
+            return time.perf_counter()
+        except httpx.HTTPError:
+            time.sleep(0.005)
+    raise RuntimeError(f"No response from {url}")
+
+def measure_first_response():
+    with tempfile.TemporaryDirectory(prefix="price-tracker-startup-") as workdir:
+        port = free_port()
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+            cwd=workdir, env=api_env()
+        )
+        try:
+            with httpx.Client(base_url=f"http://127.0.0.1:{port}") as client:
+                root = wait_for(client, "/", started + 60)
+                products = wait_for(client, "/products/", started + 60)
+        finally:
+            process.terminate()
+            process.wait()
+    return root - started, products - started
+
+def commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(runs, record):
+    imports = []
+    roots = []
+    products = []
+    loaded = set()
+    for _ in range(runs):
+        probe = measure_import()
+        imports.append(probe["seconds"])
+        loaded.update(probe["loaded"])
+        root, first_query = measure_first_response()
+        roots.append(root)
+        products.append(first_query)
+
+    results = {
+        "import main": describe(imports),
+        "first GET /": describe(roots),
+        "first GET /products/": describe(products),
+    }
+    print(f"{runs} cold starts (python {sys.version.split()[0]})")
+    print("-" * 60)
+    for label, stats in results.items():
+        print(f"{label:<22} p50={stats['p50_ms']:>8.1f}ms p99={stats['p99_ms']:>8.1f}ms")
+    print(f"heavy modules loaded by the import: {', '.join(sorted(loaded)) or 'none'}")
+
+    if record:
+        with open(record, "a") as f:
+            f.write(json.dumps({
+                "at": datetime.utcnow().isoformat(timespec="seconds"),
+                "commit": commit(),
+                "runs": runs,
+                "import_ms": results["import main"]["p50_ms"],
+                "first_response_ms": results["first GET /"]["p50_ms"],
+                "first_query_ms": results["first GET /products/"]["p50_ms"],
+                "heavy_modules": sorted(loaded),
+            }) + "\n")
+        print(f"recorded in {record}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--record", help="Append the medians as a JSON line to this file")
+    args = parser.parse_args()
+    run(args.runs, args.record)
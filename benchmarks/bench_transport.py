@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Benchmark the scraper's HTTP transport against the local stub.
+
+Many threads share one transport and fetch fixture pages from the stub
+(by hostname, so the DNS cache is exercised), at several concurrency
+levels. Compares a transport sized like requests' defaults (10 pooled
+connections per host, extra connections opened and discarded, no DNS
+cache) with the pooled transport, and the HTTP/2 transport when
+`httpx[http2]` is installed. The stub speaks HTTP/1.1 only, so the HTTP/2
+transport falls back to it here and only its pooling is measured.
+"""
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from stub_server import StubServer
+
+from transport import DnsCache, RequestsTransport, create_transport, HAVE_HTTPX
+
+def transports(pool_size):
+    variants = {
+        "requests defaults": lambda: RequestsTransport(pool_maxsize=10, pool_block=False, dns_cache=DnsCache(ttl=0)),
+        f"pooled ({pool_size}/host)": lambda: RequestsTransport(pool_maxsize=pool_size, pool_block=True),
+    }
+    if HAVE_HTTPX:
+        variants[f"http2 ({pool_size}/host)"] = lambda: create_transport(http2=True, pool_maxsize=pool_size)
+    return variants
+
+def measure(transport, url, concurrency, requests_per_thread):
+    def worker(_):
+        for _ in range(requests_per_thread):
+            response = transport.get(url, timeout=10, headers={"Host": "www.walmart.com"})
+            response.raise_for_status()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    return concurrency * requests_per_thread / (time.perf_counter() - started)
+
+def run(levels, requests_per_thread, latency, pool_size):
+    server = StubServer(latency=latency).start()
+    try:
+        url = f"http://localhost:{server.server_address[1]}/ip/000000001"
+        print(f"{requests_per_thread} requests per thread, stub latency {latency * 1000:.0f}ms")
+        print("-" * 50)
+        for label, factory in transports(pool_size).items():
+            for concurrency in levels:
+                transport = factory()
+                rate = measure(transport, url, concurrency, requests_per_thread)
+                stats = transport.stats()
+                hosts = list(stats["hosts"].values())
+                host = hosts[0] if hosts else {}
+                dns = stats.get("dns_cache") or {}
+                print(
+                    f"{label:<20} concurrency={concurrency:<4} {rate:>8.0f} req/s  "
+                    f"opened={host.get('opened', '-')!s:<5} discarded={host.get('discarded', '-')!s:<5} "
+                    f"reuse={host.get('reuse_rate', '-')!s:<7} dns_hits={dns.get('hits', '-')}"
+                )
+                transport.close()
+    finally:
+        server.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--levels", type=int, nargs="*", default=[1, 8, 32, 64])
+    parser.add_argument("--requests", type=int, default=50, help="requests per thread")
+    parser.add_argument("--latency", type=float, default=0.005)
+    parser.add_argument("--pool-size", type=int, default=64)
+    args = parser.parse_args()
+    run(args.levels, args.requests, args.latency, args.pool_size)
@@ -0,0 +1,62 @@
+"""
+Shared helpers for the benchmark scripts.
+"""
+
+import asyncio
+import os
+import statistics
+import tempfile
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import stub_server  # noqa: F401  (puts backend/ on sys.path)
+from database import configure_sqlite, create_tables, create_async_db_engine, async_session_factory, get_db
+
+def temp_database(name="bench.db"):
+    """Create an empty SQLite database in a temp dir and return (engine, session_factory)"""
+    path = os.path.join(tempfile.mkdtemp(prefix="price-tracker-bench-"), name)
+    engine = configure_sqlite(create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False}))
+    create_tables(engine)
+    return engine, sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Async engines serving the API for the benchmark, disposed by release_database
+api_engines = []
+
+def use_database(app, engine):
+    """Serve the API's requests from `engine`'s database, through a pooled async engine like get_db's.
+
+    Call release_database(app) when done: pooled aiosqlite connections keep
+    a thread each, and the process can't exit until they are closed.
+    """
+    release_database(app)
+    async_engine = create_async_db_engine(engine.url.render_as_string(hide_password=False))
+    session_factory = async_session_factory(async_engine)
+
+    async def override_get_db():
+        async with session_factory() as db:
+            yield db
+
+    api_engines.append(async_engine)
+    app.dependency_overrides[get_db] = override_get_db
+
+def release_database(app):
+    while api_engines:
+        asyncio.run(api_engines.pop().dispose())
+    app.dependency_overrides.pop(get_db, None)
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+def describe(samples):
+    """p50/p99/mean summary in milliseconds for a list of durations in seconds"""
+    return {
+        "p50_ms": round(percentile(samples, 50) * 1000, 2),
+        "p99_ms": round(percentile(samples, 99) * 1000, 2),
+        "mean_ms": round(statistics.mean(samples) * 1000, 2) if samples else 0.0,
+    }
@@ -0,0 +1,211 @@
+"""
+Local HTTP stub that serves saved retailer fixture pages.
+
+The stub is meant to be used as an HTTP proxy for a PriceScraper session, so
+scrapes keep their real retailer URLs (and therefore their site-specific
+parsing and per-domain limits) while never leaving the machine:
+
+    server = StubServer(latency=0.05).start()
+    scraper = PriceScraper(use_selenium_fallback=False)
+    server.attach(scraper)
+    scraper.scrape_product("http://www.amazon.com/dp/B08N5WRWNW")
+
+Faults can be injected per site to exercise retries and circuit breaking:
+
+    server.inject_fault("amazon", status=503)              # every request
+    server.inject_fault("ebay", status=503, probability=0.3)
+    server.inject_fault("walmart", reset=True, count=2)    # drop 2 connections
+"""
+
+import hashlib
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES_DIR = os.path.join(ROOT, "benchmarks", "fixtures")
+BACKEND_DIR = os.path.join(ROOT, "backend")
+
+# Make the backend modules importable the same way main.py imports them
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+SITES = ("amazon", "ebay", "walmart")
+
+def load_fixture(site):
+    with open(os.path.join(FIXTURES_DIR, f"{site}.html"), "rb") as f:
+        return f.read()
+
+def sample_urls(count):
+    """Build `count` distinct product URLs spread across the supported sites"""
+    templates = {
+        "amazon": "http://www.amazon.com/dp/B{:09d}",
+        "ebay": "http://www.ebay.com/itm/{:012d}",
+        "walmart": "http://www.walmart.com/ip/{:09d}",
+    }
+    return [templates[SITES[i % len(SITES)]].format(i) for i in range(count)]
+
+class Fault:
+    """A failure the stub injects instead of serving a site's page"""
+
+    def __init__(self, status=503, probability=1.0, delay=0.0, retry_after=None, reset=False, count=None):
+        self.status = status
+        self.probability = probability
+        self.delay = delay
+        self.retry_after = retry_after
+        self.reset = reset
+        self.remaining = count
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+
+        host = (self.headers.get("Host") or "").lower()
+        site = next((s for s in SITES if s in host), None)
+        if site is None:
+            server.record_request()
+            self.send_error(404, "Unknown site")
+            return
+
+        fault = server.take_fault(site)
+        if fault is not None:
+            server.record_request()
+            if fault.delay:
+                time.sleep(fault.delay)
+            if fault.reset:
+                # Close without answering; the client sees a connection error
+                self.close_connection = True
+                self.connection.close()
+                return
+            self.send_response(fault.status)
+            if fault.retry_after is not None:
+                self.send_header("Retry-After", str(fault.retry_after))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        body, etag = server.pages[site], server.etags[site]
+        if server.conditional and self.headers.get("If-None-Match") == etag:
+            server.record_request(not_modified=True)
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        server.record_request()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if server.conditional:
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", server.last_modified)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0.0, conditional=True, handler=StubHandler):
+        super().__init__(("127.0.0.1", port), handler)
+        self.latency = latency
+        self.conditional = conditional
+        self.pages = {}
+        self.etags = {}
+        self.last_modified = time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime())
+        for site in SITES:
+            self.set_page(site, load_fixture(site))
+        self.faults = {}
+        self.fault_count = 0
+        self.request_count = 0
+        self.not_modified_count = 0
+        self._count_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def set_page(self, site, body):
+        """Replace the page served for a site (and its ETag)"""
+        self.pages[site] = body
+        self.etags[site] = '"%s"' % hashlib.md5(body).hexdigest()
+
+    def inject_fault(self, site, **options):
+        """Make requests for `site` fail; see Fault for the options"""
+        with self._count_lock:
+            self.faults[site] = Fault(**options)
+
+    def clear_faults(self, site=None):
+        with self._count_lock:
+            if site is None:
+                self.faults.clear()
+            else:
+                self.faults.pop(site, None)
+
+    def take_fault(self, site):
+        """The fault to inject for this request, if any"""
+        with self._count_lock:
+            fault = self.faults.get(site)
+            if fault is None or random.random() >= fault.probability:
+                return None
+            if fault.remaining is not None:
+                fault.remaining -= 1
+                if fault.remaining <= 0:
+                    del self.faults[site]
+            self.fault_count += 1
+            return fault
+
+    def record_request(self, not_modified=False):
+        with self._count_lock:
+            self.request_count += 1
+            if not_modified:
+                self.not_modified_count += 1
+
+    def attach(self, scraper, throttle=False, cache=False):
+        """Route a scraper's plain-HTTP traffic through this stub.
+
+        The per-domain rate limit protects real retailers, so it is turned
+        off for the stub unless `throttle` is set. Benchmarks scrape the same
+        URLs over and over, so the result cache's TTL is turned off too
+        (concurrent scrapes are still coalesced) unless `cache` is set.
+        """
+        scraper.transport.set_proxy(self.url)
+        if not throttle:
+            scraper.guard.rate = 0
+        if not cache:
+            scraper.result_cache.ttl = 0
+        return scraper
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve retailer fixture pages locally")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to sleep per request")
+    args = parser.parse_args()
+
+    server = StubServer(port=args.port, latency=args.latency)
+    print(f"Stub server listening on {server.url} (use it as an HTTP proxy)")
+    server.serve_forever()
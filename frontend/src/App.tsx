@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from 'react';
-import { Product, ProductWithHistory } from './types';
+import { Product, ProductWithHistory, PriceUpdate } from './types';
 import { productApi } from './api';
 import ProductForm from './components/ProductForm';
 import ProductsTable from './components/ProductsTable';
@@ -16,6 +16,41 @@ const App: React.FC = () => {
     loadProducts();
   }, []);
 
+  // Apply pushed price changes instead of re-downloading products and histories
+  useEffect(() => {
+    const applyUpdate = (update: PriceUpdate) => {
+      if (update.kind === 'reset') {
+        loadProducts();
+        return;
+      }
+      if (update.kind === 'deleted') {
+        setProducts(prev => prev.filter(product => product.id !== update.product_id));
+        setSelectedProduct(prev => (prev && prev.product.id === update.product_id ? null : prev));
+        return;
+      }
+      setProducts(prev =>
+        prev.map(product =>
+          product.id === update.product_id
+            ? { ...product, current_price: update.price, last_updated: update.at }
+            : product
+        )
+      );
+      setSelectedProduct(prev =>
+        prev && prev.product.id === update.product_id
+          ? {
+              ...prev,
+              product: { ...prev.product, current_price: update.price, last_updated: update.at },
+              price_history: [
+                { id: update.id, product_id: update.product_id, price: update.price, timestamp: update.at },
+                ...prev.price_history,
+              ],
+            }
+          : prev
+      );
+    };
+    return productApi.subscribeToPriceUpdates(applyUpdate);
+  }, []);
+
   const loadProducts = async () => {
     try {
       setLoading(true);
@@ -1,5 +1,5 @@
 import axios from 'axios';
-import { Product, ProductWithHistory, PriceHistory, ProductCreate } from './types';
+import { Product, ProductWithHistory, PriceHistory, ProductCreate, ProductListParams, ProductsPage, HistoryParams, PriceBucket, PriceUpdate } from './types';
 
 const API_BASE_URL = process.env.REACT_APP_API_URL || 'http://localhost:8000';
 
@@ -17,9 +17,18 @@ export const productApi = {
     return response.data;
   },
 
-  // Get a specific product with price history
-  getProductWithHistory: async (productId: number): Promise<ProductWithHistory> => {
-    const response = await api.get(`/products/${productId}`);
+  // Get one page of products; pass nextCursor back as `cursor` for the next page
+  getProductsPage: async (params: ProductListParams = {}): Promise<ProductsPage> => {
+    const response = await api.get('/products/', { params });
+    return {
+      items: response.data,
+      nextCursor: response.headers['x-next-cursor'] || null,
+    };
+  },
+
+  // Get a specific product with price history, downsampled to at most maxPoints points
+  getProductWithHistory: async (productId: number, maxPoints: number = 1000): Promise<ProductWithHistory> => {
+    const response = await api.get(`/products/${productId}`, { params: { max_points: maxPoints } });
     return response.data;
   },
 
@@ -41,9 +50,35 @@ export const productApi = {
   },
 
   // Get price history for a product
-  getPriceHistory: async (productId: number): Promise<PriceHistory[]> => {
-    const response = await api.get(`/products/${productId}/price-history`);
+  getPriceHistory: async (productId: number, params: HistoryParams = {}): Promise<PriceHistory[]> => {
+    const response = await api.get(`/products/${productId}/price-history`, { params });
     return response.data;
   },
+
+  // Get price history aggregated per time bucket
+  getPriceHistoryBuckets: async (
+    productId: number,
+    params: HistoryParams & { bucket_seconds?: number } = {}
+  ): Promise<PriceBucket[]> => {
+    const response = await api.get(`/products/${productId}/price-history/buckets`, { params });
+    return response.data;
+  },
+
+  // Receive price deltas as they are written; returns a function that closes the stream.
+  // EventSource reconnects by itself and resumes from the last event it received.
+  subscribeToPriceUpdates: (onUpdate: (update: PriceUpdate) => void, productIds?: number[]): (() => void) => {
+    const query = productIds ? `?product_ids=${productIds.join(',')}` : '';
+    const source = new EventSource(`${API_BASE_URL}/products/stream${query}`);
+    source.addEventListener('price', (event) => {
+      const message = event as MessageEvent;
+      onUpdate({ kind: 'price', id: Number(message.lastEventId), ...JSON.parse(message.data) });
+    });
+    source.addEventListener('deleted', (event) => {
+      const message = event as MessageEvent;
+      onUpdate({ kind: 'deleted', id: Number(message.lastEventId), ...JSON.parse(message.data) });
+    });
+    source.addEventListener('reset', () => onUpdate({ kind: 'reset' }));
+    return () => source.close();
+  },
 };
 
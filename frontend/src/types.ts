@@ -8,18 +8,58 @@ export interface Product {
 }
 
 export interface PriceHistory {
-  id: number;
+  id: number | null;  // null for days rolled up into daily aggregates
   product_id: number;
   price: number;
   timestamp: string;
 }
 
+export interface PriceBucket {
+  start: string;
+  end: string;
+  min: number;
+  max: number;
+  avg: number;
+  last: number;
+  count: number;
+}
+
+export interface HistoryParams {
+  start?: string;
+  end?: string;
+  max_points?: number;
+  include_archived?: boolean;
+}
+
 export interface ProductWithHistory {
   product: Product;
   price_history: PriceHistory[];
 }
 
+// Delta pushed by GET /products/stream
+export type PriceUpdate =
+  | { kind: 'price'; id: number; product_id: number; price: number; at: string }
+  | { kind: 'deleted'; id: number; product_id: number }
+  | { kind: 'reset' };
+
 export interface ProductCreate {
   url: string;
 }
 
+
+export interface ProductListParams {
+  limit?: number;
+  cursor?: string;
+  sort?: 'id' | 'name' | 'current_price' | 'last_updated' | 'created_at';
+  order?: 'asc' | 'desc';
+  domain?: string;
+  min_price?: number;
+  max_price?: number;
+  stale_since?: string;
+  fields?: string;
+}
+
+export interface ProductsPage {
+  items: Product[];
+  nextCursor: string | null;
+}